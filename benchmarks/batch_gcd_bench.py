@@ -0,0 +1,57 @@
+"""Бенчмарк batch GCD: python benchmarks/batch_gcd_bench.py -n 1000 10000 --bits 4096
+
+Время работы дерева произведений/остатков зависит только от количества и
+размера модулей, поэтому для замеров берутся случайные нечётные числа нужной
+разрядности. Корректность отдельно проверяется на небольшом наборе
+настоящих полупростых модулей с подсаженными общими множителями.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptokeygen import weak_keys  # noqa: E402
+
+
+def _random_prime(bits: int) -> int:
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    return rsa.generate_private_key(public_exponent=65537, key_size=bits * 2).private_numbers().p
+
+
+def check_correctness(count: int = 50, prime_bits: int = 512):
+    primes = [_random_prime(prime_bits) for _ in range(count * 2)]
+    moduli = [primes[2 * i] * primes[2 * i + 1] for i in range(count)]
+    # Ключи 3 и 7 получили общий простой множитель (плохая энтропия)
+    moduli[7] = primes[6] * _random_prime(prime_bits)
+    findings = weak_keys.find_shared_factors(moduli)
+    assert set(findings) == {3, 7}, findings
+    assert findings[3] == findings[7] == primes[6]
+    print(f"✅ Корректность: найдены ключи {sorted(findings)} с общим множителем")
+
+
+def bench(count: int, bits: int) -> float:
+    rng = random.Random(count)
+    moduli = [rng.getrandbits(bits) | (1 << (bits - 1)) | 1 for _ in range(count)]
+    started = time.perf_counter()
+    weak_keys.batch_gcd(moduli)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--count', type=int, nargs='+', default=[1000, 5000, 10000])
+    parser.add_argument('--bits', type=int, default=4096)
+    args = parser.parse_args()
+
+    print(f"gmpy2: {'да' if weak_keys.gmpy2 is not None else 'нет (встроенные int)'}")
+    check_correctness()
+    for count in args.count:
+        elapsed = bench(count, args.bits)
+        print(f"{count:>7} модулей × {args.bits} бит: {elapsed:8.2f} с  ({count / elapsed:,.0f} ключей/с)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Бенчмарк клиента Bot API: python benchmarks/bot_api_bench.py -n 5000 -c 50
+
+Сравнивает стандартную сессию aiogram с производительным режимом
+(TunedAiohttpSession + orjson, затем ещё и uvloop, если установлен) на
+запросах sendMessage с inline-клавиатурой к локальной имитации Bot API из
+tools/load_test.py. Имитация работает в отдельном процессе, чтобы замер
+отражал только клиентскую сторону: сериализацию, HTTP и разбор ответа.
+На машине с одним ядром сервер и клиент делят процессор, поэтому главная
+метрика — процессорное время клиента на запрос. Отдельно замеряется JSON на
+типичном ответе getUpdates.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+
+from cryptokeygen import runtime  # noqa: E402
+from load_test import BOT_TOKEN, FakeBotAPI  # noqa: E402
+
+KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text=f"Кнопка {row}-{col}", callback_data=f"action_{row}_{col}") for col in range(2)]
+    for row in range(4)
+])
+
+
+def _serve(port: int, ready):
+    async def serve():
+        api = FakeBotAPI(port=port)
+        await api.start()
+        ready.set()
+        await asyncio.Event().wait()
+    asyncio.run(serve())
+
+
+async def bench_client(session: AiohttpSession, requests: int, concurrency: int) -> dict:
+    bot = Bot(token=BOT_TOKEN, session=session)
+    latencies = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            await bot.send_message(1000 + i % concurrency, f"Сообщение №{i}: ключи готовы ✅", reply_markup=KEYBOARD)
+            latencies.append(time.perf_counter() - started)
+
+    await bot.send_message(1, "прогрев")
+    started, cpu_started = time.perf_counter(), time.process_time()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    await bot.session.close()
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "cpu_us": cpu / requests * 1e6,
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+def bench_json(rounds: int = 20000):
+    update = {"ok": True, "result": [{
+        "update_id": 100 + i,
+        "callback_query": {
+            "id": str(10 ** 12 + i), "chat_instance": "-123456789", "data": "ssh_key_ed25519",
+            "from": {"id": 1000 + i, "is_bot": False, "first_name": "Пользователь", "language_code": "ru"},
+            "message": {"message_id": i, "date": 1700000000, "text": "🔐 Крипто-генератор\n\nВыберите действие:",
+                        "chat": {"id": 1000 + i, "type": "private", "first_name": "Пользователь"},
+                        "reply_markup": KEYBOARD.model_dump(exclude_none=True)},
+        },
+    } for i in range(10)]}
+    encoded = json.dumps(update)
+    for name, loads, dumps in (("json", json.loads, json.dumps), ("runtime", runtime.json_loads, runtime.json_dumps)):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            loads(encoded)
+        decode = (time.perf_counter() - started) / rounds * 1e6
+        started = time.perf_counter()
+        for _ in range(rounds):
+            dumps(update)
+        encode = (time.perf_counter() - started) / rounds * 1e6
+        print(f"  {name:<8} разбор {decode:7.1f} мкс, сериализация {encode:7.1f} мкс (ответ getUpdates, {len(encoded)} байт)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--requests", type=int, default=5000)
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3, help="повторов каждого варианта (берётся медиана)")
+    parser.add_argument("--port", type=int, default=8093)
+    args = parser.parse_args()
+
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=_serve, args=(args.port, ready), daemon=True)
+    server.start()
+    ready.wait(10)
+    api = TelegramAPIServer.from_base(f"http://127.0.0.1:{args.port}")
+
+    variants = [
+        ("aiogram по умолчанию", lambda: AiohttpSession(api=api), asyncio.new_event_loop),
+        ("tuned + orjson", lambda: runtime.TunedAiohttpSession(api), asyncio.new_event_loop),
+    ]
+    try:
+        import uvloop
+        variants.append(("tuned + orjson + uvloop", lambda: runtime.TunedAiohttpSession(api), uvloop.new_event_loop))
+    except ImportError:
+        print("uvloop не установлен — вариант с uvloop пропущен")
+
+    print(f"sendMessage с клавиатурой: {args.requests} запросов, {args.concurrency} параллельно, "
+          f"JSON: {'orjson' if runtime.orjson is not None else 'json'}")
+    for name, make_session, loop_factory in variants:
+        results = []
+        for _ in range(args.rounds):
+            with asyncio.Runner(loop_factory=loop_factory) as runner:
+                results.append(runner.run(bench_client(make_session(), args.requests, args.concurrency)))
+        rps = statistics.median(r["rps"] for r in results)
+        p50 = statistics.median(r["p50"] for r in results)
+        p99 = statistics.median(r["p99"] for r in results)
+        cpu_us = statistics.median(r["cpu_us"] for r in results)
+        print(f"  {name:<24} {rps:8.0f} запросов/с   CPU клиента {cpu_us:6.0f} мкс/запрос   "
+              f"p50 {p50:6.2f} мс   p99 {p99:6.2f} мс")
+
+    print("JSON:")
+    bench_json()
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
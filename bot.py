@@ -2,29 +2,55 @@ import os
 import asyncio
 import logging
 import sys
-import shlex
 import hashlib
-import base64
+import functools
+import secrets
+import json
+import time
+
+STARTUP_STARTED = time.perf_counter()  # отсчёт времени старта: импорты, настройка, запуск
+
 from datetime import datetime, timedelta,timezone
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from aiogram.enums import ParseMode
-from cryptography.exceptions import UnsupportedAlgorithm
 
-import asyncssh
 from aiogram import Bot, Dispatcher, types
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
 from aiogram.filters import CommandStart, StateFilter, Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile
-from cryptography import x509
-from cryptography.hazmat.primitives import serialization, hashes
+from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile, InputMediaDocument
 from cryptography.hazmat.primitives.asymmetric import rsa, ed25519
-from cryptography.hazmat.primitives.serialization import load_ssh_public_key
-from cryptography.x509.oid import NameOID
 from dotenv import load_dotenv
 
+from cryptokeygen.startup import lazy_import, load_modules, warm_up_crypto
+from cryptokeygen.fingerprint_index import FingerprintIndex
+from cryptokeygen.webhook import WebhookServer
+from cryptokeygen.sharding import ShardRouter, poll_raw_updates, run_worker, WORKER_INDEX_ENV
+from cryptokeygen.storage import BatchingStorage, BoundedMemoryStorage, RedisBackend, SQLiteBackend
+from cryptokeygen.ratelimit import OutboundRateLimiter
+from cryptokeygen import hashing, http_api, kdf, logconfig, metrics, runtime
+from cryptokeygen.ssh_keys import cached_ssh_public_keys, decode_ssh_public_key_blob, generate_ssh_keypair, parse_ssh_public_key
+from cryptokeygen.watchdog import LoopWatchdog, WatchdogContextMiddleware
+from cryptokeygen.profiling import HandlerProfiler, MemoryTracker, ProfilerMiddleware
+from cryptokeygen.throttling import ThrottlingMiddleware, UserThrottle
+from cryptokeygen.shutdown import GracefulShutdown, InFlightMiddleware, ShutdownInProgress, INTERRUPTED_TEXT
+from cryptokeygen.progress import ProgressReporter, format_bytes
+from cryptokeygen.pool import run_in_pool, map_in_pool, pool_stats, shutdown_pool, warm_up_pool, PoolBusyError
+
+# Тяжёлые подсистемы (asyncssh, cryptography.x509) загружаются при первом использовании
+LAZY_MODULES = (
+    "cryptokeygen.x509_tools", "cryptokeygen.cert_inspect", "cryptokeygen.ca",
+    "cryptokeygen.weak_keys", "cryptokeygen.ssh_export",
+)
+x509_tools = lazy_import("cryptokeygen.x509_tools")
+cert_inspect = lazy_import("cryptokeygen.cert_inspect")
+ca_tools = lazy_import("cryptokeygen.ca")
+weak_keys = lazy_import("cryptokeygen.weak_keys")
+ssh_export = lazy_import("cryptokeygen.ssh_export")
+
 BOT_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG_DIR = os.path.join(BOT_DIR, 'logs')
 
@@ -35,63 +61,28 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def setup_logging():
-    """Безопасная настройка логирования"""
-    global logger
-    
-    os.makedirs(LOG_DIR, exist_ok=True)
-    
-    log_file = os.path.join(LOG_DIR, 'bot.log')
-    
-    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    
+    """Настройка логирования: запись на диск в фоновом потоке, ротация по размеру и времени"""
     if os.name == 'nt':
-        import sys
         sys.stdout.reconfigure(encoding='utf-8')
         sys.stderr.reconfigure(encoding='utf-8')
-        
-        if os.path.exists(log_file):
-            try:
-                for handler in logging.root.handlers[:]:
-                    if isinstance(handler, logging.FileHandler):
-                        handler.close()
-                        logging.root.handlers.remove(handler)
-                
-                if os.path.exists(log_file):
-                    os.remove(log_file)
-                    
-                logger.info("🧹 Старый лог-файл удалён (Windows)")
-            except (PermissionError, OSError) as e:
-                logger.warning(f"⚠️ Не удалось удалить старый лог: {e}")
-        
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        file_handler.setFormatter(logging.Formatter(log_format))
-        
-        logging.root.handlers.clear()
-        logging.root.addHandler(file_handler)
-        logging.root.addHandler(logging.StreamHandler(sys.stdout))
-        logging.root.setLevel(logging.INFO)
-        
+
+    # Под PM2 логи собирает сам PM2 — пишем только в stdout
+    if PM2_RUNNING:
+        log_file = None
     else:
-        try:
-            if os.path.exists(log_file):
-                os.remove(log_file)
-                logger.info("🧹 Старый лог-файл удалён (Unix)")
-        except (PermissionError, OSError) as e:
-            logger.warning(f"⚠️ Не удалось удалить старый лог: {e}")
-        
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        file_handler.setFormatter(logging.Formatter(log_format))
-        
-        logging.root.handlers.clear()
-        logging.root.addHandler(file_handler)
-        logging.root.addHandler(logging.StreamHandler())
-        logging.root.setLevel(logging.INFO)
-    
-    for handler in logging.root.handlers:
-        handler.setFormatter(logging.Formatter(log_format))
-    
-    logger.info("📝 Логирование настроено")
-    return logger
+        # Воркеры многопроцессного режима пишут в свои файлы
+        worker_index = os.getenv('BOT_WORKER_INDEX')
+        log_file = os.path.join(LOG_DIR, 'bot.log' if worker_index is None else f'bot-worker{worker_index}.log')
+
+    logconfig.setup_logging(
+        log_file,
+        level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO),
+        json_format=os.getenv("LOG_FORMAT", "text").lower() == "json",
+        max_bytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+        backup_count=int(os.getenv("LOG_BACKUP_COUNT", "7")),
+        interval=float(os.getenv("LOG_ROTATE_INTERVAL", "86400"))
+    )
+    logger.info("📝 Логирование настроено" + (" (PM2, только stdout)" if PM2_RUNNING else f": {log_file}"))
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 if not BOT_TOKEN:
@@ -111,41 +102,134 @@ logger.info(f"✅ BOT_TOKEN успешно загружен (длина: {len(BO
 logger.info("🔐 Крипто-генератор: инициализация...")
 
 
-logger = setup_logging()
-
 PM2_RUNNING = os.getenv('BOT_TYPE') == 'docker-pm2' or 'pm2' in ' '.join(sys.argv).lower()
 
 if PM2_RUNNING:
     logger.info("🚀 PM2 detected - running in production mode")
     os.environ['PYTHONUNBUFFERED'] = '1'
 
+setup_logging()
+
 if os.path.ismount(LOG_DIR):
     logger.info("✅ Logs directory is mounted (Docker)")
 else:
     logger.info("✅ Local logs directory ready")
 
-if PM2_RUNNING:
-    for handler in logging.root.handlers[:]:
-        if isinstance(handler, logging.FileHandler):
-            try:
-                handler.close()
-                logging.root.handlers.remove(handler)
-            except Exception as e:
-                logger.warning(f"Не удалось закрыть file handler для PM2: {e}")
-    
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-    
-    logging.root.handlers.clear()
-    logging.root.addHandler(console_handler)
-    logging.root.setLevel(logging.INFO)
-    
-    logger.info("📝 PM2 logging configured (stdout only)")
 
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory").lower()
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", "86400"))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.2"))
 
-bot = Bot(token=os.getenv("BOT_TOKEN"))
-storage = MemoryStorage()
+
+def create_storage():
+    """FSM-хранилище по FSM_STORAGE: memory (по умолчанию), redis или sqlite"""
+    if FSM_STORAGE == "redis":
+        backend = RedisBackend(os.getenv("FSM_REDIS_URL", "redis://localhost:6379/0"))
+    elif FSM_STORAGE == "sqlite":
+        backend = SQLiteBackend(os.getenv("FSM_SQLITE_PATH", os.path.join(BOT_DIR, 'data', 'fsm.db')))
+    else:
+        return BoundedMemoryStorage(
+            max_contexts=int(os.getenv("FSM_MEMORY_MAX_CONTEXTS", "10000")),
+            idle_ttl=float(os.getenv("FSM_MEMORY_IDLE_TTL", "3600")),
+            sweep_interval=float(os.getenv("FSM_SWEEP_INTERVAL", "60"))
+        )
+
+    logger.info(f"💾 FSM-хранилище: {FSM_STORAGE} (TTL {FSM_STATE_TTL} с, сброс раз в {FSM_FLUSH_INTERVAL} с)")
+    return BatchingStorage(backend, ttl=FSM_STATE_TTL, flush_interval=FSM_FLUSH_INTERVAL)
+
+
+# Свой сервер Bot API (telegram-bot-api) или локальная имитация из tools/load_test.py
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+# Производительный режим: uvloop, keep-alive пул соединений к Bot API и orjson
+PERF_RUNTIME = os.getenv("PERF_RUNTIME", "0") == "1"
+JSON_LOADS = runtime.json_loads if PERF_RUNTIME else json.loads
+JSON_DUMPS = runtime.json_dumps if PERF_RUNTIME else json.dumps
+
+
+def create_bot() -> Bot:
+    api = TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else PRODUCTION
+    if TELEGRAM_API_URL:
+        logger.info(f"🌐 Bot API: {TELEGRAM_API_URL}")
+    if PERF_RUNTIME:
+        session = runtime.TunedAiohttpSession(
+            api,
+            limit=int(os.getenv("TG_HTTP_POOL_SIZE", "100")),
+            keepalive_timeout=float(os.getenv("TG_HTTP_KEEPALIVE", "75"))
+        )
+    elif TELEGRAM_API_URL:
+        session = AiohttpSession(api=api)
+    else:
+        return Bot(token=os.getenv("BOT_TOKEN"))
+    return Bot(token=os.getenv("BOT_TOKEN"), session=session)
+
+
+bot = create_bot()
+
+# Исходящие запросы проходят через общий планировщик: лимиты Telegram и повтор после 429
+rate_limiter = OutboundRateLimiter(
+    global_rate=float(os.getenv("TG_RATE_GLOBAL", "30")),
+    chat_rate=float(os.getenv("TG_RATE_PER_CHAT", "1")),
+    chat_burst=float(os.getenv("TG_BURST_PER_CHAT", "5")),
+    max_retries=int(os.getenv("TG_MAX_RETRIES", "3"))
+)
+bot.session.middleware(rate_limiter)
+# Внутри планировщика: замеряется каждый реальный запрос, включая повторы после 429
+bot.session.middleware(metrics.ApiMetricsMiddleware())
+storage = create_storage()
+
+FINGERPRINT_INDEX_PATH = os.getenv("FINGERPRINT_INDEX_PATH", os.path.join(BOT_DIR, 'data', 'fingerprints.db'))
+fingerprint_index = FingerprintIndex(FINGERPRINT_INDEX_PATH) if FINGERPRINT_INDEX_PATH else None
 dp = Dispatcher(storage=storage)
+dp.message.middleware(metrics.HandlerMetricsMiddleware())
+dp.callback_query.middleware(metrics.HandlerMetricsMiddleware())
+dp.message.middleware(WatchdogContextMiddleware())
+dp.callback_query.middleware(WatchdogContextMiddleware())
+dp.message.middleware(logconfig.LogContextMiddleware(float(os.getenv("LOG_SLOW_HANDLER_MS", "1000"))))
+dp.callback_query.middleware(logconfig.LogContextMiddleware(float(os.getenv("LOG_SLOW_HANDLER_MS", "1000"))))
+
+handler_profiler = HandlerProfiler()
+memory_tracker = MemoryTracker()
+dp.message.middleware(ProfilerMiddleware(handler_profiler))
+dp.callback_query.middleware(ProfilerMiddleware(handler_profiler))
+
+# Не чаще одной правки сообщения о прогрессе за столько секунд
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "3"))
+
+# Сколько секунд после SIGTERM/SIGINT даётся начатым операциям (PM2 kill_timeout и Docker stop_grace_period — больше)
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "25"))
+shutdown = GracefulShutdown(SHUTDOWN_TIMEOUT)
+
+
+async def notify_interrupted(bot: Bot, chat_id: int):
+    await bot.send_message(chat_id, INTERRUPTED_TEXT, reply_markup=get_main_menu_keyboard())
+
+
+dp.update.outer_middleware(InFlightMiddleware(shutdown, notify=notify_interrupted))
+
+# Лимит входящих обновлений на пользователя: жетоны в секунду и запас; USER_RATE=0 — выключен
+USER_RATE = float(os.getenv("USER_RATE", "1"))
+USER_BURST = float(os.getenv("USER_BURST", "60"))
+# Доплата за дорогие операции сверх веса самого обновления
+RSA_KEYGEN_COST = 25
+X509_KEYGEN_COST = 5
+KDF_COST = 10
+X509_BULK_ROW_COST = 0.5
+user_throttle = UserThrottle(rate=USER_RATE, capacity=USER_BURST,
+                             max_users=int(os.getenv("USER_RATE_MAX_USERS", "50000")))
+if USER_RATE > 0:
+    # До FSMContextMiddleware: отброшенное обновление не читает состояние из хранилища
+    dp.update.outer_middleware.unregister(dp.fsm)
+    dp.update.outer_middleware(ThrottlingMiddleware(user_throttle))
+    dp.update.outer_middleware(dp.fsm)
+
+metrics.gauge("bot_throttled_updates", "Обновления, отброшенные лимитом пользователя", lambda: user_throttle.stats()["dropped"])
+metrics.gauge("bot_fsm_live_contexts", "Активные FSM-контексты", lambda: storage.stats()["live_contexts"])
+metrics.gauge("telegram_outbound_queued", "Исходящие запросы в очереди планировщика", lambda: rate_limiter.stats()["queued"])
+metrics.gauge("telegram_outbound_throttled_seconds", "Суммарное ожидание из-за лимитов Telegram", lambda: rate_limiter.stats()["throttled_seconds"])
+metrics.gauge(
+    "crypto_pool_jobs", "Задания пула процессов", lambda: {("running",): pool_stats()["running"], ("queued",): pool_stats()["queued"]},
+    labelnames=("status",)
+)
 
 class CryptoSteps(StatesGroup):
     main_menu = State()
@@ -160,8 +244,11 @@ class CryptoSteps(StatesGroup):
     hash_choose_algorithm = State()
     hash_get_input = State()
     hash_info_display = State()
+    kdf_choose_algorithm = State()
+    kdf_get_password = State()
     
     ssh_wait_for_key_to_validate = State()
+    ssh_wait_for_weak_key_audit = State()
 
     # X.509 Certificate states
     x509_menu = State()
@@ -173,6 +260,16 @@ class CryptoSteps(StatesGroup):
     x509_get_locality = State()
     x509_get_email_address = State()
     x509_choose_self_signed_days = State()
+    x509_wait_for_bulk_csv = State()
+    x509_wait_for_bundle = State()
+
+    # Local CA states
+    x509_ca_menu = State()
+    x509_ca_wait_for_name = State()
+    x509_ca_wait_for_import = State()
+    x509_ca_wait_for_csr = State()
+    x509_ca_wait_for_leaf_cn = State()
+    x509_ca_wait_for_revoke_serial = State()
 
 
 def get_main_menu_keyboard() -> InlineKeyboardMarkup:
@@ -187,6 +284,7 @@ def get_ssh_menu_keyboard() -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="🔑 Сгенерировать новый SSH-ключ", callback_data="ssh_generate")],
         [InlineKeyboardButton(text="📤 Экспортировать существующий", callback_data="ssh_export")],
         [InlineKeyboardButton(text="🔎 Проверить SSH-ключ", callback_data="ssh_validate_key")],
+        [InlineKeyboardButton(text="🧮 Аудит слабых RSA-ключей", callback_data="ssh_weak_audit")],
         [InlineKeyboardButton(text="⬅️ Главное меню", callback_data="main_menu")]
     ])
 
@@ -204,6 +302,7 @@ def get_hash_algorithm_keyboard() -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="SHA-256", callback_data="hash_sha256"),
          InlineKeyboardButton(text="SHA-512", callback_data="hash_sha512")],
         [InlineKeyboardButton(text="BLAKE2b", callback_data="hash_blake2b")],
+        [InlineKeyboardButton(text="🔑 Хеш пароля (Argon2id, scrypt, PBKDF2)", callback_data="kdf_start")],
         [InlineKeyboardButton(text="ℹ️ Справка по алгоритмам", callback_data="hash_info")],
         [InlineKeyboardButton(text="⬅️ Главное меню", callback_data="main_menu")]
     ])
@@ -220,6 +319,20 @@ def get_hash_info_keyboard() -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
     ])
 
+def get_kdf_algorithm_keyboard() -> InlineKeyboardMarkup:
+    buttons = [InlineKeyboardButton(text=kdf.ALGORITHMS[name], callback_data=f"kdf_alg_{name}") for name in kdf.available()]
+    return InlineKeyboardMarkup(inline_keyboard=[
+        *(buttons[i:i + 2] for i in range(0, len(buttons), 2)),
+        [InlineKeyboardButton(text="⬅️ Назад к выбору алгоритма", callback_data="hash_start")],
+        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
+    ])
+
+def get_kdf_input_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="⬅️ Выбор KDF", callback_data="kdf_start")],
+        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
+    ])
+
 def get_ssh_validation_result_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔎 Проверить ещё один ключ", callback_data="ssh_validate_key")],
@@ -228,6 +341,13 @@ def get_ssh_validation_result_keyboard() -> InlineKeyboardMarkup:
     ])
 
 
+def get_weak_audit_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📚 Проверить собранные ключи", callback_data="ssh_weak_audit_collected")],
+        [InlineKeyboardButton(text="⬅️ SSH-меню", callback_data="ssh_menu")]
+    ])
+
+
 def get_ssh_export_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🚀 Экспортировать на сервер", callback_data="ssh_export_server")],
@@ -248,9 +368,35 @@ def get_x509_menu_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🛡️ Создать самоподписанный сертификат", callback_data="x509_generate_self_signed")],
         [InlineKeyboardButton(text="📝 Создать запрос CSR", callback_data="x509_generate_csr")],
+        [InlineKeyboardButton(text="📦 Пакетная генерация из CSV", callback_data="x509_bulk")],
+        [InlineKeyboardButton(text="🏛️ Локальный УЦ", callback_data="x509_ca_menu")],
+        [InlineKeyboardButton(text="🔍 Инспектор сертификатов", callback_data="x509_inspect")],
         [InlineKeyboardButton(text="⬅️ Главное меню", callback_data="main_menu")]
     ])
 
+def get_x509_ca_keyboard(has_ca: bool) -> InlineKeyboardMarkup:
+    if not has_ca:
+        return InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🆕 Создать УЦ", callback_data="x509_ca_create")],
+            [InlineKeyboardButton(text="📥 Импортировать УЦ", callback_data="x509_ca_import")],
+            [InlineKeyboardButton(text="⬅️ X.509 меню", callback_data="x509_menu")]
+        ])
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✍️ Подписать CSR", callback_data="x509_ca_sign"),
+         InlineKeyboardButton(text="🛡️ Выпустить сертификат", callback_data="x509_ca_issue")],
+        [InlineKeyboardButton(text="🚫 Отозвать", callback_data="x509_ca_revoke"),
+         InlineKeyboardButton(text="📜 CRL", callback_data="x509_ca_crl")],
+        [InlineKeyboardButton(text="⬇️ Сертификат УЦ", callback_data="x509_ca_cert")],
+        [InlineKeyboardButton(text="⬅️ X.509 меню", callback_data="x509_menu")]
+    ])
+
+def get_x509_bulk_type_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📝 CSR", callback_data="x509_bulk_csr"),
+         InlineKeyboardButton(text="🛡️ Самоподписанные", callback_data="x509_bulk_self_signed")],
+        [InlineKeyboardButton(text="❌ Отмена", callback_data="x509_menu")]
+    ])
+
 def get_x509_skip_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Пропустить (N/A)", callback_data="x509_skip")],
@@ -371,6 +517,66 @@ async def cmd_help(message: Message, state: FSMContext):
         )
         
 
+# Служебные команды профилирования доступны только пользователям из ADMIN_IDS
+ADMIN_IDS = {int(user_id) for user_id in os.getenv("ADMIN_IDS", "").replace(",", " ").split()}
+PROFILE_MAX_UPDATES = 1000
+profile_delivery: Optional[asyncio.Task] = None
+
+
+def is_admin(message: Message) -> bool:
+    return message.from_user is not None and message.from_user.id in ADMIN_IDS
+
+
+async def _deliver_profile(chat_id: int, report_future: asyncio.Future):
+    """Ждёт окончания профилирования и отправляет отчёт администратору"""
+    files = await report_future
+    for name, data in files.items():
+        await bot.send_document(chat_id, BufferedInputFile(data, filename=name))
+    await bot.send_message(
+        chat_id,
+        "📈 Профилирование завершено.\n"
+        "`profile.collapsed` — для flamegraph.pl / speedscope, `profile.pstats` — для `python -m pstats` / snakeviz.",
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+
+@dp.message(Command("profile"), is_admin)
+async def cmd_profile(message: Message):
+    """/profile [N|stop] — cProfile хендлеров и сэмплы стеков на N следующих апдейтах"""
+    arg = (message.text or "").split()[1:]
+    if arg and arg[0] == "stop":
+        handler_profiler.cancel()
+        await message.answer("⏹️ Профилирование остановлено")
+        return
+
+    updates = min(int(arg[0]), PROFILE_MAX_UPDATES) if arg and arg[0].isdigit() else 50
+    try:
+        report_future = handler_profiler.start(updates)
+    except RuntimeError as e:
+        await message.answer(f"❌ {e}. Остановить: /profile stop")
+        return
+    # Цикл событий держит на задачи только слабые ссылки: без своей ссылки доставку может собрать GC
+    global profile_delivery
+    profile_delivery = asyncio.create_task(_deliver_profile(message.chat.id, report_future))
+    await message.answer(f"🔬 Профилирую следующие {updates} апдейтов. Отчёт придёт сюда.")
+
+
+@dp.message(Command("memsnap"), is_admin)
+async def cmd_memsnap(message: Message):
+    """/memsnap [stop] — снимок tracemalloc и прирост выделений с прошлого снимка"""
+    if (message.text or "").split()[1:2] == ["stop"]:
+        memory_tracker.stop()
+        await message.answer("⏹️ tracemalloc выключен")
+        return
+
+    first, report = await asyncio.to_thread(memory_tracker.snapshot)
+    if first:
+        await message.answer(f"🧠 tracemalloc включён.\n\n{report}")
+    else:
+        await message.answer_document(BufferedInputFile(report.encode('utf-8'), filename="memory_diff.txt"),
+                                      caption="🧠 Прирост выделений памяти с прошлого снимка")
+
+
 @dp.callback_query(StateFilter(CryptoSteps.main_menu), lambda c: c.data == "ssh_menu")
 async def ssh_menu_handler(query: types.CallbackQuery, state: FSMContext):
     """SSH-меню"""
@@ -384,7 +590,7 @@ async def ssh_menu_handler(query: types.CallbackQuery, state: FSMContext):
 
 
 @dp.callback_query(StateFilter(CryptoSteps.main_menu), lambda c: c.data == "hash_start")
-@dp.callback_query(StateFilter(CryptoSteps.hash_choose_algorithm, CryptoSteps.hash_get_input, CryptoSteps.hash_info_display,CryptoSteps.x509_get_country_code,CryptoSteps.x509_get_state_province,CryptoSteps.x509_get_locality,CryptoSteps.x509_get_email_address), lambda c: c.data == "hash_start")
+@dp.callback_query(StateFilter(CryptoSteps.hash_choose_algorithm, CryptoSteps.hash_get_input, CryptoSteps.hash_info_display, CryptoSteps.kdf_choose_algorithm, CryptoSteps.kdf_get_password,CryptoSteps.x509_get_country_code,CryptoSteps.x509_get_state_province,CryptoSteps.x509_get_locality,CryptoSteps.x509_get_email_address), lambda c: c.data == "hash_start")
 async def hash_start_entry_point(query: types.CallbackQuery, state: FSMContext):
     """Прямой вход в выбор алгоритма хеширования из главного меню или кнопки 'Назад'."""
     await query.message.edit_text(
@@ -395,7 +601,7 @@ async def hash_start_entry_point(query: types.CallbackQuery, state: FSMContext):
     )
     await state.set_state(CryptoSteps.hash_choose_algorithm)
 
-@dp.callback_query(StateFilter(CryptoSteps.main_menu, CryptoSteps.x509_get_common_name,CryptoSteps.x509_get_organization_name,), lambda c: c.data == "x509_menu")
+@dp.callback_query(StateFilter(CryptoSteps.main_menu, CryptoSteps.x509_menu, CryptoSteps.x509_ca_menu, CryptoSteps.x509_get_common_name,CryptoSteps.x509_get_organization_name,), lambda c: c.data == "x509_menu")
 async def x509_menu_handler(query: types.CallbackQuery, state: FSMContext):
     """X.509 Сертификаты - главное меню"""
     await query.message.edit_text(
@@ -595,6 +801,39 @@ async def _finalize_x509_process(state: FSMContext, message: types.Message):
         await _generate_x509_assets(state, message)
 
 
+async def _read_document_or_text(message: Message) -> bytes:
+    """Содержимое присланного документа (до 20 МБ) или текста сообщения."""
+    if message.document:
+        if message.document.file_size and message.document.file_size > 20 * 1024 * 1024:
+            raise ValueError("Файл больше 20 МБ (лимит Bot API)")
+        with metrics.FILE_DOWNLOAD_SECONDS.time():
+            file_info = await bot.get_file(message.document.file_id)
+            file = await bot.download_file(file_info.file_path)
+        return file.read()
+    return (message.text or "").encode('utf-8')
+
+
+# Доставка сгенерированных файлов: separate — по одному, zip — одним архивом, album — одной группой документов
+ARTIFACT_DELIVERY = os.getenv("ARTIFACT_DELIVERY", "separate").lower()
+
+
+async def send_artifacts(chat_id: int, files: List[Tuple[str, bytes, str]], zip_name: str, zip_caption: str):
+    """Отправляет файлы [(имя, содержимое, подпись)] согласно ARTIFACT_DELIVERY."""
+    if ARTIFACT_DELIVERY == "zip":
+        archive = await asyncio.to_thread(x509_tools.build_zip, {name: data for name, data, _ in files})
+        await bot.send_document(chat_id, BufferedInputFile(archive, filename=zip_name),
+                                caption=zip_caption, parse_mode=ParseMode.MARKDOWN)
+    elif ARTIFACT_DELIVERY == "album" and len(files) > 1:
+        await bot.send_media_group(chat_id, [
+            InputMediaDocument(media=BufferedInputFile(data, filename=name), caption=caption, parse_mode=ParseMode.MARKDOWN)
+            for name, data, caption in files
+        ])
+    else:
+        for name, data, caption in files:
+            await bot.send_document(chat_id, BufferedInputFile(data, filename=name),
+                                    caption=caption, parse_mode=ParseMode.MARKDOWN)
+
+
 async def _generate_x509_assets(state: FSMContext, message: types.Message):
     """Генерирует CSR или самоподписанный сертификат и отправляет пользователю."""
     user_data = await state.get_data()
@@ -604,75 +843,29 @@ async def _generate_x509_assets(state: FSMContext, message: types.Message):
     self_signed_days = user_data.get('self_signed_days', 365)
 
     generation_msg = await message.answer(f"⏳ Генерирую {'CSR' if is_csr else 'самоподписанный сертификат'} и приватный ключ...", parse_mode=ParseMode.MARKDOWN)
+    user_throttle.charge(state.key.user_id, X509_KEYGEN_COST)
 
     try:
-        private_key = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=2048
-        )
-        private_pem = private_key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption()
-        )
-        
-        subject_name_attrs = []
-        if 'CN' in cert_details: subject_name_attrs.append(x509.NameAttribute(NameOID.COMMON_NAME, cert_details['CN']))
-        if 'O' in cert_details: subject_name_attrs.append(x509.NameAttribute(NameOID.ORGANIZATION_NAME, cert_details['O']))
-        if 'C' in cert_details: subject_name_attrs.append(x509.NameAttribute(NameOID.COUNTRY_NAME, cert_details['C']))
-        if 'ST' in cert_details: subject_name_attrs.append(x509.NameAttribute(NameOID.STATE_OR_PROVINCE_NAME, cert_details['ST']))
-        if 'L' in cert_details: subject_name_attrs.append(x509.NameAttribute(NameOID.LOCALITY_NAME, cert_details['L']))
-        if 'Email' in cert_details: subject_name_attrs.append(x509.NameAttribute(NameOID.EMAIL_ADDRESS, cert_details['Email']))
-
-        subject = x509.Name(subject_name_attrs)
+        with metrics.CRYPTO_SECONDS.time(operation="csr" if is_csr else "self_signed", algorithm="RSA", size=x509_tools.X509_KEY_SIZE):
+            asset_pem, private_pem = await run_in_pool(
+                x509_tools.generate_x509_assets, cert_details, is_csr, self_signed_days
+            )
 
         if is_csr:
-            csr_builder = x509.CertificateSigningRequestBuilder().subject_name(subject)
-            cn_value = cert_details.get('CN', '')
-            if cn_value and ('.' in cn_value or cn_value.endswith('.local')):
-                csr_builder = csr_builder.add_extension(
-                    x509.SubjectAlternativeName([x509.DNSName(cn_value)]), 
-                    critical=False
-                )
-            csr = csr_builder.sign(private_key, hashes.SHA256())
-            
-            csr_pem = csr.public_bytes(serialization.Encoding.PEM)
-
             await generation_msg.edit_text(f"✅ *Запрос CSR для '{cert_details.get('CN', 'N/A')}' готов!*", parse_mode=ParseMode.MARKDOWN)
-            await bot.send_document(chat_id, BufferedInputFile(csr_pem, filename=f"{cert_details.get('CN', 'csr')}.csr"), caption="📝 Ваш CSR-запрос.")
-            await bot.send_document(chat_id, BufferedInputFile(private_pem, filename=f"{cert_details.get('CN', 'private_key')}.pem"), caption="🔐 *Приватный ключ* к вашему CSR.")
+            files = [
+                (f"{cert_details.get('CN', 'csr')}.csr", asset_pem, "📝 Ваш CSR-запрос."),
+                (f"{cert_details.get('CN', 'private_key')}.pem", private_pem, "🔐 *Приватный ключ* к вашему CSR."),
+            ]
+            zip_caption = "📦 CSR-запрос и *приватный ключ* к нему."
         else:
-            builder = x509.CertificateBuilder().subject_name(
-                subject
-            ).issuer_name(
-                subject
-            ).public_key(
-                private_key.public_key()
-            ).serial_number(
-                x509.random_serial_number()
-            ).not_valid_before(
-                datetime.now(timezone.utc)
-            ).not_valid_after(
-                datetime.now(timezone.utc) + timedelta(days=self_signed_days)
-            )
-            cn_value = cert_details.get('CN', '')
-            # Only add SAN if CN looks like a domain name
-            if cn_value and ('.' in cn_value or cn_value.endswith('.local')):
-                builder = builder.add_extension(
-                    x509.SubjectAlternativeName([x509.DNSName(cn_value)]),
-                    critical=False,
-                )
-            builder = builder.add_extension(
-                x509.BasicConstraints(ca=False, path_length=None),
-                critical=True,
-            )
-
-            certificate = builder.sign(private_key, hashes.SHA256())
-            cert_pem = certificate.public_bytes(serialization.Encoding.PEM)
-
             await generation_msg.edit_text(f"✅ *Самоподписанный сертификат для '{cert_details.get('CN', 'N/A')}' готов!*", parse_mode=ParseMode.MARKDOWN)
-            await bot.send_document(chat_id, BufferedInputFile(cert_pem, filename=f"{cert_details.get('CN', 'certificate')}.crt"), caption=f"🛡️ Ваш самоподписанный сертификат (срок действия: {self_signed_days} дней).")
-            await bot.send_document(chat_id, BufferedInputFile(private_pem, filename=f"{cert_details.get('CN', 'private_key')}.pem"), caption="🔐 *Приватный ключ* к вашему сертификату.")
+            files = [
+                (f"{cert_details.get('CN', 'certificate')}.crt", asset_pem, f"🛡️ Ваш самоподписанный сертификат (срок действия: {self_signed_days} дней)."),
+                (f"{cert_details.get('CN', 'private_key')}.pem", private_pem, "🔐 *Приватный ключ* к вашему сертификату."),
+            ]
+            zip_caption = f"📦 Самоподписанный сертификат (срок действия: {self_signed_days} дней) и *приватный ключ* к нему."
+        await send_artifacts(chat_id, files, f"{x509_tools.safe_filename(cert_details.get('CN', 'x509'))}.zip", zip_caption)
 
         await bot.send_message(
             chat_id,
@@ -694,6 +887,416 @@ async def _generate_x509_assets(state: FSMContext, message: types.Message):
         await state.set_state(CryptoSteps.x509_menu)
 
 
+X509_BULK_MAX_ROWS = int(os.getenv("X509_BULK_MAX_ROWS", "1000"))
+X509_BULK_MAX_REPORTED_ERRORS = 15
+X509_BULK_PROGRESS_STEPS = 10
+
+
+@dp.callback_query(StateFilter(CryptoSteps.x509_menu), lambda c: c.data == "x509_bulk")
+async def x509_bulk_choose_type(query: types.CallbackQuery, state: FSMContext):
+    """Пакетная генерация из CSV - выбор типа"""
+    await query.message.edit_text(
+        "📦 *Пакетная генерация из CSV*\n\n"
+        "Что сгенерировать для каждой строки?",
+        reply_markup=get_x509_bulk_type_keyboard(),
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+
+@dp.callback_query(StateFilter(CryptoSteps.x509_menu), lambda c: c.data in ["x509_bulk_csr", "x509_bulk_self_signed"])
+async def x509_bulk_request_csv(query: types.CallbackQuery, state: FSMContext):
+    """Пакетная генерация из CSV - запрос файла"""
+    is_csr = (query.data == "x509_bulk_csr")
+    await state.update_data(is_csr=is_csr)
+    await query.message.edit_text(
+        f"📦 *Пакетная генерация {'CSR' if is_csr else 'самоподписанных сертификатов'}*\n\n"
+        f"Отправьте CSV-файл (или текст) с заголовком:\n"
+        f"`CN,O,C,ST,L,Email,SANs,days`\n\n"
+        f"• Обязательна только колонка *CN*\n"
+        f"• *SANs* — через `;` (домены и IP)\n"
+        f"• *days* — срок действия, по умолчанию 365\n"
+        f"• Не более {X509_BULK_MAX_ROWS} строк",
+        reply_markup=get_cancel_keyboard(),
+        parse_mode=ParseMode.MARKDOWN
+    )
+    await state.set_state(CryptoSteps.x509_wait_for_bulk_csv)
+
+
+@dp.message(StateFilter(CryptoSteps.x509_wait_for_bulk_csv))
+async def x509_bulk_process_csv(message: Message, state: FSMContext):
+    """Пакетная генерация из CSV - параллельная генерация в пуле процессов"""
+    user_data = await state.get_data()
+    is_csr = user_data.get('is_csr', True)
+    chat_id = message.chat.id
+    result_msg = await message.answer("⏳ Читаю CSV...")
+
+    try:
+        content = (await _read_document_or_text(message)).decode('utf-8-sig', errors='replace')
+
+        rows = x509_tools.parse_subjects_csv(content, X509_BULK_MAX_ROWS)
+    except ValueError as e:
+        await result_msg.edit_text(
+            f"*❌ Ошибка в CSV:*\n\n`{str(e)[:150]}`\n\nИсправьте файл и отправьте снова:",
+            reply_markup=get_cancel_keyboard(),
+            parse_mode=ParseMode.MARKDOWN
+        )
+        return
+    except Exception as e:
+        logger.error(f"Ошибка загрузки CSV: {e}")
+        await result_msg.edit_text(f"*💥 Ошибка загрузки:* `{str(e)[:100]}`", reply_markup=get_x509_menu_keyboard(), parse_mode=ParseMode.MARKDOWN)
+        return
+
+    if not rows:
+        await result_msg.edit_text("❌ В CSV нет ни одной строки данных.", reply_markup=get_cancel_keyboard())
+        return
+
+    kind = 'CSR' if is_csr else 'сертификатов'
+    await result_msg.edit_text(f"⏳ Генерирую {len(rows)} {kind} в {pool_stats()['workers']} процессах...")
+    # Пачек не меньше X509_BULK_PROGRESS_STEPS, чтобы прогресс двигался и на одном ядре
+    chunk_size = -(-len(rows) // max(pool_stats()['workers'], X509_BULK_PROGRESS_STEPS))
+
+    user_throttle.charge(state.key.user_id, X509_BULK_ROW_COST * len(rows))
+    started = time.perf_counter()
+    try:
+        async with ProgressReporter(result_msg, f"⏳ Генерирую {kind} с ключами", len(rows), interval=PROGRESS_INTERVAL) as progress:
+            results = await map_in_pool(
+                functools.partial(x509_tools.generate_x509_rows, is_csr=is_csr),
+                rows,
+                chunk_size=chunk_size,
+                on_progress=progress.advance
+            )
+        archive = await asyncio.to_thread(x509_tools.build_x509_zip, results, is_csr)
+    except PoolBusyError:
+        await result_msg.edit_text("⚠️ Сервер перегружен, попробуйте позже.", reply_markup=get_x509_menu_keyboard())
+        return
+    except Exception as e:
+        logger.error(f"Ошибка пакетной генерации X.509: {e}")
+        await result_msg.edit_text(f"*💥 Ошибка генерации:* `{str(e)[:100]}`", reply_markup=get_x509_menu_keyboard(), parse_mode=ParseMode.MARKDOWN)
+        return
+    elapsed = time.perf_counter() - started
+
+    errors = [(row_no, cn, error) for row_no, cn, _, _, error in results if error]
+    succeeded = len(results) - len(errors)
+
+    text = (
+        f"✅ *Пакетная генерация завершена*\n\n"
+        f"**Успешно:** {succeeded} из {len(results)}\n"
+        f"**Ошибок:** {len(errors)}\n"
+        f"**Время:** {elapsed:.1f} с ({succeeded / max(elapsed, 1e-6):.1f} шт/с)\n"
+    )
+    if errors:
+        text += "\n*Ошибки:*\n"
+        for row_no, cn, error in errors[:X509_BULK_MAX_REPORTED_ERRORS]:
+            text += f"• строка {row_no}: `{error[:80]}`\n"
+        if len(errors) > X509_BULK_MAX_REPORTED_ERRORS:
+            text += f"…полный список в `errors.txt`\n"
+
+    await result_msg.edit_text(text, parse_mode=ParseMode.MARKDOWN)
+    if succeeded or errors:
+        await bot.send_document(
+            chat_id,
+            BufferedInputFile(archive, filename=f"x509_bulk_{'csr' if is_csr else 'certs'}.zip"),
+            caption="📦 CSR/сертификаты и приватные ключи. 🔐 Храните ключи в секрете!"
+        )
+    await bot.send_message(chat_id, "🪪 *X.509 Сертификаты*", reply_markup=get_x509_menu_keyboard(), parse_mode=ParseMode.MARKDOWN)
+    await state.clear()
+    await state.set_state(CryptoSteps.x509_menu)
+
+
+@dp.callback_query(StateFilter(CryptoSteps.x509_menu), lambda c: c.data == "x509_inspect")
+async def x509_inspect_prompt(query: types.CallbackQuery, state: FSMContext):
+    """Инспектор сертификатов - запрос пачки"""
+    await query.message.edit_text(
+        "🔍 *Инспектор сертификатов*\n\n"
+        "Отправьте файл с сертификатами (PEM-пачка, DER или PKCS#7) или вставьте PEM текстом.\n\n"
+        "Покажу срок действия, тип и размер ключа, SAN, построю цепочки и найду недостающие промежуточные сертификаты.",
+        reply_markup=get_cancel_keyboard(),
+        parse_mode=ParseMode.MARKDOWN
+    )
+    await state.set_state(CryptoSteps.x509_wait_for_bundle)
+
+
+@dp.message(StateFilter(CryptoSteps.x509_wait_for_bundle))
+async def x509_inspect_bundle(message: Message, state: FSMContext):
+    """Инспектор сертификатов - разбор и построение цепочек в пуле процессов"""
+    chat_id = message.chat.id
+    result_msg = await message.answer("⏳ Разбираю сертификаты...")
+
+    try:
+        data = await _read_document_or_text(message)
+        report = await run_in_pool(cert_inspect.inspect_bundle, data)
+    except PoolBusyError:
+        await result_msg.edit_text("⚠️ Сервер перегружен, попробуйте позже.", reply_markup=get_x509_menu_keyboard())
+        return
+    except Exception as e:
+        logger.error(f"Ошибка инспекции сертификатов: {e}")
+        await result_msg.edit_text(f"*💥 Ошибка разбора:* `{str(e)[:100]}`", reply_markup=get_cancel_keyboard(), parse_mode=ParseMode.MARKDOWN)
+        return
+
+    certificates = report["certificates"]
+    if not certificates:
+        await result_msg.edit_text("❌ Сертификаты не найдены. Отправьте PEM, DER или PKCS#7:", reply_markup=get_cancel_keyboard())
+        return
+
+    chains = report["chains"]
+    incomplete = sum(1 for chain in chains if not chain["complete"])
+    text = (
+        f"🔍 *Результат инспекции*\n\n"
+        f"**Сертификатов:** {len(certificates)} (дубликатов: {report['duplicates']})\n"
+        f"**Цепочек:** {len(chains)}, неполных: {incomplete}\n"
+        f"**Истекли:** {sum(1 for c in certificates if c['expired'])}\n"
+        f"**Истекают в ближайшие {cert_inspect.EXPIRY_WARNING_DAYS} дней:** {sum(1 for c in certificates if c['expiring'])}\n"
+    )
+    if report["parse_errors"]:
+        text += f"**Ошибок разбора:** {len(report['parse_errors'])}\n"
+    if report["missing_issuers"]:
+        text += "\n*Не хватает издателей:*\n"
+        for issuer, count in list(report["missing_issuers"].items())[:10]:
+            text += f"• `{issuer[:60]}` (цепочек: {count})\n"
+
+    await result_msg.edit_text(text, parse_mode=ParseMode.MARKDOWN)
+    await bot.send_document(
+        chat_id,
+        BufferedInputFile(cert_inspect.format_report(report).encode('utf-8'), filename="certificate_report.txt"),
+        caption="📄 Подробный отчёт по цепочкам"
+    )
+    await bot.send_message(chat_id, "🪪 *X.509 Сертификаты*", reply_markup=get_x509_menu_keyboard(), parse_mode=ParseMode.MARKDOWN)
+    await state.set_state(CryptoSteps.x509_menu)
+
+
+CA_DIR = os.path.join(BOT_DIR, 'data', 'ca')
+CA_KEY_PASSPHRASE = os.getenv("CA_KEY_PASSPHRASE", "").encode('utf-8') or None
+CA_SERIAL_MODE = os.getenv("CA_SERIAL_MODE", "random")
+CA_LEAF_DAYS = int(os.getenv("CA_LEAF_DAYS", "365"))
+CA_MAX_REPORTED_ERRORS = 10
+_local_cas: Dict[int, "ca_tools.LocalCA"] = {}
+
+
+async def get_local_ca(chat_id: int) -> Optional["ca_tools.LocalCA"]:
+    """УЦ чата: из памяти, а при первом обращении — с диска (в потоке, чтобы не держать цикл событий)."""
+    ca = _local_cas.get(chat_id)
+    if ca is None:
+        ca = await asyncio.to_thread(
+            ca_tools.LocalCA.load, os.path.join(CA_DIR, str(chat_id)), CA_KEY_PASSPHRASE, CA_SERIAL_MODE
+        )
+        if ca is not None:
+            ca = _local_cas.setdefault(chat_id, ca)
+    return ca
+
+
+def _ca_summary(ca: Optional["ca_tools.LocalCA"]) -> str:
+    if ca is None:
+        return (
+            "🏛️ *Локальный УЦ*\n\n"
+            "У вас пока нет удостоверяющего центра.\n"
+            "Создайте новый или импортируйте существующий (сертификат + ключ в PEM)."
+        )
+    return (
+        f"🏛️ *Локальный УЦ*\n\n"
+        f"**Издатель:** `{ca.issuer.rfc4514_string()}`\n"
+        f"**Действует до:** {ca.certificate.not_valid_after_utc:%Y-%m-%d}\n"
+        f"**Выпущено:** {ca.issued}\n"
+        f"**Отозвано:** {len(ca.revoked)}"
+    )
+
+
+@dp.callback_query(StateFilter(CryptoSteps.x509_menu, CryptoSteps.x509_ca_menu), lambda c: c.data == "x509_ca_menu")
+async def x509_ca_menu_handler(query: types.CallbackQuery, state: FSMContext):
+    """Меню локального УЦ"""
+    ca = await get_local_ca(query.message.chat.id)
+    await query.message.edit_text(_ca_summary(ca), reply_markup=get_x509_ca_keyboard(ca is not None), parse_mode=ParseMode.MARKDOWN)
+    await state.set_state(CryptoSteps.x509_ca_menu)
+
+
+async def _send_ca_menu(chat_id: int, state: FSMContext, prefix: str = ""):
+    ca = await get_local_ca(chat_id)
+    await bot.send_message(chat_id, prefix + _ca_summary(ca), reply_markup=get_x509_ca_keyboard(ca is not None), parse_mode=ParseMode.MARKDOWN)
+    await state.set_state(CryptoSteps.x509_ca_menu)
+
+
+@dp.callback_query(StateFilter(CryptoSteps.x509_ca_menu), lambda c: c.data in ["x509_ca_create", "x509_ca_import", "x509_ca_sign", "x509_ca_issue", "x509_ca_revoke"])
+async def x509_ca_request_input(query: types.CallbackQuery, state: FSMContext):
+    """Запрос данных для операций УЦ"""
+    prompts = {
+        "x509_ca_create": (CryptoSteps.x509_ca_wait_for_name,
+                           "🆕 Введите *Common Name* для УЦ (например, `My Lab Root CA`):"),
+        "x509_ca_import": (CryptoSteps.x509_ca_wait_for_import,
+                           "📥 Отправьте PEM-файл с *сертификатом УЦ и незашифрованным приватным ключом*.\n\n"
+                           "_Сообщение с ключом будет удалено из чата._"),
+        "x509_ca_sign": (CryptoSteps.x509_ca_wait_for_csr,
+                         f"✍️ Отправьте один или несколько CSR в PEM (файлом или текстом).\n"
+                         f"Срок действия: {CA_LEAF_DAYS} дней."),
+        "x509_ca_issue": (CryptoSteps.x509_ca_wait_for_leaf_cn,
+                          "🛡️ Введите *Common Name* и, при желании, дополнительные SAN через пробел:\n\n"
+                          "`example.com www.example.com 10.0.0.1`"),
+        "x509_ca_revoke": (CryptoSteps.x509_ca_wait_for_revoke_serial,
+                           "🚫 Введите серийный номер сертификата (hex, как в `openssl x509 -serial`):"),
+    }
+    next_state, prompt = prompts[query.data]
+    if query.data not in ["x509_ca_create", "x509_ca_import"] and await get_local_ca(query.message.chat.id) is None:
+        await query.answer("Сначала создайте или импортируйте УЦ", show_alert=True)
+        return
+    await query.message.edit_text(prompt, reply_markup=get_cancel_keyboard(), parse_mode=ParseMode.MARKDOWN)
+    await state.set_state(next_state)
+
+
+@dp.message(StateFilter(CryptoSteps.x509_ca_wait_for_name))
+async def x509_ca_create(message: Message, state: FSMContext):
+    """Создание нового УЦ"""
+    common_name = (message.text or "").strip()
+    if not common_name:
+        await message.answer("❌ Имя УЦ не может быть пустым. Введите Common Name:", reply_markup=get_cancel_keyboard())
+        return
+
+    chat_id = message.chat.id
+    _local_cas[chat_id] = await asyncio.to_thread(
+        ca_tools.LocalCA.create, os.path.join(CA_DIR, str(chat_id)), common_name,
+        passphrase=CA_KEY_PASSPHRASE, serial_mode=CA_SERIAL_MODE
+    )
+    logger.info(f"Создан локальный УЦ для чата {chat_id}")
+    await _send_ca_menu(chat_id, state, "✅ *УЦ создан!*\n\n")
+
+
+@dp.message(StateFilter(CryptoSteps.x509_ca_wait_for_import))
+async def x509_ca_import(message: Message, state: FSMContext):
+    """Импорт существующего УЦ"""
+    chat_id = message.chat.id
+    try:
+        bundle = await _read_document_or_text(message)
+        _local_cas[chat_id] = await asyncio.to_thread(
+            ca_tools.LocalCA.import_pem, os.path.join(CA_DIR, str(chat_id)), bundle,
+            passphrase=CA_KEY_PASSPHRASE, serial_mode=CA_SERIAL_MODE
+        )
+    except Exception as e:
+        await message.answer(
+            f"*❌ Не удалось импортировать УЦ:*\n\n`{str(e)[:150]}`\n\nПопробуйте снова:",
+            reply_markup=get_cancel_keyboard(),
+            parse_mode=ParseMode.MARKDOWN
+        )
+        return
+    finally:
+        try:
+            await message.delete()
+        except Exception:
+            pass
+
+    logger.info(f"Импортирован локальный УЦ для чата {chat_id}")
+    await _send_ca_menu(chat_id, state, "✅ *УЦ импортирован!*\n\n")
+
+
+@dp.message(StateFilter(CryptoSteps.x509_ca_wait_for_csr))
+async def x509_ca_sign_csrs(message: Message, state: FSMContext):
+    """Подпись одного или пачки CSR локальным УЦ"""
+    chat_id = message.chat.id
+    ca = await get_local_ca(chat_id)
+    if ca is None:
+        await _send_ca_menu(chat_id, state)
+        return
+    try:
+        csr_blocks = x509_tools.split_pem_blocks(await _read_document_or_text(message), b'CERTIFICATE REQUEST')
+    except ValueError as e:
+        await message.answer(f"❌ {e}", reply_markup=get_cancel_keyboard())
+        return
+    if not csr_blocks:
+        await message.answer("❌ Не найдено ни одного блока `CERTIFICATE REQUEST`. Отправьте CSR в PEM:", reply_markup=get_cancel_keyboard(), parse_mode=ParseMode.MARKDOWN)
+        return
+
+    started = time.perf_counter()
+    results = await asyncio.to_thread(ca.sign_csrs, csr_blocks, CA_LEAF_DAYS)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    metrics.CRYPTO_SECONDS.observe(
+        elapsed_ms / 1000, operation="ca_sign" if len(csr_blocks) == 1 else "ca_sign_batch", algorithm="ECDSA", size="P-256"
+    )
+    signed = [(cn, pem) for cn, pem, error in results if pem]
+    errors = [f"CSR #{index}: {error}" for index, (_, _, error) in enumerate(results, start=1) if error]
+
+    if len(signed) == 1 and not errors:
+        cn, pem = signed[0]
+        await bot.send_document(chat_id, BufferedInputFile(pem, filename=f"{x509_tools.safe_filename(cn)}.crt"), caption=f"✅ Сертификат для `{cn}` подписан за {elapsed_ms:.1f} мс", parse_mode=ParseMode.MARKDOWN)
+        await _send_ca_menu(chat_id, state)
+    elif signed:
+        files = {f"{i:04d}_{x509_tools.safe_filename(cn)}.crt": pem for i, (cn, pem) in enumerate(signed, start=1)}
+        if errors:
+            files["errors.txt"] = "\n".join(errors).encode('utf-8')
+        await bot.send_document(chat_id, BufferedInputFile(x509_tools.build_zip(files), filename="signed_certificates.zip"), caption=f"✅ Подписано {len(signed)} из {len(results)} за {elapsed_ms:.0f} мс")
+        await _send_ca_menu(chat_id, state, f"⚠️ Ошибок: {len(errors)}, подробности в errors.txt\n\n" if errors else "")
+    else:
+        # Не подписан ни один CSR: причины показываются прямо в сообщении
+        report = "".join(f"• `{error[:150].replace('`', chr(39))}`\n" for error in errors[:CA_MAX_REPORTED_ERRORS])
+        if len(errors) > CA_MAX_REPORTED_ERRORS:
+            report += f"…и ещё {len(errors) - CA_MAX_REPORTED_ERRORS}\n"
+        await _send_ca_menu(chat_id, state, f"❌ *Не подписан ни один CSR:*\n{report}\n")
+
+
+@dp.message(StateFilter(CryptoSteps.x509_ca_wait_for_leaf_cn))
+async def x509_ca_issue_leaf(message: Message, state: FSMContext):
+    """Выпуск сертификата с новым ключом от локального УЦ"""
+    names = (message.text or "").split()
+    if not names:
+        await message.answer("❌ Введите хотя бы Common Name:", reply_markup=get_cancel_keyboard())
+        return
+
+    chat_id = message.chat.id
+    ca = await get_local_ca(chat_id)
+    if ca is None:
+        await _send_ca_menu(chat_id, state)
+        return
+    cert_details = {'CN': names[0]}
+    try:
+        # Проверка имени до генерации ключа: на ошибку ввода не тратится место в пуле
+        x509_tools.build_subject(cert_details)
+        x509_tools.build_san(cert_details, names[1:])
+    except ValueError as e:
+        await message.answer(f"❌ {e}\n\nВведите Common Name и SAN снова:", reply_markup=get_cancel_keyboard())
+        return
+
+    user_throttle.charge(message.from_user.id, X509_KEYGEN_COST)
+    try:
+        with metrics.CRYPTO_SECONDS.time(operation="ca_issue", algorithm="RSA", size=x509_tools.X509_KEY_SIZE):
+            key_pem = await run_in_pool(ca_tools.generate_leaf_key)
+            cert_pem, key_pem = await asyncio.to_thread(ca.issue_leaf, cert_details, CA_LEAF_DAYS, names[1:], key_pem)
+    except PoolBusyError:
+        await message.answer("⚠️ Сервер перегружен, попробуйте позже.", reply_markup=get_cancel_keyboard())
+        return
+    base = x509_tools.safe_filename(names[0])
+    await bot.send_document(chat_id, BufferedInputFile(cert_pem, filename=f"{base}.crt"), caption=f"🛡️ Сертификат для `{names[0]}` ({CA_LEAF_DAYS} дней)", parse_mode=ParseMode.MARKDOWN)
+    await bot.send_document(chat_id, BufferedInputFile(key_pem, filename=f"{base}.pem"), caption="🔐 *Приватный ключ* к сертификату.", parse_mode=ParseMode.MARKDOWN)
+    await _send_ca_menu(chat_id, state)
+
+
+@dp.message(StateFilter(CryptoSteps.x509_ca_wait_for_revoke_serial))
+async def x509_ca_revoke_serial(message: Message, state: FSMContext):
+    """Отзыв сертификата по серийному номеру"""
+    raw_serial = (message.text or "").strip().lower().replace(':', '').removeprefix('serial=').removeprefix('0x')
+    try:
+        serial = int(raw_serial, 16)
+    except ValueError:
+        await message.answer("❌ Серийный номер должен быть в hex. Попробуйте снова:", reply_markup=get_cancel_keyboard())
+        return
+
+    ca = await get_local_ca(message.chat.id)
+    if ca is None:
+        await _send_ca_menu(message.chat.id, state)
+        return
+    await asyncio.to_thread(ca.revoke, serial)
+    await _send_ca_menu(message.chat.id, state, f"✅ Серийный номер `{serial:X}` отозван. Обновите CRL.\n\n")
+
+
+@dp.callback_query(StateFilter(CryptoSteps.x509_ca_menu), lambda c: c.data in ["x509_ca_crl", "x509_ca_cert"])
+async def x509_ca_download(query: types.CallbackQuery, state: FSMContext):
+    """Выгрузка CRL или сертификата УЦ"""
+    await query.answer()
+    chat_id = query.message.chat.id
+    ca = await get_local_ca(chat_id)
+    if ca is None:
+        return
+    if query.data == "x509_ca_crl":
+        crl = await asyncio.to_thread(ca.generate_crl)
+        await bot.send_document(chat_id, BufferedInputFile(crl, filename="ca.crl"), caption=f"📜 CRL #{ca.crl_number}, отозвано: {len(ca.revoked)}")
+    else:
+        await bot.send_document(chat_id, BufferedInputFile(ca.certificate_pem(), filename="ca.crt"), caption="🏛️ Сертификат УЦ")
+
+
 @dp.callback_query(StateFilter(CryptoSteps.ssh_menu), lambda c: c.data == "ssh_generate")
 async def ssh_start_key_generation(query: types.CallbackQuery, state: FSMContext):
     """Начало генерации SSH-ключа"""
@@ -736,7 +1339,7 @@ async def ssh_process_existing_public_key(message: Message, state: FSMContext):
     public_key_input = message.text.strip() if message.text else ""
     
     try:
-        load_ssh_public_key(public_key_input.encode('utf-8'))
+        parse_ssh_public_key(public_key_input)
         
         await state.update_data(public_key=public_key_input)
         await message.answer(
@@ -776,7 +1379,7 @@ async def ssh_process_key_for_validation(message: Message, state: FSMContext):
     validation_msg = await message.answer(f"⏳ Анализирую ваш ключ...", parse_mode=ParseMode.MARKDOWN)
 
     try:
-        public_key_obj = load_ssh_public_key(public_key_input.encode('utf-8'))
+        public_key_obj, fingerprints, blob_digest = parse_ssh_public_key(public_key_input)
 
         key_type_str = "Неизвестный тип"
         key_size = "N/A"
@@ -788,8 +1391,6 @@ async def ssh_process_key_for_validation(message: Message, state: FSMContext):
             key_type_str = "Ed25519"
             key_size = "256 бит"
 
-        fingerprints = calculate_ssh_fingerprints(public_key_obj)
-        
         response_text = f"✅ *Ключ успешно проанализирован!*\n\n" \
                         f"**Тип ключа:** `{key_type_str}`\n" \
                         f"**Размер:** `{key_size}`\n\n"
@@ -798,6 +1399,14 @@ async def ssh_process_key_for_validation(message: Message, state: FSMContext):
             response_text += f"**SHA256 Fingerprint:**\n`{fingerprints['SHA256']}`\n\n"
         if "MD5" in fingerprints:
             response_text += f"**MD5 Fingerprint (устарел):**\n`{fingerprints['MD5']}`\n\n"
+
+        if fingerprint_index is not None:
+            seen_count, seen_chats = await fingerprint_index.lookup(blob_digest)
+            if seen_count:
+                response_text += f"👥 *Ключ уже встречался:* {seen_count} раз(а), в {seen_chats} чат(ах)\n\n"
+            else:
+                response_text += "🆕 *Ключ встречается впервые*\n\n"
+            fingerprint_index.record(blob_digest, chat_id)
         
         await validation_msg.edit_text(response_text,
                                         reply_markup=get_ssh_validation_result_keyboard(),
@@ -826,30 +1435,110 @@ async def ssh_process_key_for_validation(message: Message, state: FSMContext):
     await state.set_state(CryptoSteps.ssh_menu)
     
     
-def calculate_ssh_fingerprints(public_key_obj) -> Dict[str, str]:
-    """Вычисляет MD5 и SHA256 fingerprint для публичного SSH-ключа."""
-    fingerprints = {}
+WEAK_AUDIT_MAX_REPORTED = 20
 
-    try:
-        ssh_format_bytes = public_key_obj.public_bytes(
-            encoding=serialization.Encoding.OpenSSH,
-            format=serialization.PublicFormat.OpenSSH
+
+@dp.callback_query(StateFilter(CryptoSteps.ssh_menu), lambda c: c.data == "ssh_weak_audit")
+async def ssh_weak_audit_prompt(query: types.CallbackQuery, state: FSMContext):
+    """Запрос набора RSA-ключей для поиска общих простых множителей"""
+    await query.message.edit_text(
+        "🧮 *Аудит слабых RSA-ключей*\n\n"
+        "Ключи, сгенерированные с плохой энтропией (роутеры, IoT), иногда делят "
+        "простые множители — тогда их приватные ключи восстанавливаются за секунды.\n\n"
+        "Отправьте публичные ключи текстом или файлом (`authorized_keys`, по одному в строке) "
+        "или проверьте ключи, которые бот уже видел при валидации:",
+        reply_markup=get_weak_audit_keyboard(),
+        parse_mode=ParseMode.MARKDOWN
+    )
+    await state.set_state(CryptoSteps.ssh_wait_for_weak_key_audit)
+
+
+def _format_weak_audit_report(rsa_keys: int, skipped: int, weak: Dict[str, int]) -> str:
+    if not weak:
+        return (
+            f"✅ *Общих множителей не найдено*\n\n"
+            f"**Проверено RSA-ключей:** {rsa_keys}\n"
+            f"**Пропущено строк:** {skipped}"
+        )
+
+    text = (
+        f"🚨 *Найдены ключи с общими множителями: {len(weak)}*\n\n"
+        f"**Проверено RSA-ключей:** {rsa_keys}\n"
+        f"**Пропущено строк:** {skipped}\n\n"
+        f"*Эти ключи скомпрометированы, замените их:*\n"
+    )
+    for label, factor in list(weak.items())[:WEAK_AUDIT_MAX_REPORTED]:
+        text += f"• `{label}` (общий множитель {factor.bit_length()} бит)\n"
+    if len(weak) > WEAK_AUDIT_MAX_REPORTED:
+        text += f"…и ещё {len(weak) - WEAK_AUDIT_MAX_REPORTED}\n"
+    return text
+
+
+@dp.callback_query(StateFilter(CryptoSteps.ssh_wait_for_weak_key_audit), lambda c: c.data == "ssh_weak_audit_collected")
+async def ssh_weak_audit_collected(query: types.CallbackQuery, state: FSMContext):
+    """Batch GCD по RSA-ключам из кэша валидатора"""
+    await query.answer()
+    collected = [
+        (fingerprints["SHA256"], key.public_numbers().n)
+        for key, fingerprints, _ in cached_ssh_public_keys()
+        if isinstance(key, rsa.RSAPublicKey)
+    ]
+    if len(collected) < 2:
+        await query.message.edit_text(
+            f"ℹ️ Собрано RSA-ключей: {len(collected)}. Для аудита нужно хотя бы два.",
+            reply_markup=get_weak_audit_keyboard(),
+            parse_mode=ParseMode.MARKDOWN
         )
+        return
+
+    await query.message.edit_text(f"⏳ Проверяю {len(collected)} ключей...")
+    try:
+        findings = await run_in_pool(weak_keys.find_shared_factors, [n for _, n in collected])
+    except PoolBusyError:
+        await query.message.edit_text("⚠️ Сервер перегружен, попробуйте позже.", reply_markup=get_weak_audit_keyboard())
+        return
 
-        parts = ssh_format_bytes.split(b' ')
-        if len(parts) >= 2:
-            base64_data = parts[1]
-            decoded_bytes = base64.b64decode(base64_data)
+    weak = {collected[i][0]: factor for i, factor in findings.items()}
+    await query.message.edit_text(
+        _format_weak_audit_report(len(collected), 0, weak),
+        reply_markup=get_ssh_validation_result_keyboard(),
+        parse_mode=ParseMode.MARKDOWN
+    )
+    await state.set_state(CryptoSteps.ssh_menu)
 
-            sha256_hash = hashlib.sha256(decoded_bytes).hexdigest()
-            fingerprints["SHA256"] = ":".join(sha256_hash[i:i+2] for i in range(0, len(sha256_hash), 2))
 
-            md5_hash = hashlib.md5(decoded_bytes).hexdigest()
-            fingerprints["MD5"] = ":".join(md5_hash[i:i+2] for i in range(0, len(md5_hash), 2))
+@dp.message(StateFilter(CryptoSteps.ssh_wait_for_weak_key_audit))
+async def ssh_weak_audit_process(message: Message, state: FSMContext):
+    """Batch GCD по присланному набору публичных ключей"""
+    result_msg = await message.answer("⏳ Загружаю ключи...")
+
+    try:
+        content = (await _read_document_or_text(message)).decode('utf-8', errors='replace')
+
+        lines = content.splitlines()
+        await result_msg.edit_text(f"⏳ Ищу общие множители среди {len(lines)} строк...")
+        report = await run_in_pool(weak_keys.audit_ssh_public_keys, lines)
+    except PoolBusyError:
+        await result_msg.edit_text("⚠️ Сервер перегружен, попробуйте позже.", reply_markup=get_weak_audit_keyboard())
+        return
     except Exception as e:
-        logger.error(f"Ошибка при вычислении fingerprint SSH-ключа: {e}")
-    
-    return fingerprints
+        logger.error(f"Ошибка аудита слабых ключей: {e}")
+        await result_msg.edit_text(
+            f"*💥 Ошибка аудита:*\n\n`{str(e)[:100]}`",
+            reply_markup=get_weak_audit_keyboard(),
+            parse_mode=ParseMode.MARKDOWN
+        )
+        return
+
+    # Fingerprint считается в пуле по blob'у, уже разобранному при аудите: повторный разбор здесь мог бы упасть
+    weak = {f"#{line_no + 1} {fingerprint}": factor for line_no, (fingerprint, factor) in report["weak"].items()}
+
+    await result_msg.edit_text(
+        _format_weak_audit_report(report["rsa_keys"], report["skipped"], weak),
+        reply_markup=get_ssh_validation_result_keyboard(),
+        parse_mode=ParseMode.MARKDOWN
+    )
+    await state.set_state(CryptoSteps.ssh_menu)
 
 
 @dp.callback_query(StateFilter(CryptoSteps.choose_ssh_key_type), lambda c: c.data.startswith("ssh_key_"))
@@ -894,56 +1583,29 @@ async def ssh_generate_key(state: FSMContext, passphrase: Optional[bytes]):
     generation_msg = await bot.send_message(chat_id, "⏳ Генерирую SSH-ключи...")
 
     if key_type == "RSA":
-        private_key_obj = rsa.generate_private_key(public_exponent=65537, key_size=4096)
-        key_info = "RSA (4096 бит)"
-    else:
-        private_key_obj = ed25519.Ed25519PrivateKey.generate()
-        key_info = "Ed25519"
-
-    encryption = serialization.BestAvailableEncryption(passphrase) if passphrase else serialization.NoEncryption()
-    
+        user_throttle.charge(state.key.user_id, RSA_KEYGEN_COST)
     try:
-        openssh_private_key_bytes = private_key_obj.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.OpenSSH,
-            encryption_algorithm=encryption
-        )
-    except UnsupportedAlgorithm:
-        logger.warning("bcrypt недоступен. Ключ будет сгенерирован без шифрования.")
+        with metrics.CRYPTO_SECONDS.time(operation="ssh_keygen", algorithm=key_type, size=4096 if key_type == "RSA" else 256):
+            keypair = await run_in_pool(generate_ssh_keypair, key_type, passphrase)
+    except PoolBusyError:
+        await generation_msg.edit_text("⚠️ Сервер перегружен, попробуйте позже.", reply_markup=get_main_menu_keyboard())
+        await state.set_state(CryptoSteps.main_menu)
+        return
+
+    if passphrase and not keypair.encrypted:
+        logger.warning("bcrypt недоступен. OpenSSH-ключ будет сгенерирован без шифрования.")
         await bot.send_message(
             chat_id, 
-            "⚠️ bcrypt недоступен. Ключ без шифрования.\n"
+            "⚠️ bcrypt недоступен. OpenSSH-ключ без шифрования, PKCS#8-ключ зашифрован.\n"
             "Установите: `pip install bcrypt`",
             parse_mode=ParseMode.MARKDOWN
         )
-        encryption = serialization.NoEncryption()
-        openssh_private_key_bytes = private_key_obj.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.OpenSSH,
-            encryption_algorithm=encryption
-        )
-    openssh_private_key_str = openssh_private_key_bytes.decode('utf-8')
-
-    try:
-        pem_private_key_bytes = private_key_obj.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=encryption
-        )
-    except UnsupportedAlgorithm:
-        logger.warning("bcrypt недоступен. PKCS#8 ключ будет сгенерирован без шифрования.")
-        pem_private_key_bytes = private_key_obj.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption()
-        )
-    pem_private_key_str = pem_private_key_bytes.decode('utf-8')
 
-    public_key_obj = private_key_obj.public_key()
-    ssh_public_key_bytes = public_key_obj.public_bytes(
-        encoding=serialization.Encoding.OpenSSH,
-        format=serialization.PublicFormat.OpenSSH
-    )
+    key_info = keypair.key_info
+    openssh_private_key_bytes = keypair.openssh_private
+    openssh_private_key_str = openssh_private_key_bytes.decode('utf-8')
+    pem_private_key_bytes = keypair.pkcs8_private
+    ssh_public_key_bytes = keypair.public
     public_key_str = ssh_public_key_bytes.decode('utf-8')
 
     await state.update_data(
@@ -954,10 +1616,43 @@ async def ssh_generate_key(state: FSMContext, passphrase: Optional[bytes]):
 
     await generation_msg.edit_text(f"✅ *{key_info}* ключи готовы!", parse_mode=ParseMode.MARKDOWN)
 
+    key_basename = f"id_{key_type.lower().replace(' ', '_')}"
+    if passphrase:
+        protection_note = f"🔒 *{key_info}* защищены passphrase!\n\n💡 *Не забудьте пароль!*"
+    else:
+        protection_note = f"⚠️ *{key_info}* **без шифрования**!\n\n🚨 *Храните в безопасности!*"
+
+    if ARTIFACT_DELIVERY in ("zip", "album"):
+        # Все файлы одним запросом, публичный ключ и предложение экспорта — одним сообщением
+        await send_artifacts(
+            chat_id,
+            [
+                (f"{key_basename}_openssh.pem", openssh_private_key_bytes,
+                 f"🔐 *Приватный SSH-ключ {key_info}* (OpenSSH)\n\n⚠️ *Сохраните в надёжном месте!*"),
+                (f"{key_basename}_pem.pem", pem_private_key_bytes,
+                 f"🔐 *Приватный SSH-ключ {key_info}* (PKCS#8)\n\n📚 Для Python/Java/.NET"),
+                (f"{key_basename}.pub", ssh_public_key_bytes,
+                 f"🔓 *Публичный SSH-ключ* (OpenSSH)\n\n✅ *Передавайте на серверы!*"),
+            ],
+            f"{key_basename}.zip",
+            f"📦 *{key_info}*: приватный ключ (OpenSSH и PKCS#8) и публичный ключ\n\n⚠️ *Сохраните в надёжном месте!*"
+        )
+        await bot.send_message(
+            chat_id,
+            f"```\n{public_key_str}\n```"
+            f"🔓 *Публичный SSH-ключ*\n\n"
+            f"{protection_note}\n\n"
+            f"🚀 *Экспортировать {key_info} на сервер?*",
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=get_ssh_export_keyboard()
+        )
+        await state.set_state(CryptoSteps.ssh_get_server_info)
+        await state.update_data(private_key=None)
+        return
+
     await bot.send_document(
         chat_id,
-        BufferedInputFile(openssh_private_key_str.encode('utf-8'), 
-                         filename=f"id_{key_type.lower().replace(' ', '_')}_openssh.pem"),
+        BufferedInputFile(openssh_private_key_bytes, filename=f"{key_basename}_openssh.pem"),
         caption=f"🔐 *Приватный SSH-ключ {key_info}*\n\n"
         f"Формат: OpenSSH\n"
         f"Расширение: `.pem`\n\n"
@@ -967,8 +1662,7 @@ async def ssh_generate_key(state: FSMContext, passphrase: Optional[bytes]):
 
     await bot.send_document(
         chat_id,
-        BufferedInputFile(pem_private_key_str.encode('utf-8'), 
-                         filename=f"id_{key_type.lower().replace(' ', '_')}_pem.pem"),
+        BufferedInputFile(pem_private_key_bytes, filename=f"{key_basename}_pem.pem"),
         caption=f"🔐 *Приватный SSH-ключ {key_info} (PEM)*\n\n"
         f"Формат: PKCS#8\n"
         f"Расширение: `.pem`\n\n"
@@ -986,20 +1680,7 @@ async def ssh_generate_key(state: FSMContext, passphrase: Optional[bytes]):
         parse_mode=ParseMode.MARKDOWN
     )
 
-    if passphrase:
-        await bot.send_message(
-            chat_id,
-            f"🔒 *{key_info}* защищены passphrase!\n\n"
-            f"💡 *Не забудьте пароль!*",
-            parse_mode=ParseMode.MARKDOWN
-        )
-    else:
-        await bot.send_message(
-            chat_id,
-            f"⚠️ *{key_info}* **без шифрования**!\n\n"
-            f"🚨 *Храните в безопасности!*",
-            parse_mode=ParseMode.MARKDOWN
-        )
+    await bot.send_message(chat_id, protection_note, parse_mode=ParseMode.MARKDOWN)
 
     await bot.send_message(
         chat_id,
@@ -1065,6 +1746,13 @@ async def ssh_export_key_to_server(message: Message, user_data: Dict[str, Any]):
         return
 
     username, host = server_info.split('@', 1)
+
+    if fingerprint_index is not None:
+        try:
+            _, blob = decode_ssh_public_key_blob(public_key)
+            fingerprint_index.record(hashlib.sha256(blob).digest(), chat_id)
+        except ValueError as e:
+            logger.warning(f"Не удалось записать fingerprint экспортируемого ключа: {e}")
     
     connect_msg = await bot.send_message(
         chat_id,
@@ -1097,55 +1785,38 @@ async def ssh_export_key_to_server(message: Message, user_data: Dict[str, Any]):
     )
 
 
-class CustomSshClient(asyncssh.SSHClient):
-    """SSH-клиент с поддержкой 2FA"""
-    
-    def __init__(self, bot_instance, chat_id, state: FSMContext, password: str):
-        self._bot = bot_instance
-        self._chat_id = chat_id
-        self._state = state
-        self._password = password
-        super().__init__()
-
-    def password_auth_requested(self):
-        return self._password
-
-    def kbdint_auth_requested(self):
-        return ''
-
-    async def kbdint_challenge_received(self, name, instructions, lang, prompts):
-        if not prompts:
-            return []
-
-        responses = []
-        for prompt_text, _ in prompts:
-            future = asyncio.get_event_loop().create_future()
-            
-            msg = await self._bot.send_message(
-                self._chat_id,
-                f"*🔐 2FA-запрос:*\n\n"
-                f"`{prompt_text}`\n\n"
-                f"*Введите код:*",
-                reply_markup=get_cancel_keyboard(),
+def make_2fa_prompt(chat_id: int, state: FSMContext):
+    """Запрос кода 2FA у пользователя в чате для ssh_export: возвращает код или None по таймауту."""
+    async def ask_code(prompt_text: str) -> Optional[str]:
+        future = asyncio.get_event_loop().create_future()
+
+        msg = await bot.send_message(
+            chat_id,
+            f"*🔐 2FA-запрос:*\n\n"
+            f"`{prompt_text}`\n\n"
+            f"*Введите код:*",
+            reply_markup=get_cancel_keyboard(),
+            parse_mode=ParseMode.MARKDOWN
+        )
+
+        await state.update_data(two_fa_future=future, prompt_msg_id=msg.message_id)
+        await state.set_state(CryptoSteps.ssh_wait_for_2fa)
+
+        try:
+            return await shutdown.wait_for_input(future, timeout=120.0)
+        except ShutdownInProgress:
+            # Подключение завершится ошибкой аутентификации, сообщение покажет ssh_handle_connection
+            return None
+        except asyncio.TimeoutError:
+            await bot.send_message(
+                chat_id,
+                "*⏰* Время 2FA истекло!",
+                reply_markup=get_main_menu_keyboard(),
                 parse_mode=ParseMode.MARKDOWN
             )
-            
-            await self._state.update_data(two_fa_future=future, prompt_msg_id=msg.message_id)
-            await self._state.set_state(CryptoSteps.ssh_wait_for_2fa)
-            
-            try:
-                response = await asyncio.wait_for(future, timeout=120.0)
-                responses.append(response)
-            except asyncio.TimeoutError:
-                await self._bot.send_message(
-                    self._chat_id,
-                    "*⏰* Время 2FA истекло!",
-                    reply_markup=get_main_menu_keyboard(),
-                    parse_mode=ParseMode.MARKDOWN
-                )
-                raise asyncssh.DisconnectError("2FA timeout", asyncssh.DISCONNECT_AUTH_CANCELLED)
+            return None
 
-        return responses
+    return ask_code
 
 
 @dp.message(StateFilter(CryptoSteps.ssh_wait_for_2fa))
@@ -1209,44 +1880,38 @@ async def ssh_handle_connection(message: Message, state: FSMContext):
     auth_msg = await bot.send_message(chat_id, f"*🔐* Аутентификация для `{server_info}`...")
 
     try:
-        client_factory = lambda: CustomSshClient(bot, chat_id, state, password)
-        
-        async with asyncssh.connect(host=host, username=username, client_factory=client_factory, connect_timeout=15) as conn:
-            await auth_msg.edit_text("*✅* Подключение успешно! Добавляю ключ...")
-
-            safe_public_key = shlex.quote(public_key.strip())
-            command = (
-                f'mkdir -p ~/.ssh && chmod 700 ~/.ssh && '
-                f'if ! grep -qF "{safe_public_key}" ~/.ssh/authorized_keys 2>/dev/null; then '
-                f'echo "{safe_public_key}" >> ~/.ssh/authorized_keys && chmod 600 ~/.ssh/authorized_keys && '
-                f'echo "Key added"; else echo "Key exists"; fi'
-            )
-            
-            result = await conn.run(command, check=False)
-            
-            if result.exit_status == 0:
-                output = result.stdout.decode('utf-8').strip()
-                if "exists" in output.lower():
-                    await auth_msg.edit_text(
-                        f"*ℹ️* Ключ *{key_type}* уже есть на `{server_info}`!\n\n"
-                        f"*✅* Теперь: `ssh {server_info}` без пароля!",
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                else:
-                    await auth_msg.edit_text(
-                        f"*✅* Ключ *{key_type}* добавлен на `{server_info}`!\n\n"
-                        f"*🎉* Теперь: `ssh {server_info}` без пароля!",
-                        parse_mode=ParseMode.MARKDOWN
-                    )
+        result = await ssh_export.export_public_key(
+            host, username, password, public_key,
+            ask_code=make_2fa_prompt(chat_id, state),
+            on_connected=lambda: auth_msg.edit_text("*✅* Подключение успешно! Добавляю ключ...")
+        )
+        if result.exit_status == 0:
+            output = result.stdout.decode('utf-8').strip()
+            if "exists" in output.lower():
+                metrics.SSH_EXPORTS.inc(outcome="exists")
+                await auth_msg.edit_text(
+                    f"*ℹ️* Ключ *{key_type}* уже есть на `{server_info}`!\n\n"
+                    f"*✅* Теперь: `ssh {server_info}` без пароля!",
+                    parse_mode=ParseMode.MARKDOWN
+                )
             else:
+                metrics.SSH_EXPORTS.inc(outcome="added")
                 await auth_msg.edit_text(
-                    f"*⚠️* Ошибка добавления:\n\n"
-                    f"`{result.stderr.decode('utf-8').strip()[:200]}`\n\n"
-                    f"*🔧* Проверьте права `~/.ssh` на сервере.",
+                    f"*✅* Ключ *{key_type}* добавлен на `{server_info}`!\n\n"
+                    f"*🎉* Теперь: `ssh {server_info}` без пароля!",
                     parse_mode=ParseMode.MARKDOWN
                 )
+        else:
+            metrics.SSH_EXPORTS.inc(outcome="command_failed")
+            await auth_msg.edit_text(
+                f"*⚠️* Ошибка добавления:\n\n"
+                f"`{result.stderr.decode('utf-8').strip()[:200]}`\n\n"
+                f"*🔧* Проверьте права `~/.ssh` на сервере.",
+                parse_mode=ParseMode.MARKDOWN
+            )
 
-    except asyncssh.PermissionDenied:
+    except ssh_export.PermissionDenied:
+        metrics.SSH_EXPORTS.inc(outcome="auth_failed")
         await auth_msg.edit_text(
             "*❌* Ошибка аутентификации\n\n"
             f"*🔑* Неверный пароль для `{username}@{host}`\n"
@@ -1255,7 +1920,8 @@ async def ssh_handle_connection(message: Message, state: FSMContext):
             parse_mode=ParseMode.MARKDOWN,
             reply_markup=get_main_menu_keyboard()
         )
-    except asyncssh.HostKeyNotVerifiable:
+    except ssh_export.HostKeyNotVerifiable:
+        metrics.SSH_EXPORTS.inc(outcome="host_key_unknown")
         await auth_msg.edit_text(
             "*❌* Проблема с хостом\n\n"
             "*🔒* Сервер не в known_hosts\n\n"
@@ -1267,6 +1933,11 @@ async def ssh_handle_connection(message: Message, state: FSMContext):
             reply_markup=get_main_menu_keyboard()
         )
     except Exception as e:
+        if shutdown.requested:
+            metrics.SSH_EXPORTS.inc(outcome="shutdown")
+            await auth_msg.edit_text(INTERRUPTED_TEXT, reply_markup=get_main_menu_keyboard())
+            return
+        metrics.SSH_EXPORTS.inc(outcome="error")
         logger.error(f"SSH ошибка: {e}")
         await auth_msg.edit_text(
             f"*💥* Ошибка: `{str(e)[:100]}`\n\n"
@@ -1339,6 +2010,7 @@ async def hash_process_input(message: Message, state: FSMContext):
     """Вычисление хеша из сообщения или файла"""
     user_data = await state.get_data()
     algorithm = user_data.get("hash_algorithm", "SHA-256")
+    hash_name = algorithm.lower().replace("-", "")  # "SHA-256" → "sha256"
     chat_id = user_data.get("chat_id")
     
     result_msg = await bot.send_message(chat_id, f"*🔄 Вычисляю {algorithm}-хеш...*",parse_mode=ParseMode.MARKDOWN)
@@ -1399,21 +2071,19 @@ async def hash_process_input(message: Message, state: FSMContext):
                     return
                 
                 logger.info(f"Скачиваю файл: {filename} ({file_info.file_size} байт)")
-                file = await bot.download_file(file_info.file_path)
-                file_data = file.read()
+                # Файл хешируется по мере скачивания, целиком в памяти не держится
+                async with ProgressReporter(result_msg, f"🔄 Скачиваю и хеширую {filename} ({algorithm})",
+                                            file_info.file_size or message.document.file_size or 0,
+                                            byte_units=True, interval=PROGRESS_INTERVAL) as progress:
+                    writer = hashing.HashWriter(hash_name, on_write=progress.advance)
+                    with metrics.FILE_DOWNLOAD_SECONDS.time():
+                        await bot.download_file(file_info.file_path, destination=writer, seek=False)
                 
-                if not file_data:
+                if not writer.size:
                     raise Exception("Файл пустой или не удалось прочитать")
                 
-                hash_value = calculate_file_hash(file_data, algorithm.lower())
-                
-                file_size_formatted = f"{len(file_data):,} байт"
-                if len(file_data) > 1024 * 1024:
-                    file_size_mb = len(file_data) / (1024 * 1024)
-                    file_size_formatted = f"{file_size_mb:.1f} МБ"
-                elif len(file_data) > 1024:
-                    file_size_kb = len(file_data) / 1024
-                    file_size_formatted = f"{file_size_kb:.1f} КБ"
+                hash_value = finish_file_hash(writer, hash_name)
+                file_size_formatted = format_bytes(writer.size)
                 
                 await result_msg.edit_text(
                     f"*📎 Хеш файла:* `{filename}`\n\n"
@@ -1465,7 +2135,7 @@ async def hash_process_input(message: Message, state: FSMContext):
                 return
                 
         elif message.text:
-            text_hash = calculate_text_hash(message.text, algorithm.lower())
+            text_hash = calculate_text_hash(message.text, hash_name)
             text_length = len(message.text)
             
             if text_length > 1000:
@@ -1504,38 +2174,133 @@ async def hash_process_input(message: Message, state: FSMContext):
         )
 
 
+# Цель калибровки KDF: время и память на один хеш пароля
+KDF_TARGET_MS = float(os.getenv("KDF_TARGET_MS", "250"))
+KDF_MAX_MEMORY_MB = int(os.getenv("KDF_MAX_MEMORY_MB", "64"))
+kdf_calibration: Optional[Dict[str, Dict[str, Any]]] = None
+_kdf_calibration_lock = asyncio.Lock()
+
+
+async def get_kdf_calibration() -> Dict[str, Dict[str, Any]]:
+    """Параметры KDF под этот сервер: калибруются в пуле при первом обращении"""
+    global kdf_calibration
+    async with _kdf_calibration_lock:
+        if kdf_calibration is None:
+            started = time.perf_counter()
+            kdf_calibration = await run_in_pool(kdf.calibrate, KDF_TARGET_MS / 1000, KDF_MAX_MEMORY_MB)
+            logger.info(f"🎚️ Калибровка KDF за {(time.perf_counter() - started) * 1000:.0f} мс: " + ", ".join(
+                f"{name} {kdf.describe(name, result['params'])}" for name, result in kdf_calibration.items()))
+    return kdf_calibration
+
+
+@dp.callback_query(StateFilter(CryptoSteps.hash_choose_algorithm, CryptoSteps.kdf_get_password), lambda c: c.data == "kdf_start")
+async def kdf_start_handler(query: types.CallbackQuery, state: FSMContext):
+    """Выбор функции хеширования паролей с параметрами, откалиброванными под сервер"""
+    await query.answer()
+    try:
+        calibration = await get_kdf_calibration()
+    except PoolBusyError:
+        await query.message.edit_text("⚠️ Сервер перегружен, попробуйте позже.", reply_markup=get_hash_input_keyboard())
+        return
+
+    lines = "\n".join(
+        f"• *{kdf.ALGORITHMS[name]}:* {kdf.describe(name, result['params'])}, ~{result['seconds'] * 1000:.0f} мс"
+        for name, result in calibration.items()
+    )
+    bcrypt_note = "" if "bcrypt" in calibration else "\n\nbcrypt недоступен: `pip install bcrypt`"
+    await query.message.edit_text(
+        "🔑 *Хеш пароля*\n\n"
+        "Для паролей в конфигах нужны медленные функции с солью, а не MD5/SHA. "
+        f"Параметры подобраны под этот сервер: ~{KDF_TARGET_MS:.0f} мс и до {KDF_MAX_MEMORY_MB} МиБ на хеш.\n\n"
+        f"{lines}{bcrypt_note}\n\n"
+        "*🔒 Рекомендуется: Argon2id*",
+        reply_markup=get_kdf_algorithm_keyboard(),
+        parse_mode=ParseMode.MARKDOWN
+    )
+    await state.set_state(CryptoSteps.kdf_choose_algorithm)
+
+
+@dp.callback_query(StateFilter(CryptoSteps.kdf_choose_algorithm), lambda c: c.data.startswith("kdf_alg_"))
+async def kdf_request_password(query: types.CallbackQuery, state: FSMContext):
+    """Запрос пароля для выбранной KDF"""
+    algorithm = query.data.removeprefix("kdf_alg_")
+    if algorithm not in kdf.available():
+        await query.answer("Алгоритм недоступен", show_alert=True)
+        return
+
+    await query.answer()
+    await state.update_data(kdf_algorithm=algorithm, chat_id=query.message.chat.id)
+    limit_note = f"\n• bcrypt учитывает не больше {kdf.BCRYPT_MAX_PASSWORD} байт" if algorithm == "bcrypt" else ""
+    await query.message.edit_text(
+        f"🔑 *{kdf.ALGORITHMS[algorithm]}*\n\n"
+        "Отправьте пароль текстовым сообщением.\n\n"
+        "**⚠️ Важно:**\n"
+        f"• Сообщение с паролем сразу удаляется из чата{limit_note}\n"
+        "• Каждый хеш со своей солью: повторный запуск даёт другую строку",
+        reply_markup=get_kdf_input_keyboard(),
+        parse_mode=ParseMode.MARKDOWN
+    )
+    await state.set_state(CryptoSteps.kdf_get_password)
+
+
+@dp.message(StateFilter(CryptoSteps.kdf_get_password))
+async def kdf_process_password(message: Message, state: FSMContext):
+    """Хеш пароля в пуле процессов: каждый вызов намеренно тратит время и память"""
+    user_data = await state.get_data()
+    algorithm = user_data.get("kdf_algorithm", "argon2id")
+    chat_id = user_data.get("chat_id", message.chat.id)
+    password = (message.text or "").encode("utf-8")
+    await message.delete()
+    if not password:
+        await bot.send_message(chat_id, "❌ Отправьте пароль текстом.", reply_markup=get_kdf_input_keyboard())
+        return
+
+    result_msg = await bot.send_message(chat_id, f"⏳ Вычисляю {kdf.ALGORITHMS[algorithm]}...")
+    user_throttle.charge(message.from_user.id, KDF_COST)
+    try:
+        calibrated = (await get_kdf_calibration())[algorithm]
+        params = calibrated["params"]
+        started = time.perf_counter()
+        with metrics.CRYPTO_SECONDS.time(operation="kdf", algorithm=algorithm, size=f"{calibrated['memory'] // 1048576}MiB"):
+            encoded = await run_in_pool(kdf.hash_password, algorithm, password, params)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+    except PoolBusyError:
+        await result_msg.edit_text("⚠️ Сервер перегружен, попробуйте позже.", reply_markup=get_main_menu_keyboard())
+        await state.set_state(CryptoSteps.main_menu)
+        return
+    except ValueError as e:
+        await result_msg.edit_text(f"❌ {e}", reply_markup=get_kdf_input_keyboard())
+        return
+
+    await result_msg.edit_text(
+        f"✅ *{kdf.ALGORITHMS[algorithm]}* ({kdf.describe(algorithm, params)}) за {elapsed_ms:.0f} мс\n\n"
+        f"`{encoded}`\n\n"
+        "*Отправьте ещё пароль или вернитесь в меню*",
+        reply_markup=get_kdf_input_keyboard(),
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+
 def calculate_text_hash(text: str, algorithm: str) -> str:
     """Хеш текста"""
-    hash_functions = {
-        'md5': hashlib.md5,
-        'sha1': hashlib.sha1,
-        'sha256': hashlib.sha256,
-        'sha512': hashlib.sha512,
-        'blake2b': lambda data: hashlib.blake2b(data, digest_size=64)
-    }
-    
-    if algorithm not in hash_functions:
-        algorithm = 'sha256'
+    if algorithm not in hashing.HASH_FUNCTIONS:
+        algorithm = hashing.DEFAULT_ALGORITHM
     
-    h = hash_functions[algorithm](text.encode('utf-8'))
+    data = text.encode('utf-8')
+    with metrics.CRYPTO_SECONDS.time(operation="hash_text", algorithm=algorithm, size=metrics.size_bucket(len(data))):
+        h = hashing.new_hash(algorithm, data)
+    metrics.HASHED_BYTES.inc(len(data), algorithm=algorithm)
     return h.hexdigest()
 
 
-def calculate_file_hash(file_data: bytes, algorithm: str) -> str:
-    """Хеш файла"""
-    hash_functions = {
-        'md5': hashlib.md5,
-        'sha1': hashlib.sha1,
-        'sha256': hashlib.sha256,
-        'sha512': hashlib.sha512,
-        'blake2b': lambda data: hashlib.blake2b(data, digest_size=64)
-    }
+def finish_file_hash(writer: hashing.HashWriter, algorithm: str) -> str:
+    """Хеш скачанного файла и его метрики (время только хеширования, без сети)"""
+    if algorithm not in hashing.HASH_FUNCTIONS:
+        algorithm = hashing.DEFAULT_ALGORITHM
     
-    if algorithm not in hash_functions:
-        algorithm = 'sha256'
-    
-    h = hash_functions[algorithm](file_data)
-    return h.hexdigest()
+    metrics.CRYPTO_SECONDS.observe(writer.seconds, operation="hash_file", algorithm=algorithm, size=metrics.size_bucket(writer.size))
+    metrics.HASHED_BYTES.inc(writer.size, algorithm=algorithm)
+    return writer.hexdigest()
 
 
 @dp.callback_query(lambda c: c.data in ["cancel", "main_menu", "ssh_menu"])
@@ -1564,22 +2329,224 @@ async def handle_navigation(query: types.CallbackQuery, state: FSMContext):
         return
 
 
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+WORKER_INDEX = os.getenv(WORKER_INDEX_ENV)
+
+
+async def run_webhook(feed_update=None):
+    """Режим webhook: aiohttp-сервер принимает обновления, обработка — в фоновых задачах"""
+    if feed_update is None:
+        feed_update = lambda update: dp.feed_raw_update(bot, update)
+
+    secret_token = WEBHOOK_SECRET
+    if not secret_token:
+        secret_token = secrets.token_urlsafe(32)
+        if not WEBHOOK_URL:
+            logger.warning(f"⚠️ WEBHOOK_SECRET не задан, сгенерирован временный: {secret_token}")
+
+    server = WebhookServer(
+        feed_update,
+        secret_token=secret_token, path=WEBHOOK_PATH, host=WEBHOOK_HOST, port=WEBHOOK_PORT, loads=JSON_LOADS
+    )
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    await server.start()
+
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+            secret_token=secret_token,
+            allowed_updates=dp.resolve_used_update_types()
+        )
+        logger.info(f"✅ Webhook зарегистрирован: {WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH}")
+    else:
+        logger.info("ℹ️ WEBHOOK_URL не задан — setWebhook не вызывается (локальный режим)")
+
+    try:
+        await shutdown.wait()
+    finally:
+        await server.drain(timeout=SHUTDOWN_TIMEOUT)
+        await server.stop()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+
+
+async def run_sharded_front():
+    """Фронт многопроцессного режима: получает обновления и раздаёт их воркерам по chat_id"""
+    env = dict(os.environ)
+    env.setdefault("CRYPTO_POOL_WORKERS", str(max(1, (os.cpu_count() or 2) // BOT_WORKERS)))
+    router = ShardRouter(BOT_WORKERS, [sys.executable, os.path.abspath(__file__)], env, dumps=JSON_DUMPS)
+    await router.start()
+    logger.info(f"🔀 Многопроцессный режим: {BOT_WORKERS} воркеров")
+
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(router.dispatch)
+        else:
+            await bot.delete_webhook()
+            polling = asyncio.create_task(poll_raw_updates(bot, router.dispatch, dp.resolve_used_update_types()))
+            await shutdown.wait()
+            polling.cancel()
+    finally:
+        # Воркеры получают EOF и сами доделывают начатое за SHUTDOWN_TIMEOUT
+        await router.stop(timeout=SHUTDOWN_TIMEOUT + 5)
+
+
+async def close_fingerprint_index(flusher: Optional[asyncio.Task]):
+    """Останавливает фоновый сброс индекса fingerprint и записывает остаток очереди"""
+    if flusher is not None:
+        flusher.cancel()
+        try:
+            await flusher
+        except asyncio.CancelledError:
+            pass
+    if fingerprint_index is not None:
+        fingerprint_index.close()
+
+
+async def worker_main():
+    """Воркер многопроцессного режима: обрабатывает обновления, присланные фронтом"""
+    logger.info(f"👷 Воркер {WORKER_INDEX} запущен (pid {os.getpid()})")
+
+    fingerprint_flusher = asyncio.create_task(fingerprint_index.run_flusher()) if fingerprint_index is not None else None
+
+    shutdown.install_signal_handlers()
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    try:
+        await run_worker(lambda update: dp.feed_raw_update(bot, update), loads=JSON_LOADS, stop=shutdown.event)
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await storage.close()
+        await bot.session.close()
+        shutdown_pool(cancel_futures=True)
+        await close_fingerprint_index(fingerprint_flusher)
+        logger.info(f"👋 Воркер {WORKER_INDEX} остановлен")
+        logconfig.stop_logging()
+
+
+CRYPTO_WARMUP = os.getenv("CRYPTO_WARMUP", "0") == "1"
+
+# Пусто — эндпоинт /metrics выключен; воркеры многопроцессного режима слушают METRICS_PORT + номер
+METRICS_PORT = os.getenv("METRICS_PORT", "")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+metrics_server: Optional[metrics.MetricsServer] = None
+
+# Пусто — HTTP API выключен; воркеры многопроцессного режима слушают CRYPTO_API_PORT + номер
+CRYPTO_API_PORT = os.getenv("CRYPTO_API_PORT", "")
+CRYPTO_API_HOST = os.getenv("CRYPTO_API_HOST", "127.0.0.1")
+CRYPTO_API_TOKEN = os.getenv("CRYPTO_API_TOKEN", "")
+CRYPTO_API_MAX_BATCH = int(os.getenv("CRYPTO_API_MAX_BATCH", "100"))
+crypto_api: Optional[http_api.CryptoAPIServer] = None
+
+# Сторож цикла событий: 0 — выключен
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "0.25"))
+loop_watchdog = LoopWatchdog(threshold=LOOP_LAG_THRESHOLD) if LOOP_LAG_THRESHOLD > 0 else None
+
+
+async def warm_up():
+    """Фоновый прогрев: загрузка ленивых подсистем и инициализация OpenSSL в процессах пула"""
+    try:
+        timings = {}
+        for name in LAZY_MODULES:
+            # По одному модулю за шаг цикла: между загрузками успевают обработаться апдейты
+            timings.update(load_modules([name]))
+            await asyncio.sleep(0)
+        pool_timings = await warm_up_pool(warm_up_crypto)
+        await get_kdf_calibration()
+        modules = ", ".join(f"{name.rsplit('.', 1)[-1]} {ms:.0f}" for name, ms in timings.items())
+        logger.info(f"🔥 Прогрев завершён: модули {sum(timings.values()):.0f} мс ({modules}), "
+                    f"OpenSSL в пуле {max(pool_timings):.0f} мс")
+    except Exception as e:
+        logger.warning(f"⚠️ Прогрев не удался: {e}")
+
+
+@dp.startup()
+async def on_startup():
+    """Замер времени старта и запуск прогрева"""
+    logger.info(f"⏱️ Готов к приёму обновлений через {(time.perf_counter() - STARTUP_STARTED) * 1000:.0f} мс после запуска")
+    if loop_watchdog is not None:
+        loop_watchdog.start()
+
+    if BOT_WORKERS > 1 and WORKER_INDEX is None:
+        # Фронт многопроцессного режима только раздаёт обновления: метрики, HTTP API и пул — у воркеров,
+        # а порты METRICS_PORT и CRYPTO_API_PORT заняты воркером 0
+        return
+
+    if CRYPTO_WARMUP:
+        asyncio.create_task(warm_up())
+
+    global metrics_server
+    if METRICS_PORT:
+        metrics_server = metrics.MetricsServer(METRICS_HOST, int(METRICS_PORT) + int(WORKER_INDEX or 0))
+        await metrics_server.start()
+
+    global crypto_api
+    if CRYPTO_API_PORT:
+        if not CRYPTO_API_TOKEN and CRYPTO_API_HOST not in ("127.0.0.1", "::1", "localhost"):
+            logger.error(f"❌ HTTP API на {CRYPTO_API_HOST} без CRYPTO_API_TOKEN не запущен")
+        else:
+            crypto_api = http_api.CryptoAPIServer(
+                CRYPTO_API_HOST, int(CRYPTO_API_PORT) + int(WORKER_INDEX or 0), token=CRYPTO_API_TOKEN,
+                max_batch=CRYPTO_API_MAX_BATCH, shutdown_timeout=SHUTDOWN_TIMEOUT, loads=JSON_LOADS, dumps=JSON_DUMPS,
+            )
+            await crypto_api.start()
+
+
+@dp.shutdown()
+async def on_shutdown():
+    """Завершение начатых обновлений и запросов HTTP API, затем остановка эндпоинта метрик и сторожа цикла событий"""
+    await asyncio.gather(shutdown.drain(), crypto_api.stop() if crypto_api is not None else asyncio.sleep(0))
+    if metrics_server is not None:
+        await metrics_server.stop()
+    if loop_watchdog is not None:
+        await loop_watchdog.stop()
+
+
+async def stop_polling_on_shutdown():
+    await shutdown.wait()
+    await dp.stop_polling()
+
+
 async def main():
     """Запуск бота"""
-    logger.info("🚀 Крипто-генератор запущен!")
+    logger.info(f"🚀 Крипто-генератор запущен! Импорт и настройка: {(time.perf_counter() - STARTUP_STARTED) * 1000:.0f} мс")
+
+    # Регистрация команд не должна задерживать приём обновлений
+    asyncio.create_task(set_bot_commands())
 
-    await set_bot_commands()
+    fingerprint_flusher = asyncio.create_task(fingerprint_index.run_flusher()) if fingerprint_index is not None else None
     
+    shutdown.install_signal_handlers()
     try:
-        await dp.start_polling(bot)
+        if BOT_WORKERS > 1:
+            await run_sharded_front()
+        elif BOT_MODE == "webhook":
+            await run_webhook()
+        else:
+            # Вебхук, оставшийся от режима webhook, блокирует getUpdates
+            await bot.delete_webhook()
+            asyncio.create_task(stop_polling_on_shutdown())
+            # Сигналы обрабатывает shutdown, а сессия нужна до конца завершения начатых обновлений
+            await dp.start_polling(bot, handle_signals=False, close_bot_session=False)
     except KeyboardInterrupt:
         logger.info("🛑 Остановка...")
     except Exception as e:
         logger.error(f"💥 Ошибка: {e}")
     finally:
+        await storage.close()
         await bot.session.close()
+        shutdown_pool(cancel_futures=True)
+        await close_fingerprint_index(fingerprint_flusher)
         logger.info("👋 Бот остановлен")
+        logconfig.stop_logging()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if PERF_RUNTIME:
+        runtime.install_uvloop()
+        logger.info(f"⚡ Производительный режим: {runtime.describe()}")
+    asyncio.run(worker_main() if WORKER_INDEX is not None else main())
\ No newline at end of file
@@ -0,0 +1 @@
+"""Криптографические движки и инфраструктура Crypto Key Generator Bot."""
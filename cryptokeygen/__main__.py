@@ -0,0 +1,294 @@
+"""Командная строка без Telegram на тех же движках, что и бот.
+
+    python -m cryptokeygen hash -a sha256,blake2b -j 8 DIR     → SHA256SUMS, BLAKE2BSUMS
+    python -m cryptokeygen hash --resume -a sha256 DIR         дописать прерванный запуск
+    python -m cryptokeygen keygen --type ed25519 -n 100 -o out/
+
+Файлы хешируются пачками в пуле процессов: мелкие группируются, чтобы не
+платить за пересылку задания на каждый, крупные читаются блоками по 1 МиБ.
+Манифесты пишутся по мере готовности, поэтому прерванный запуск (Ctrl+C)
+продолжается с --resume; по завершении строки сортируются по пути, и
+результат проверяется обычным `sha256sum -c SHA256SUMS`.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from cryptokeygen import hashing, ssh_keys
+from cryptokeygen.pool import ignore_interrupt
+
+BATCH_MAX_FILES = 64
+BATCH_MAX_BYTES = 64 * 1024 * 1024
+
+
+class Progress:
+    """Строка прогресса в stderr: обновляется не чаще раза в interval секунд."""
+
+    def __init__(self, total_items: int, total_bytes: int = 0, enabled: bool = True, interval: float = 0.5):
+        self.total_items = total_items
+        self.total_bytes = total_bytes
+        self.enabled = enabled
+        self.interval = interval
+        self.items = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self._shown = 0.0
+
+    def advance(self, items: int, nbytes: int = 0):
+        self.items += items
+        self.bytes += nbytes
+        now = time.monotonic()
+        if self.enabled and now - self._shown >= self.interval:
+            self._shown = now
+            self._show(now)
+
+    def _show(self, now: float):
+        elapsed = max(now - self.started, 1e-6)
+        line = f"{self.items}/{self.total_items}"
+        if self.total_bytes:
+            rate = self.bytes / elapsed
+            left = (self.total_bytes - self.bytes) / rate if rate else 0
+            line += f"  {self.bytes / 1048576:.0f}/{self.total_bytes / 1048576:.0f} МиБ  {rate / 1048576:.1f} МиБ/с  ETA {left:.0f} с"
+        else:
+            rate = self.items / elapsed
+            left = (self.total_items - self.items) / rate if rate else 0
+            line += f"  {rate:.1f}/с  ETA {left:.0f} с"
+        sys.stderr.write(f"\r{line}\033[K")
+        sys.stderr.flush()
+
+    def message(self, text: str):
+        """Сообщение отдельной строкой поверх строки прогресса."""
+        sys.stderr.write(f"\r\033[K{text}\n" if self.enabled else f"{text}\n")
+
+    def finish(self):
+        if self.enabled:
+            self._show(time.monotonic())
+            sys.stderr.write("\n")
+
+
+def iter_files(paths: Sequence[str], exclude: Set[str]) -> Iterator[str]:
+    """Обычные файлы из paths в порядке обхода; символические ссылки пропускаются, как у find -type f."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                if not os.path.islink(full) and os.path.abspath(full) not in exclude:
+                    yield full
+
+
+def make_batches(files: List[Tuple[str, int]]) -> Iterator[List[str]]:
+    batch: List[str] = []
+    batch_bytes = 0
+    for path, size in files:
+        if batch and (len(batch) >= BATCH_MAX_FILES or batch_bytes + size > BATCH_MAX_BYTES):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(path)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def _run_in_pool(executor: ProcessPoolExecutor, func, batches: Iterator, max_pending: int) -> Iterator:
+    """Результаты пачек по мере готовности; в очереди пула не больше max_pending пачек."""
+    pending = set()
+    for batch in batches:
+        if len(pending) >= max_pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+        pending.add(executor.submit(func, batch))
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+def _sort_manifest(path: str):
+    entries, _ = hashing.read_manifest(path)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8", errors="surrogateescape") as f:
+        f.writelines(hashing.format_manifest_line(entries[name], name) for name in sorted(entries))
+    os.replace(tmp, path)
+
+
+def cmd_hash(args) -> int:
+    manifests = {name: os.path.join(args.output, hashing.manifest_name(name)) for name in args.algorithms}
+    done: Optional[Set[str]] = None
+    offsets: Dict[str, int] = {}
+    for name, manifest in manifests.items():
+        if args.resume and os.path.exists(manifest):
+            entries, offsets[name] = hashing.read_manifest(manifest)
+            done = set(entries) if done is None else done & set(entries)
+        else:
+            offsets[name] = 0
+            done = set()
+    done = done or set()
+
+    exclude = {os.path.abspath(path) for path in manifests.values()}
+    failed = 0
+    files = []
+    for path in iter_files(args.paths, exclude):
+        if path in done:
+            continue
+        try:
+            files.append((path, os.path.getsize(path)))
+        except OSError as e:
+            failed += 1
+            print(f"{path}: {e.strerror}", file=sys.stderr)
+    progress = Progress(len(files), sum(size for _, size in files), enabled=not args.quiet and sys.stderr.isatty())
+    sizes = dict(files)
+
+    os.makedirs(args.output, exist_ok=True)
+    outputs = {}
+    for name, manifest in manifests.items():
+        # Файл обрезается до последней целой строки: прерванный запуск мог оборвать запись
+        outputs[name] = open(manifest, "a" if args.resume else "w", encoding="utf-8", errors="surrogateescape")
+        outputs[name].truncate(offsets[name])
+
+    interrupted = False
+    try:
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=ignore_interrupt) as executor:
+            try:
+                for results in _run_in_pool(executor, _HashBatch(args.algorithms), make_batches(files), args.jobs * 2):
+                    for path, digests, error in results:
+                        if error is not None:
+                            failed += 1
+                            progress.message(f"{path}: {error}")
+                            continue
+                        for name, digest in digests.items():
+                            outputs[name].write(hashing.format_manifest_line(digest, path))
+                        progress.advance(1, sizes[path])
+                    for output in outputs.values():
+                        output.flush()
+            except KeyboardInterrupt:
+                interrupted = True
+                executor.shutdown(wait=True, cancel_futures=True)
+    finally:
+        for output in outputs.values():
+            output.close()
+    progress.finish()
+
+    if interrupted:
+        print(f"Прервано: готово {progress.items} из {len(files)}, продолжить — с --resume", file=sys.stderr)
+        return 130
+    for manifest in manifests.values():
+        _sort_manifest(manifest)
+    if not args.quiet:
+        print(f"Захешировано {progress.items} файлов ({progress.bytes / 1048576:.1f} МиБ) за "
+              f"{time.monotonic() - progress.started:.1f} с: {', '.join(manifests.values())}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+class _HashBatch:
+    """hash_files с фиксированными алгоритмами; класс, а не lambda, — передаётся в процессы пула."""
+
+    def __init__(self, algorithms: Sequence[str]):
+        self.algorithms = list(algorithms)
+
+    def __call__(self, paths: List[str]):
+        return hashing.hash_files(paths, self.algorithms)
+
+
+def _write_private(path: str, data: bytes):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+
+
+def cmd_keygen(args) -> int:
+    key_type = ssh_keys.normalize_key_type(args.type)
+    passphrase = None
+    if args.passphrase_env:
+        passphrase = os.environ.get(args.passphrase_env, "").encode("utf-8")
+        if not passphrase:
+            raise ValueError(f"переменная окружения {args.passphrase_env} пуста")
+
+    width = max(3, len(str(args.count)))
+    names = [f"id_{key_type.lower()}_{i:0{width}d}" for i in range(1, args.count + 1)]
+    os.makedirs(args.output, exist_ok=True)
+    existing = [name for name in names if os.path.exists(os.path.join(args.output, name))]
+    if existing:
+        raise ValueError(f"в {args.output} уже есть {existing[0]}; выберите другой каталог")
+
+    chunk_size = max(1, min(16, args.count // (args.jobs * 4)))
+    batches = ([(key_type, passphrase)] * len(names[i:i + chunk_size]) for i in range(0, len(names), chunk_size))
+    progress = Progress(args.count, enabled=not args.quiet and sys.stderr.isatty())
+    pending_names = iter(names)
+    fingerprints = []
+    warned = False
+
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=ignore_interrupt) as executor:
+        for keypairs in _run_in_pool(executor, ssh_keys.generate_ssh_keypairs, batches, args.jobs * 2):
+            for keypair in keypairs:
+                name = next(pending_names)
+                path = os.path.join(args.output, name)
+                _write_private(path, keypair.pkcs8_private if args.format == "pkcs8" else keypair.openssh_private)
+                with open(f"{path}.pub", "wb") as f:
+                    f.write(keypair.public + b"\n")
+                _, blob = ssh_keys.decode_ssh_public_key_blob(keypair.public.decode("ascii"))
+                fingerprints.append(f"{ssh_keys.calculate_ssh_fingerprints(blob)['SHA256']}  {name}.pub\n")
+                encrypted = keypair.pkcs8_encrypted if args.format == "pkcs8" else keypair.encrypted
+                if passphrase and not encrypted and not warned:
+                    warned = True
+                    progress.message("⚠️ bcrypt недоступен: приватные ключи сохранены без шифрования, "
+                                     "зашифровать можно в формате --format pkcs8")
+            progress.advance(len(keypairs))
+    progress.finish()
+
+    with open(os.path.join(args.output, "FINGERPRINTS"), "a", encoding="utf-8") as f:
+        f.writelines(fingerprints)
+    if not args.quiet:
+        print(f"Создано {args.count} ключей {key_type} в {args.output} за "
+              f"{time.monotonic() - progress.started:.1f} с", file=sys.stderr)
+    return 0
+
+
+def _algorithms(value: str) -> List[str]:
+    names = list(dict.fromkeys(name.strip().lower() for name in value.split(",") if name.strip()))
+    unknown = [name for name in names if name not in hashing.HASH_FUNCTIONS]
+    if not names or unknown:
+        raise argparse.ArgumentTypeError(f"допустимы: {', '.join(hashing.HASH_FUNCTIONS)}")
+    return names
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="процессов в пуле (по умолчанию — число ядер)")
+    common.add_argument("-q", "--quiet", action="store_true", help="без прогресса и итоговой строки")
+
+    parser = argparse.ArgumentParser(prog="python -m cryptokeygen", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    hash_parser = commands.add_parser("hash", parents=[common], help="контрольные суммы файлов и каталогов")
+    hash_parser.add_argument("paths", nargs="+", metavar="PATH")
+    hash_parser.add_argument("-a", "--algorithms", type=_algorithms, default=[hashing.DEFAULT_ALGORITHM],
+                             help=f"через запятую: {','.join(hashing.HASH_FUNCTIONS)} (по умолчанию {hashing.DEFAULT_ALGORITHM})")
+    hash_parser.add_argument("-o", "--output", default=".", help="каталог для SHA256SUMS и других манифестов")
+    hash_parser.add_argument("--resume", action="store_true", help="пропустить файлы, уже записанные в манифесты")
+
+    keygen_parser = commands.add_parser("keygen", parents=[common], help="пакетная генерация SSH-ключей")
+    keygen_parser.add_argument("-t", "--type", default="ed25519", choices=sorted(ssh_keys.KEY_TYPES))
+    keygen_parser.add_argument("-n", "--count", type=int, default=1)
+    keygen_parser.add_argument("-o", "--output", required=True, help="каталог для ключей")
+    keygen_parser.add_argument("--format", choices=("openssh", "pkcs8"), default="openssh", help="формат приватного ключа")
+    keygen_parser.add_argument("--passphrase-env", metavar="VAR", help="взять пароль для ключей из переменной окружения")
+
+    args = parser.parse_args(argv)
+    if args.jobs < 1 or getattr(args, "count", 1) < 1:
+        parser.error("-j и -n должны быть положительными")
+    try:
+        return cmd_hash(args) if args.command == "hash" else cmd_keygen(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,346 @@
+"""Локальный удостоверяющий центр: создание/импорт, подпись CSR, выпуск сертификатов, CRL.
+
+Ключ и имя издателя загружаются один раз и держатся в памяти, поэтому подпись
+занимает миллисекунды — новый ключ генерируется только для выпускаемого
+сертификата без CSR.
+"""
+import json
+import os
+import secrets
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed448, ed25519, rsa
+from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+
+from cryptokeygen.x509_tools import X509_KEY_SIZE, build_san, build_subject
+
+CA_CERT_FILE = 'ca.crt'
+CA_KEY_FILE = 'ca.key'
+CA_STATE_FILE = 'state.json'
+
+SERIAL_MONOTONIC = 'monotonic'
+SERIAL_RANDOM = 'random'
+
+
+def _signing_hash(private_key):
+    if isinstance(private_key, (ed25519.Ed25519PrivateKey, ed448.Ed448PrivateKey)):
+        return None
+    return hashes.SHA256()
+
+
+def _authority_key_identifier(certificate: x509.Certificate, private_key) -> x509.AuthorityKeyIdentifier:
+    """AKI выпускаемых сертификатов и CRL: из SKI сертификата УЦ, а без него — по открытому ключу.
+
+    У импортированного УЦ SKI мог быть вычислен другим способом (не SHA-1 от
+    ключа), и проверка цепочки сопоставляет AKI именно с ним.
+    """
+    try:
+        ski = certificate.extensions.get_extension_for_class(x509.SubjectKeyIdentifier).value
+        return x509.AuthorityKeyIdentifier.from_issuer_subject_key_identifier(ski)
+    except x509.ExtensionNotFound:
+        return x509.AuthorityKeyIdentifier.from_issuer_public_key(private_key.public_key())
+
+
+class LocalCA:
+    """Загруженный в память УЦ с состоянием (серийные номера, отозванные сертификаты)."""
+
+    def __init__(self, directory: str, certificate: x509.Certificate, private_key,
+                 serial_mode: str = SERIAL_RANDOM):
+        self.directory = directory
+        self.certificate = certificate
+        self.private_key = private_key
+        self.issuer = certificate.subject
+        self.serial_mode = serial_mode
+        self._hash = _signing_hash(private_key)
+        self._aki = _authority_key_identifier(certificate, private_key)
+        self._lock = threading.Lock()
+
+        self.next_serial = 1
+        self.issued = 0
+        self.crl_number = 0
+        self.revoked: Dict[int, str] = {}
+        self._load_state()
+
+    # ---- создание и загрузка ----
+
+    @classmethod
+    def create(cls, directory: str, common_name: str, days: int = 3650,
+               passphrase: Optional[bytes] = None, serial_mode: str = SERIAL_RANDOM) -> 'LocalCA':
+        """Создаёт новый УЦ с ключом ECDSA P-256 и сохраняет его в directory."""
+        private_key = ec.generate_private_key(ec.SECP256R1())
+        subject = x509.Name([
+            x509.NameAttribute(NameOID.COMMON_NAME, common_name),
+            x509.NameAttribute(NameOID.ORGANIZATION_NAME, "Crypto Key Generator Local CA"),
+        ])
+        now = datetime.now(timezone.utc)
+        certificate = x509.CertificateBuilder().subject_name(
+            subject
+        ).issuer_name(
+            subject
+        ).public_key(
+            private_key.public_key()
+        ).serial_number(
+            x509.random_serial_number()
+        ).not_valid_before(
+            now
+        ).not_valid_after(
+            now + timedelta(days=days)
+        ).add_extension(
+            x509.BasicConstraints(ca=True, path_length=0), critical=True
+        ).add_extension(
+            x509.KeyUsage(
+                digital_signature=True, content_commitment=False, key_encipherment=False,
+                data_encipherment=False, key_agreement=False, key_cert_sign=True,
+                crl_sign=True, encipher_only=False, decipher_only=False
+            ), critical=True
+        ).add_extension(
+            x509.SubjectKeyIdentifier.from_public_key(private_key.public_key()), critical=False
+        ).sign(private_key, hashes.SHA256())
+
+        ca = cls(directory, certificate, private_key, serial_mode)
+        ca._save_files(passphrase)
+        return ca
+
+    @classmethod
+    def import_pem(cls, directory: str, bundle: bytes, key_password: Optional[bytes] = None,
+                   passphrase: Optional[bytes] = None, serial_mode: str = SERIAL_RANDOM) -> 'LocalCA':
+        """Импортирует УЦ из PEM, содержащего сертификат и приватный ключ."""
+        certificates = x509.load_pem_x509_certificates(bundle)
+        key_start = bundle.find(b'-----BEGIN ')
+        private_key = None
+        while key_start != -1:
+            header_end = bundle.find(b'-----', key_start + 11)
+            label = bundle[key_start + 11:header_end]
+            if b'PRIVATE KEY' in label:
+                end_marker = b'-----END ' + label + b'-----'
+                key_end = bundle.find(end_marker, key_start) + len(end_marker)
+                private_key = serialization.load_pem_private_key(bundle[key_start:key_end], key_password)
+                break
+            key_start = bundle.find(b'-----BEGIN ', header_end)
+        if private_key is None:
+            raise ValueError("В файле нет приватного ключа")
+
+        public_numbers = private_key.public_key().public_bytes(
+            serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        certificate = next((
+            cert for cert in certificates
+            if cert.public_key().public_bytes(
+                serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+            ) == public_numbers
+        ), None)
+        if certificate is None:
+            raise ValueError("Ни один сертификат не соответствует приватному ключу")
+
+        try:
+            constraints = certificate.extensions.get_extension_for_class(x509.BasicConstraints).value
+        except x509.ExtensionNotFound:
+            constraints = None
+        if constraints is None or not constraints.ca:
+            raise ValueError("Сертификат не является сертификатом УЦ (BasicConstraints CA=false)")
+
+        ca = cls(directory, certificate, private_key, serial_mode)
+        ca._save_files(passphrase)
+        return ca
+
+    @classmethod
+    def load(cls, directory: str, passphrase: Optional[bytes] = None,
+             serial_mode: str = SERIAL_RANDOM) -> Optional['LocalCA']:
+        """Загружает УЦ из directory или возвращает None, если его там нет."""
+        cert_path = os.path.join(directory, CA_CERT_FILE)
+        key_path = os.path.join(directory, CA_KEY_FILE)
+        if not (os.path.exists(cert_path) and os.path.exists(key_path)):
+            return None
+        with open(cert_path, 'rb') as f:
+            certificate = x509.load_pem_x509_certificate(f.read())
+        with open(key_path, 'rb') as f:
+            private_key = serialization.load_pem_private_key(f.read(), passphrase)
+        return cls(directory, certificate, private_key, serial_mode)
+
+    def _save_files(self, passphrase: Optional[bytes]):
+        os.makedirs(self.directory, exist_ok=True)
+        encryption = serialization.BestAvailableEncryption(passphrase) if passphrase else serialization.NoEncryption()
+        key_path = os.path.join(self.directory, CA_KEY_FILE)
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.private_key.private_bytes(
+                serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, encryption
+            ))
+        with open(os.path.join(self.directory, CA_CERT_FILE), 'wb') as f:
+            f.write(self.certificate.public_bytes(serialization.Encoding.PEM))
+        self._save_state()
+
+    def _load_state(self):
+        path = os.path.join(self.directory, CA_STATE_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.next_serial = data.get('next_serial', 1)
+        self.issued = data.get('issued', 0)
+        self.crl_number = data.get('crl_number', 0)
+        self.revoked = {int(serial, 16): revoked_at for serial, revoked_at in data.get('revoked', {}).items()}
+
+    def _save_state(self):
+        path = os.path.join(self.directory, CA_STATE_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'next_serial': self.next_serial,
+                'issued': self.issued,
+                'crl_number': self.crl_number,
+                'revoked': {format(serial, 'x'): revoked_at for serial, revoked_at in self.revoked.items()},
+            }, f)
+        os.replace(tmp_path, path)
+
+    # ---- выпуск ----
+
+    def _allocate_serials(self, count: int) -> List[int]:
+        with self._lock:
+            if self.serial_mode == SERIAL_MONOTONIC:
+                serials = list(range(self.next_serial, self.next_serial + count))
+                self.next_serial += count
+            else:
+                # 159 бит: положительное число не длиннее 20 байт (RFC 5280)
+                serials = [secrets.randbits(159) | 1 for _ in range(count)]
+            self.issued += count
+            self._save_state()
+        return serials
+
+    def _build_leaf(self, subject: x509.Name, public_key, serial: int, days: int,
+                    san: Optional[x509.SubjectAlternativeName]) -> x509.Certificate:
+        now = datetime.now(timezone.utc)
+        not_after = min(now + timedelta(days=days), self.certificate.not_valid_after_utc)
+        builder = x509.CertificateBuilder().subject_name(
+            subject
+        ).issuer_name(
+            self.issuer
+        ).public_key(
+            public_key
+        ).serial_number(
+            serial
+        ).not_valid_before(
+            now
+        ).not_valid_after(
+            not_after
+        ).add_extension(
+            x509.BasicConstraints(ca=False, path_length=None), critical=True
+        ).add_extension(
+            x509.ExtendedKeyUsage([ExtendedKeyUsageOID.SERVER_AUTH, ExtendedKeyUsageOID.CLIENT_AUTH]), critical=False
+        ).add_extension(
+            x509.SubjectKeyIdentifier.from_public_key(public_key), critical=False
+        ).add_extension(
+            self._aki, critical=False
+        )
+        if san is not None:
+            builder = builder.add_extension(san, critical=False)
+        return builder.sign(self.private_key, self._hash)
+
+    def sign_csrs(self, csr_pems: List[bytes], days: int = 365) -> List[Tuple[str, Optional[bytes], Optional[str]]]:
+        """Подписывает пачку CSR; для каждого возвращает (CN, PEM сертификата, ошибка)."""
+        parsed = []
+        for csr_pem in csr_pems:
+            cn = ''
+            try:
+                csr = x509.load_pem_x509_csr(csr_pem)
+                if not csr.is_signature_valid:
+                    raise ValueError("подпись CSR недействительна")
+                cn_attrs = csr.subject.get_attributes_for_oid(NameOID.COMMON_NAME)
+                cn = str(cn_attrs[0].value) if cn_attrs else ''
+                # Разбор расширений ленивый: повреждённое расширение всплывает только здесь
+                try:
+                    san = csr.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+                except x509.ExtensionNotFound:
+                    san = build_san({'CN': cn})
+                parsed.append((csr, cn, san, None))
+            except Exception as e:
+                parsed.append((None, cn, None, str(e)))
+
+        serials = iter(self._allocate_serials(sum(1 for csr, *_ in parsed if csr is not None)))
+        results = []
+        for csr, cn, san, error in parsed:
+            if csr is None:
+                results.append((cn, None, error))
+                continue
+            try:
+                certificate = self._build_leaf(csr.subject, csr.public_key(), next(serials), days, san)
+                results.append((cn, certificate.public_bytes(serialization.Encoding.PEM), None))
+            except Exception as e:
+                results.append((cn, None, str(e)))
+        return results
+
+    def sign_csr(self, csr_pem: bytes, days: int = 365) -> bytes:
+        """Подписывает один CSR и возвращает PEM сертификата."""
+        _, cert_pem, error = self.sign_csrs([csr_pem], days)[0]
+        if error:
+            raise ValueError(error)
+        return cert_pem
+
+    def issue_leaf(self, cert_details: Dict[str, str], days: int = 365,
+                   sans: Optional[List[str]] = None, private_pem: Optional[bytes] = None) -> Tuple[bytes, bytes]:
+        """Выпускает сертификат; возвращает (PEM сертификата, PEM ключа).
+
+        Ключ берётся из private_pem (сгенерированный в пуле generate_leaf_key),
+        а без него генерируется здесь же.
+        """
+        # Имя и SAN проверяются до генерации ключа и выделения серийного номера
+        subject, san = build_subject(cert_details), build_san(cert_details, sans)
+        if private_pem is None:
+            private_pem = generate_leaf_key()
+        private_key = serialization.load_pem_private_key(private_pem, None)
+        serial = self._allocate_serials(1)[0]
+        certificate = self._build_leaf(subject, private_key.public_key(), serial, days, san)
+        return certificate.public_bytes(serialization.Encoding.PEM), private_pem
+
+    # ---- отзыв ----
+
+    def revoke(self, serial: int):
+        """Помечает сертификат с данным серийным номером как отозванный."""
+        with self._lock:
+            self.revoked[serial] = datetime.now(timezone.utc).isoformat()
+            self._save_state()
+
+    def generate_crl(self, next_update_days: int = 7) -> bytes:
+        """Формирует подписанный CRL в PEM."""
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            self.crl_number += 1
+            crl_number = self.crl_number
+            revoked = dict(self.revoked)
+            self._save_state()
+
+        builder = x509.CertificateRevocationListBuilder().issuer_name(
+            self.issuer
+        ).last_update(
+            now
+        ).next_update(
+            now + timedelta(days=next_update_days)
+        ).add_extension(
+            x509.CRLNumber(crl_number), critical=False
+        ).add_extension(
+            self._aki, critical=False
+        )
+        for serial, revoked_at in revoked.items():
+            builder = builder.add_revoked_certificate(
+                x509.RevokedCertificateBuilder().serial_number(
+                    serial
+                ).revocation_date(
+                    datetime.fromisoformat(revoked_at)
+                ).build()
+            )
+        return builder.sign(self.private_key, self._hash).public_bytes(serialization.Encoding.PEM)
+
+    def certificate_pem(self) -> bytes:
+        return self.certificate.public_bytes(serialization.Encoding.PEM)
+
+
+def generate_leaf_key() -> bytes:
+    """Ключ RSA для сертификата от УЦ в PKCS#8 PEM; выполняется в процессе пула."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=X509_KEY_SIZE)
+    return private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
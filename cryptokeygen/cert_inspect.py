@@ -0,0 +1,209 @@
+"""Разбор пачек сертификатов X.509 и построение цепочек.
+
+Сертификаты индексируются по subject и по Subject Key Identifier, поэтому
+издатель каждого сертификата находится одним обращением к словарю (сначала
+по Authority Key Identifier, затем по имени издателя), а все цепочки
+строятся за линейное время от размера пачки.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import dsa, ec, ed448, ed25519, rsa
+from cryptography.hazmat.primitives.serialization import pkcs7
+from cryptography.x509.oid import NameOID
+
+from cryptokeygen.x509_tools import iter_pem_blocks
+
+EXPIRY_WARNING_DAYS = 30
+MAX_CHAIN_DEPTH = 16
+
+
+def iter_certificates(data: bytes) -> Iterator[Tuple[Optional[x509.Certificate], Optional[str]]]:
+    """Перебирает сертификаты из PEM-пачки, DER или PKCS#7; ошибки разбора отдаются как (None, текст)."""
+    if b'-----BEGIN' in data:
+        for block in iter_pem_blocks(data, b'CERTIFICATE'):
+            try:
+                yield x509.load_pem_x509_certificate(block), None
+            except ValueError as e:
+                yield None, str(e)
+        for block in iter_pem_blocks(data, b'PKCS7'):
+            try:
+                for certificate in pkcs7.load_pem_pkcs7_certificates(block):
+                    yield certificate, None
+            except ValueError as e:
+                yield None, str(e)
+        return
+
+    try:
+        yield x509.load_der_x509_certificate(data), None
+        return
+    except ValueError:
+        pass
+    try:
+        for certificate in pkcs7.load_der_pkcs7_certificates(data):
+            yield certificate, None
+    except ValueError as e:
+        yield None, f"не удалось разобрать DER: {e}"
+
+
+def describe_public_key(public_key) -> str:
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return f"RSA {public_key.key_size}"
+    if isinstance(public_key, ec.EllipticCurvePublicKey):
+        return f"ECDSA {public_key.curve.name}"
+    if isinstance(public_key, ed25519.Ed25519PublicKey):
+        return "Ed25519"
+    if isinstance(public_key, ed448.Ed448PublicKey):
+        return "Ed448"
+    if isinstance(public_key, dsa.DSAPublicKey):
+        return f"DSA {public_key.key_size}"
+    return type(public_key).__name__
+
+
+def _extension(certificate: x509.Certificate, extension_class):
+    try:
+        return certificate.extensions.get_extension_for_class(extension_class).value
+    except (x509.ExtensionNotFound, ValueError):
+        return None
+
+
+def _short_name(name: x509.Name) -> str:
+    cn = name.get_attributes_for_oid(NameOID.COMMON_NAME)
+    return str(cn[0].value) if cn else name.rfc4514_string()
+
+
+class CertificateIndex:
+    """Индексы subject → сертификаты и SKI → сертификаты для поиска издателя за O(1)."""
+
+    def __init__(self):
+        self.certificates: List[x509.Certificate] = []
+        self.by_subject: Dict[bytes, List[int]] = {}
+        self.by_ski: Dict[bytes, List[int]] = {}
+        self._fingerprints: Dict[bytes, int] = {}
+        self.duplicates = 0
+
+    def add(self, certificate: x509.Certificate) -> Optional[int]:
+        fingerprint = certificate.fingerprint(hashes.SHA256())
+        if fingerprint in self._fingerprints:
+            self.duplicates += 1
+            return None
+        index = len(self.certificates)
+        self._fingerprints[fingerprint] = index
+        self.certificates.append(certificate)
+        self.by_subject.setdefault(certificate.subject.public_bytes(), []).append(index)
+        ski = _extension(certificate, x509.SubjectKeyIdentifier)
+        if ski is not None:
+            self.by_ski.setdefault(ski.digest, []).append(index)
+        return index
+
+    def find_issuer(self, index: int) -> Optional[int]:
+        certificate = self.certificates[index]
+        if certificate.issuer == certificate.subject:
+            return None
+
+        candidates: List[int] = []
+        aki = _extension(certificate, x509.AuthorityKeyIdentifier)
+        if aki is not None and aki.key_identifier:
+            candidates = self.by_ski.get(aki.key_identifier, [])
+        if not candidates:
+            candidates = self.by_subject.get(certificate.issuer.public_bytes(), [])
+
+        for candidate in candidates:
+            if candidate == index:
+                continue
+            try:
+                certificate.verify_directly_issued_by(self.certificates[candidate])
+                return candidate
+            except Exception:
+                continue
+        return None
+
+
+def inspect_bundle(data: bytes) -> Dict[str, object]:
+    """Полный разбор пачки; предназначен для запуска в пуле процессов."""
+    index = CertificateIndex()
+    parse_errors: List[str] = []
+    for certificate, error in iter_certificates(data):
+        if certificate is None:
+            parse_errors.append(error)
+        else:
+            index.add(certificate)
+
+    now = datetime.now(timezone.utc)
+    issuers = [index.find_issuer(i) for i in range(len(index.certificates))]
+    is_issuer = set(i for i in issuers if i is not None)
+
+    certificates = []
+    for i, certificate in enumerate(index.certificates):
+        san = _extension(certificate, x509.SubjectAlternativeName)
+        constraints = _extension(certificate, x509.BasicConstraints)
+        not_after = certificate.not_valid_after_utc
+        certificates.append({
+            "subject": _short_name(certificate.subject),
+            "issuer": _short_name(certificate.issuer),
+            "serial": format(certificate.serial_number, 'X'),
+            "not_after": not_after.strftime('%Y-%m-%d'),
+            "expired": not_after < now,
+            "expiring": now <= not_after < now + timedelta(days=EXPIRY_WARNING_DAYS),
+            "key": describe_public_key(certificate.public_key()),
+            "san": [str(name.value) for name in san] if san is not None else [],
+            "is_ca": bool(constraints and constraints.ca),
+            "self_signed": certificate.issuer == certificate.subject,
+        })
+
+    chains = []
+    missing: Dict[str, int] = {}
+    for leaf in range(len(index.certificates)):
+        if leaf in is_issuer:
+            continue
+        chain, current = [leaf], leaf
+        while issuers[current] is not None and len(chain) < MAX_CHAIN_DEPTH and issuers[current] not in chain:
+            current = issuers[current]
+            chain.append(current)
+        complete = certificates[current]["self_signed"]
+        if not complete:
+            issuer_name = certificates[current]["issuer"]
+            missing[issuer_name] = missing.get(issuer_name, 0) + 1
+        chains.append({"path": chain, "complete": complete})
+
+    return {
+        "certificates": certificates,
+        "chains": chains,
+        "missing_issuers": missing,
+        "duplicates": index.duplicates,
+        "parse_errors": parse_errors,
+    }
+
+
+def format_report(report: Dict[str, object]) -> str:
+    """Подробный текстовый отчёт по результату inspect_bundle."""
+    certificates = report["certificates"]
+    lines = [f"Сертификатов: {len(certificates)}, дубликатов: {report['duplicates']}, "
+             f"ошибок разбора: {len(report['parse_errors'])}", ""]
+
+    for number, chain in enumerate(report["chains"], start=1):
+        status = "полная" if chain["complete"] else "НЕПОЛНАЯ"
+        lines.append(f"Цепочка {number} ({status}):")
+        for depth, i in enumerate(chain["path"]):
+            cert = certificates[i]
+            flags = []
+            if cert["expired"]:
+                flags.append("ИСТЁК")
+            elif cert["expiring"]:
+                flags.append(f"истекает < {EXPIRY_WARNING_DAYS} дн.")
+            if cert["is_ca"]:
+                flags.append("CA")
+            lines.append(f"{'  ' * (depth + 1)}{cert['subject']} [{cert['key']}, до {cert['not_after']}, "
+                         f"serial {cert['serial']}]{' ' + ', '.join(flags) if flags else ''}")
+            if cert["san"]:
+                lines.append(f"{'  ' * (depth + 2)}SAN: {', '.join(cert['san'])}")
+        if not chain["complete"]:
+            lines.append(f"{'  ' * (len(chain['path']) + 1)}отсутствует издатель: "
+                         f"{certificates[chain['path'][-1]]['issuer']}")
+        lines.append("")
+
+    for error in report["parse_errors"]:
+        lines.append(f"Ошибка разбора: {error}")
+    return "\n".join(lines)
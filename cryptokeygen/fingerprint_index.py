@@ -0,0 +1,200 @@
+"""Постоянный индекс SHA-256 fingerprint публичных ключей (SQLite, WAL).
+
+Хранятся только 32-байтные дайджесты blob ключа — сам ключ не сохраняется.
+Записи копятся в памяти и сбрасываются пачками из отдельного потока, поэтому
+record() не блокирует event loop. lookup() читает через отдельное соединение
+в потоке: в WAL чтение не ждёт идущую запись пачки, а сама пачка остаётся видна
+lookup() в памяти, пока её транзакция не зафиксирована.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS key_fingerprints (
+    digest BLOB PRIMARY KEY,
+    seen_count INTEGER NOT NULL,
+    first_seen INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS key_sightings (
+    digest BLOB NOT NULL,
+    chat_id INTEGER NOT NULL,
+    PRIMARY KEY (digest, chat_id)
+) WITHOUT ROWID;
+"""
+
+
+class FingerprintIndex:
+    """Индекс «видели ли этот ключ раньше и сколько раз»."""
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._db_lock = threading.Lock()
+        # Отдельное соединение для чтения: lookup() не ждёт _db_lock, пока пишется пачка
+        self._read_conn = sqlite3.connect(path, check_same_thread=False)
+        self._read_conn.execute("PRAGMA query_only=ON")
+        self._read_lock = threading.Lock()
+
+        # digest -> [count, first_seen, last_seen, {chat_id}]
+        self._pending: Dict[bytes, list] = {}
+        # Пачка, которую сейчас пишет flush(): до COMMIT её нет в базе для _read_conn
+        self._flushing: Dict[bytes, list] = {}
+        # Чётное — пачка не фиксируется; нечётное — идёт COMMIT (см. _lookup_sync)
+        self._generation = 0
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_event: Optional[asyncio.Event] = None
+
+    def record(self, digest: bytes, chat_id: int):
+        """Ставит наблюдение ключа в очередь на запись."""
+        now = int(time.time())
+        with self._pending_lock:
+            entry = self._pending.get(digest)
+            if entry is None:
+                self._pending[digest] = [1, now, now, {chat_id}]
+            else:
+                entry[0] += 1
+                entry[2] = now
+                entry[3].add(chat_id)
+            pending = len(self._pending)
+
+        if pending >= self.batch_size and self._flush_event is not None:
+            self._flush_event.set()
+
+    def _lookup_db(self, digest: bytes, pending_chats: Set[int]) -> Tuple[int, int, int]:
+        with self._read_lock:
+            row = self._read_conn.execute(
+                "SELECT seen_count FROM key_fingerprints WHERE digest = ?", (digest,)
+            ).fetchone()
+            (chats,) = self._read_conn.execute(
+                "SELECT COUNT(*) FROM key_sightings WHERE digest = ?", (digest,)
+            ).fetchone()
+            known = 0
+            if pending_chats:
+                # Чаты из очереди, уже записанные в базу, не должны посчитаться дважды
+                placeholders = ",".join("?" * len(pending_chats))
+                (known,) = self._read_conn.execute(
+                    f"SELECT COUNT(*) FROM key_sightings WHERE digest = ? AND chat_id IN ({placeholders})",
+                    (digest, *pending_chats)
+                ).fetchone()
+        return (row[0] if row else 0), chats, known
+
+    def _lookup_sync(self, digest: bytes) -> Tuple[int, int]:
+        while True:
+            pending_seen, pending_chats = 0, set()
+            with self._pending_lock:
+                generation = self._generation
+                for batch in (self._flushing, self._pending):
+                    entry = batch.get(digest)
+                    if entry is not None:
+                        pending_seen += entry[0]
+                        pending_chats |= entry[3]
+            if generation % 2:
+                # Пачка фиксируется: неизвестно, увидит ли её чтение из базы
+                time.sleep(0.001)
+                continue
+
+            seen, chats, known = self._lookup_db(digest, pending_chats)
+            with self._pending_lock:
+                if self._generation == generation:
+                    return seen + pending_seen, chats + len(pending_chats) - known
+
+    async def lookup(self, digest: bytes) -> Tuple[int, int]:
+        """Возвращает (сколько раз ключ встречался, у скольких разных чатов)."""
+        return await asyncio.to_thread(self._lookup_sync, digest)
+
+    def flush(self) -> int:
+        """Синхронно записывает накопленные наблюдения одной транзакцией."""
+        with self._flush_lock:
+            return self._flush_batch()
+
+    def _flush_batch(self) -> int:
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            self._flushing = pending
+        if not pending:
+            return 0
+
+        counts: List[tuple] = []
+        sightings: List[tuple] = []
+        for digest, (count, first_seen, last_seen, chat_ids) in pending.items():
+            counts.append((digest, count, first_seen, last_seen))
+            sightings.extend((digest, chat_id) for chat_id in chat_ids)
+
+        with self._db_lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO key_fingerprints (digest, seen_count, first_seen, last_seen) "
+                    "VALUES (?, ?, ?, ?) ON CONFLICT(digest) DO UPDATE SET "
+                    "seen_count = seen_count + excluded.seen_count, last_seen = excluded.last_seen",
+                    counts
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO key_sightings (digest, chat_id) VALUES (?, ?)",
+                    sightings
+                )
+                with self._pending_lock:
+                    self._generation += 1
+                try:
+                    self._conn.execute("COMMIT")
+                finally:
+                    with self._pending_lock:
+                        self._generation += 1
+                        if not self._conn.in_transaction:
+                            self._flushing = {}
+            except Exception:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                self._requeue(pending)
+                raise
+        return len(counts)
+
+    def _requeue(self, pending: Dict[bytes, list]):
+        with self._pending_lock:
+            self._flushing = {}
+            for digest, (count, first_seen, last_seen, chat_ids) in pending.items():
+                entry = self._pending.get(digest)
+                if entry is None:
+                    self._pending[digest] = [count, first_seen, last_seen, chat_ids]
+                else:
+                    entry[0] += count
+                    entry[1] = min(entry[1], first_seen)
+                    entry[3] |= chat_ids
+
+    async def run_flusher(self):
+        """Фоновая задача: сбрасывает очередь раз в flush_interval или при заполнении пачки."""
+        self._flush_event = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Ошибка записи индекса fingerprint: {e}")
+
+    def close(self):
+        """Сбрасывает остаток очереди и закрывает базу."""
+        self.flush()
+        with self._read_lock:
+            self._read_conn.close()
+        with self._db_lock:
+            self._conn.close()
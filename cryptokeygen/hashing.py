@@ -0,0 +1,109 @@
+"""Алгоритмы хеширования, общие для бота, HTTP API и командной строки."""
+import hashlib
+import re
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+HASH_FUNCTIONS: Dict[str, Callable[..., "hashlib._Hash"]] = {
+    'md5': hashlib.md5,
+    'sha1': hashlib.sha1,
+    'sha256': hashlib.sha256,
+    'sha512': hashlib.sha512,
+    'blake2b': lambda data=b'': hashlib.blake2b(data, digest_size=64),
+}
+DEFAULT_ALGORITHM = 'sha256'
+FILE_CHUNK_SIZE = 1024 * 1024
+
+_MANIFEST_LINE = re.compile(r'^(\\?)([0-9a-f]+) [ *](.*)$')
+
+
+def new_hash(algorithm: str, data: bytes = b''):
+    """Объект хеша по имени алгоритма; неизвестное имя — SHA-256, как в интерфейсе бота."""
+    return HASH_FUNCTIONS.get(algorithm, HASH_FUNCTIONS[DEFAULT_ALGORITHM])(data)
+
+
+class HashWriter:
+    """Файлоподобный приёмник для bot.download_file: хеширует поток, не накапливая его в памяти."""
+
+    def __init__(self, algorithm: str, on_write: Optional[Callable[[int], None]] = None):
+        self.hash = new_hash(algorithm)
+        self.on_write = on_write
+        self.size = 0
+        self.seconds = 0.0   # время собственно хеширования, без ожидания сети
+
+    def write(self, data: bytes) -> int:
+        started = time.perf_counter()
+        self.hash.update(data)
+        self.seconds += time.perf_counter() - started
+        self.size += len(data)
+        if self.on_write is not None:
+            self.on_write(len(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def hexdigest(self) -> str:
+        return self.hash.hexdigest()
+
+
+def hash_file(path: str, algorithms: Sequence[str]) -> Dict[str, str]:
+    """Хеширует файл всеми алгоритмами за один проход, читая блоками в один буфер."""
+    hashers = {name: new_hash(name) for name in algorithms}
+    buffer = bytearray(FILE_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            for h in hashers.values():
+                h.update(view[:size])
+    return {name: h.hexdigest() for name, h in hashers.items()}
+
+
+def hash_files(paths: List[str], algorithms: Sequence[str]) -> List[Tuple[str, Optional[Dict[str, str]], Optional[str]]]:
+    """Пачка файлов для процесса пула: [(путь, {алгоритм: hex}, ошибка)]."""
+    results = []
+    for path in paths:
+        try:
+            results.append((path, hash_file(path, algorithms), None))
+        except OSError as e:
+            results.append((path, None, e.strerror or str(e)))
+    return results
+
+
+def manifest_name(algorithm: str) -> str:
+    """Имя файла контрольных сумм, как у coreutils: sha256 → SHA256SUMS."""
+    return f"{algorithm.upper()}SUMS"
+
+
+def format_manifest_line(digest: str, path: str) -> str:
+    """Строка в формате sha256sum; имена с \\ и переводом строки экранируются так же."""
+    if '\\' in path or '\n' in path:
+        escaped = path.replace('\\', '\\\\').replace('\n', '\\n')
+        return '\\' + digest + '  ' + escaped + '\n'
+    return f"{digest}  {path}\n"
+
+
+def read_manifest(path: str) -> Tuple[Dict[str, str], int]:
+    """Читает файл контрольных сумм: ({путь: hex}, длина корректной части в байтах).
+
+    Оборванная последняя строка (прерванный запуск) не учитывается — по длине
+    корректной части файл обрезается перед дозаписью.
+    """
+    entries: Dict[str, str] = {}
+    valid = 0
+    with open(path, 'rb') as f:
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            match = _MANIFEST_LINE.match(raw[:-1].decode('utf-8', 'surrogateescape'))
+            if match is None:
+                break
+            escaped, digest, name = match.groups()
+            if escaped:
+                name = re.sub(r'\\(.)', lambda m: '\n' if m.group(1) == 'n' else m.group(1), name)
+            entries[name] = digest
+            valid += len(raw)
+    return entries, valid
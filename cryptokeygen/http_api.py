@@ -0,0 +1,214 @@
+"""Локальный HTTP API к криптодвижкам бота для автоматизации (CI и скрипты).
+
+Те же функции, что и в чате: генерация SSH-ключей, CSR и самоподписанных
+сертификатов, хеширование и fingerprint'ы OpenSSH. Тяжёлые операции идут
+через общий пул процессов с тем же контролем допуска, что и у бота: при
+переполнении очереди API отвечает 503 с Retry-After. Тело запроса на
+хеширование читается потоком и не накапливается в памяти.
+
+    POST /v1/hash?algorithm=sha256&algorithm=md5   тело — данные
+    POST /v1/ssh/keys        {"type": "ed25519", "count": 1, "passphrase": null}
+    POST /v1/ssh/fingerprint тело — публичные ключи OpenSSH, по одному в строке
+    POST /v1/x509            {"kind": "csr", "subjects": [{"CN": "example.com", "SANs": ["www.example.com"]}]}
+    GET  /v1/health
+"""
+import asyncio
+import functools
+import hmac
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+from cryptokeygen import hashing, metrics, ssh_keys
+from cryptokeygen.pool import PoolBusyError, map_in_pool, pool_stats
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+RETRY_AFTER_SECONDS = 2
+
+HTTP_API_SECONDS = metrics.histogram("crypto_http_api_duration_seconds", "Длительность запросов HTTP API", ("endpoint", "status"))
+
+
+class CryptoAPIServer:
+    """aiohttp-сервер HTTP API; при заданном token требует заголовок Authorization: Bearer <token>."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8090, *, token: str = "", max_batch: int = 100,
+                 shutdown_timeout: float = 60.0, loads: Callable[[str], Any] = json.loads,
+                 dumps: Callable[[Any], str] = json.dumps):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.max_batch = max_batch
+        self.shutdown_timeout = shutdown_timeout
+        self.loads = loads
+        self.dumps = dumps
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.router.add_get("/v1/health", self._handle_health)
+        self.app.router.add_post("/v1/hash", self._handle_hash)
+        self.app.router.add_post("/v1/ssh/keys", self._handle_ssh_keys)
+        self.app.router.add_post("/v1/ssh/fingerprint", self._handle_fingerprint)
+        self.app.router.add_post("/v1/x509", self._handle_x509)
+
+    def _json(self, payload: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> web.Response:
+        return web.json_response(payload, status=status, headers=headers, dumps=self.dumps)
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        started = time.perf_counter()
+        status = 500
+        try:
+            if self.token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {self.token}"):
+                response = self._json({"error": "unauthorized"}, status=401)
+            else:
+                try:
+                    response = await handler(request)
+                except PoolBusyError as e:
+                    response = self._json({"error": str(e)}, status=503, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+                except ValueError as e:
+                    response = self._json({"error": str(e)}, status=400)
+            status = response.status
+            return response
+        finally:
+            route = request.match_info.route.resource
+            HTTP_API_SECONDS.observe(time.perf_counter() - started,
+                                     endpoint=route.canonical if route is not None else "unknown", status=str(status))
+
+    async def _read_json(self, request: web.Request) -> Dict[str, Any]:
+        try:
+            payload = self.loads(await request.text())
+        except ValueError:
+            raise ValueError("тело запроса должно быть JSON-объектом")
+        if not isinstance(payload, dict):
+            raise ValueError("тело запроса должно быть JSON-объектом")
+        return payload
+
+    def _count(self, payload: Dict[str, Any]) -> int:
+        count = payload.get("count", 1)
+        if not isinstance(count, int) or not 1 <= count <= self.max_batch:
+            raise ValueError(f"count должен быть целым от 1 до {self.max_batch}")
+        return count
+
+    async def _handle_health(self, request: web.Request) -> web.Response:
+        return self._json({"status": "ok", "pool": pool_stats()})
+
+    async def _handle_hash(self, request: web.Request) -> web.Response:
+        algorithms = request.query.getall("algorithm", [hashing.DEFAULT_ALGORITHM])
+        unknown = [name for name in algorithms if name not in hashing.HASH_FUNCTIONS]
+        if unknown:
+            raise ValueError(f"неизвестные алгоритмы: {', '.join(unknown)}; допустимы: {', '.join(hashing.HASH_FUNCTIONS)}")
+
+        hashers = {name: hashing.new_hash(name) for name in dict.fromkeys(algorithms)}
+        size = 0
+        started = time.perf_counter()
+        async for chunk in request.content.iter_chunked(HASH_CHUNK_SIZE):
+            size += len(chunk)
+            # hashlib отпускает GIL на больших буферах: цикл событий не блокируется
+            await asyncio.to_thread(_update_all, hashers, chunk)
+        elapsed = time.perf_counter() - started
+
+        for name in hashers:
+            metrics.CRYPTO_SECONDS.observe(elapsed, operation="hash_stream", algorithm=name, size=metrics.size_bucket(size))
+            metrics.HASHED_BYTES.inc(size, algorithm=name)
+        return self._json({"size": size, "hashes": {name: h.hexdigest() for name, h in hashers.items()}})
+
+    async def _handle_ssh_keys(self, request: web.Request) -> web.Response:
+        payload = await self._read_json(request)
+        key_type = ssh_keys.normalize_key_type(str(payload.get("type", "ed25519")))
+        count = self._count(payload)
+        passphrase = payload.get("passphrase")
+        if passphrase is not None and not isinstance(passphrase, str):
+            raise ValueError("passphrase должен быть строкой или null")
+        passphrase = passphrase.encode("utf-8") if passphrase else None
+
+        with metrics.CRYPTO_SECONDS.time(operation="ssh_keygen_batch", algorithm=key_type,
+                                         size=ssh_keys.RSA_KEY_SIZE if key_type == "RSA" else 256):
+            keypairs = await map_in_pool(ssh_keys.generate_ssh_keypairs, [(key_type, passphrase)] * count)
+
+        keys = []
+        for keypair in keypairs:
+            _, blob = ssh_keys.decode_ssh_public_key_blob(keypair.public.decode("ascii"))
+            keys.append({
+                "type": keypair.key_type,
+                "public_key": keypair.public.decode("ascii"),
+                "private_key": keypair.openssh_private.decode("ascii"),
+                "private_key_pkcs8": keypair.pkcs8_private.decode("ascii"),
+                "encrypted": keypair.encrypted,
+                "private_key_pkcs8_encrypted": keypair.pkcs8_encrypted,
+                "fingerprints": ssh_keys.calculate_ssh_fingerprints(blob),
+            })
+        return self._json({"keys": keys})
+
+    async def _handle_fingerprint(self, request: web.Request) -> web.Response:
+        text = await request.text()
+        results: List[Dict[str, Any]] = []
+        for line_no, line in enumerate(text.splitlines(), start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                key_type, blob = ssh_keys.decode_ssh_public_key_blob(line)
+                results.append({"line": line_no, "type": key_type, **ssh_keys.calculate_ssh_fingerprints(blob)})
+            except ValueError as e:
+                results.append({"line": line_no, "error": str(e)})
+        if not results:
+            raise ValueError("в теле нет публичных ключей")
+        return self._json({"keys": results})
+
+    async def _handle_x509(self, request: web.Request) -> web.Response:
+        payload = await self._read_json(request)
+        kind = payload.get("kind", "csr")
+        if kind not in ("csr", "self_signed"):
+            raise ValueError("kind должен быть csr или self_signed")
+        subjects = payload.get("subjects")
+        if not isinstance(subjects, list) or not 1 <= len(subjects) <= self.max_batch:
+            raise ValueError(f"subjects должен быть списком из 1..{self.max_batch} объектов")
+
+        rows = [(index, _subject_row(subject)) for index, subject in enumerate(subjects)]
+        # Генерация и проверка строк — та же, что у пакетной генерации из CSV в боте
+        from cryptokeygen import x509_tools
+
+        with metrics.CRYPTO_SECONDS.time(operation=f"{kind}_batch", algorithm="RSA", size=x509_tools.X509_KEY_SIZE):
+            results = await map_in_pool(functools.partial(x509_tools.generate_x509_rows, is_csr=kind == "csr"), rows)
+
+        return self._json({"results": [
+            {"index": index, "cn": cn, "error": error} if error else
+            {"index": index, "cn": cn, "pem": pem.decode("ascii"), "private_key": key_pem.decode("ascii")}
+            for index, cn, pem, key_pem, error in results
+        ]})
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None, shutdown_timeout=self.shutdown_timeout)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"🛠️ HTTP API: http://{self.host}:{self.port}/v1/")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def _update_all(hashers: Dict[str, Any], chunk: bytes):
+    for h in hashers.values():
+        h.update(chunk)
+
+
+def _subject_row(subject: Any) -> Dict[str, str]:
+    """JSON-объект субъекта → строка в формате CSV пакетной генерации."""
+    if not isinstance(subject, dict):
+        raise ValueError("каждый элемент subjects должен быть объектом")
+    row = {key: str(value) for key, value in subject.items() if key != "SANs" and value is not None}
+    sans = subject.get("SANs") or []
+    if isinstance(sans, list):
+        if not all(isinstance(name, str) for name in sans):
+            raise ValueError("SANs должен быть строкой или списком строк")
+        sans = ";".join(sans)
+    row["SANs"] = str(sans)
+    return row
+
@@ -0,0 +1,205 @@
+"""Хеши паролей для конфигов: Argon2id, scrypt, bcrypt и PBKDF2 с калибровкой стоимости.
+
+Быстрые дайджесты (SHA-256 и т.п.) для паролей не годятся. Здесь каждый хеш
+намеренно стоит заданное время и память. Параметры подбираются калибровкой
+на самом сервере, в процессе пула, где потом и считаются хеши. Все функции
+принимают и возвращают простые значения, пригодные для передачи между
+процессами.
+
+Результат — строка в формате PHC ($argon2id$..., $scrypt$..., $pbkdf2-sha256$...)
+или стандартный $2b$ для bcrypt. bcrypt необязателен: pip install bcrypt.
+"""
+import base64
+import hashlib
+import hmac
+import math
+import os
+import time
+from typing import Any, Callable, Dict, List
+
+from cryptography.exceptions import InvalidKey
+from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
+
+try:
+    import bcrypt
+except ImportError:
+    bcrypt = None
+
+ALGORITHMS = {
+    "argon2id": "Argon2id",
+    "scrypt": "scrypt",
+    "bcrypt": "bcrypt",
+    "pbkdf2_sha256": "PBKDF2-SHA256",
+}
+SALT_SIZE = 16
+HASH_SIZE = 32
+BCRYPT_MAX_PASSWORD = 72
+
+# Нижние границы по рекомендациям OWASP: калибровка на медленном сервере не опускается ниже
+MIN_ARGON2_MEMORY_KIB = 19 * 1024
+ARGON2_SINGLE_PASS_MEMORY_KIB = 46 * 1024   # меньше памяти — не меньше двух проходов
+MIN_SCRYPT_LOG_N = 14
+MIN_SCRYPT_P = {14: 5, 15: 3, 16: 2}        # меньшее N у OWASP добирается параллелизмом
+MIN_PBKDF2_ITERATIONS = 600_000
+MIN_BCRYPT_COST = 10
+MAX_BCRYPT_COST = 16
+
+
+def available() -> List[str]:
+    """Алгоритмы, доступные в этой установке."""
+    return [name for name in ALGORITHMS if name != "bcrypt" or bcrypt is not None]
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password: bytes, salt: bytes, log_n: int, r: int, p: int) -> bytes:
+    n = 1 << log_n
+    return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, maxmem=256 * r * n + (1 << 20), dklen=HASH_SIZE)
+
+
+def _pbkdf2(password: bytes, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password, salt, iterations, HASH_SIZE)
+
+
+def hash_password(algorithm: str, password: bytes, params: Dict[str, int]) -> str:
+    """Хеш пароля с параметрами из calibrate(); ValueError для недопустимого ввода."""
+    if not password:
+        raise ValueError("Пустой пароль")
+    salt = os.urandom(SALT_SIZE)
+    if algorithm == "argon2id":
+        kdf = Argon2id(salt=salt, length=HASH_SIZE, iterations=params["t"], lanes=params["p"], memory_cost=params["m"])
+        return kdf.derive_phc_encoded(password)
+    if algorithm == "scrypt":
+        digest = _scrypt(password, salt, params["ln"], params["r"], params["p"])
+        return f"$scrypt$ln={params['ln']},r={params['r']},p={params['p']}${_b64(salt)}${_b64(digest)}"
+    if algorithm == "pbkdf2_sha256":
+        return f"$pbkdf2-sha256$i={params['i']},l={HASH_SIZE}${_b64(salt)}${_b64(_pbkdf2(password, salt, params['i']))}"
+    if algorithm == "bcrypt":
+        if bcrypt is None:
+            raise ValueError("bcrypt не установлен")
+        if len(password) > BCRYPT_MAX_PASSWORD:
+            raise ValueError(f"bcrypt учитывает не больше {BCRYPT_MAX_PASSWORD} байт пароля")
+        return bcrypt.hashpw(password, bcrypt.gensalt(params["cost"])).decode("ascii")
+    raise ValueError(f"Неизвестный алгоритм: {algorithm!r}")
+
+
+def verify_password(encoded: str, password: bytes) -> bool:
+    """Проверяет пароль по строке, полученной из hash_password()."""
+    if encoded.startswith("$argon2id$"):
+        try:
+            Argon2id.verify_phc_encoded(password, encoded)
+            return True
+        except InvalidKey:
+            return False
+    if encoded.startswith(("$2a$", "$2b$", "$2y$")):
+        if bcrypt is None:
+            raise ValueError("bcrypt не установлен")
+        return bcrypt.checkpw(password, encoded.encode("ascii"))
+
+    try:
+        _, scheme, settings, salt, digest = encoded.split("$")
+        options = dict(item.split("=", 1) for item in settings.split(","))
+        salt, digest = _unb64(salt), _unb64(digest)
+        if scheme == "scrypt":
+            computed = _scrypt(password, salt, int(options["ln"]), int(options["r"]), int(options["p"]))
+        elif scheme == "pbkdf2-sha256":
+            computed = _pbkdf2(password, salt, int(options["i"]))
+        else:
+            raise ValueError(f"Неизвестный формат хеша: ${scheme}$")
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Некорректная строка хеша: {e}")
+    return hmac.compare_digest(computed, digest)
+
+
+def _measure(func: Callable[[], Any], repeat: int = 2) -> float:
+    best = math.inf
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _calibrate_argon2id(target: float, max_memory: int) -> Dict[str, Any]:
+    memory_kib = max(MIN_ARGON2_MEMORY_KIB, max_memory // 1024)
+    password, salt = b"calibration", os.urandom(SALT_SIZE)
+
+    def measure(memory_kib: int, iterations: int) -> float:
+        # Объект KDF одноразовый: на каждый замер — новый
+        return _measure(lambda: Argon2id(salt=salt, length=HASH_SIZE, iterations=iterations, lanes=1,
+                                         memory_cost=memory_kib).derive(password))
+
+    elapsed = measure(memory_kib, 1)
+    # Один проход по всей памяти дольше цели — память уменьшается, но не ниже минимума OWASP
+    while elapsed > target and memory_kib // 2 >= MIN_ARGON2_MEMORY_KIB:
+        memory_kib //= 2
+        elapsed = measure(memory_kib, 1)
+    # Время = выделение памяти + проходы: стоимость прохода — разница замеров с t=2 и t=1
+    per_pass = max(measure(memory_kib, 2) - elapsed, 1e-6)
+    min_iterations = 1 if memory_kib >= ARGON2_SINGLE_PASS_MEMORY_KIB else 2
+    iterations = max(min_iterations, round((target - (elapsed - per_pass)) / per_pass))
+    elapsed = elapsed - per_pass + per_pass * iterations
+    return {"params": {"m": memory_kib, "t": iterations, "p": 1},
+            "seconds": elapsed, "memory": memory_kib * 1024}
+
+
+def _calibrate_scrypt(target: float, max_memory: int) -> Dict[str, Any]:
+    r = 8
+    log_n = max(MIN_SCRYPT_LOG_N, int(math.log2(max_memory / (128 * r))))
+    password, salt = b"calibration", os.urandom(SALT_SIZE)
+    elapsed = _measure(lambda: _scrypt(password, salt, log_n, r, 1))
+    while elapsed > target and log_n > MIN_SCRYPT_LOG_N:
+        log_n -= 1
+        elapsed /= 2
+    # Оставшийся запас времени добирается параллелизмом p: он не добавляет памяти
+    p = max(MIN_SCRYPT_P.get(log_n, 1), round(target / elapsed))
+    return {"params": {"ln": log_n, "r": r, "p": p}, "seconds": elapsed * p, "memory": 128 * r * (1 << log_n)}
+
+
+def _calibrate_pbkdf2(target: float, max_memory: int) -> Dict[str, Any]:
+    sample = 20_000
+    elapsed = _measure(lambda: _pbkdf2(b"calibration", b"salt" * 4, sample))
+    iterations = max(MIN_PBKDF2_ITERATIONS, int(round(target / elapsed * sample, -3)))
+    return {"params": {"i": iterations}, "seconds": elapsed * iterations / sample, "memory": 0}
+
+
+def _calibrate_bcrypt(target: float, max_memory: int) -> Dict[str, Any]:
+    sample = 8
+    salt = bcrypt.gensalt(sample)
+    elapsed = _measure(lambda: bcrypt.hashpw(b"calibration", salt))
+    cost = min(MAX_BCRYPT_COST, max(MIN_BCRYPT_COST, sample + round(math.log2(target / elapsed))))
+    return {"params": {"cost": cost}, "seconds": elapsed * 2 ** (cost - sample), "memory": 4096}
+
+
+_CALIBRATORS = {
+    "argon2id": _calibrate_argon2id,
+    "scrypt": _calibrate_scrypt,
+    "bcrypt": _calibrate_bcrypt,
+    "pbkdf2_sha256": _calibrate_pbkdf2,
+}
+
+
+def calibrate(target_seconds: float = 0.25, max_memory_mb: int = 64) -> Dict[str, Dict[str, Any]]:
+    """Подбирает параметры каждого доступного алгоритма под target_seconds и max_memory_mb на хеш.
+
+    Возвращает {алгоритм: {"params": {...}, "seconds": оценка времени, "memory": байт}}.
+    Выполняется в процессе пула, чтобы замер отражал те же условия, что и работа.
+    """
+    return {name: _CALIBRATORS[name](target_seconds, max_memory_mb * 1024 * 1024) for name in available()}
+
+
+def describe(algorithm: str, params: Dict[str, int]) -> str:
+    """Параметры для пользователя: 'm=64 МиБ, t=3, p=1'."""
+    if algorithm == "argon2id":
+        return f"m={params['m'] // 1024} МиБ, t={params['t']}, p={params['p']}"
+    if algorithm == "scrypt":
+        return f"N=2^{params['ln']}, r={params['r']}, p={params['p']}"
+    if algorithm == "pbkdf2_sha256":
+        return f"{params['i']:,} итераций".replace(",", " ")
+    return f"cost={params['cost']}"
@@ -0,0 +1,150 @@
+"""Неблокирующее логирование: QueueHandler в цикле событий, запись на диск в отдельном потоке.
+
+Файлы ротируются по размеру и по времени с ограниченным числом архивов вместо
+удаления при каждом старте. Формат — текстовый или JSON; в JSON попадают
+chat_id, state и handler текущего апдейта и duration_ms, если он передан в extra.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
+
+from aiogram import BaseMiddleware
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+CONTEXT_FIELDS = ("chat_id", "state", "handler", "duration_ms")
+
+# Контекст апдейта, который сейчас обрабатывается в этой задаче asyncio
+log_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("log_context", default={})
+
+_listener: Optional[QueueListener] = None
+
+logger = logging.getLogger(__name__)
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """Ротация при превышении max_bytes или раз в interval секунд; хранит backup_count архивов."""
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int, interval: float, encoding: str = 'utf-8'):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=max(1, backup_count), encoding=encoding, delay=True)
+        self.interval = interval
+        # Лог прошлого запуска ротируется при первой записи, если его период уже закончился
+        started = os.path.getmtime(filename) if os.path.exists(filename) else time.time()
+        self.rollover_at = self._next_rollover(started)
+
+    def _next_rollover(self, now: float) -> float:
+        if self.interval <= 0:
+            return float("inf")
+        return (now // self.interval + 1) * self.interval
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self._next_rollover(time.time())
+
+
+class ContextFilter(logging.Filter):
+    """Добавляет в запись поля контекста апдейта (выполняется в потоке, который пишет лог)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in CONTEXT_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """Inner middleware: контекст апдейта для логов и запись о медленных хендлерах."""
+
+    def __init__(self, slow_handler_ms: float = 1000):
+        self.slow_handler_ms = slow_handler_ms
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        chat = data.get("event_chat")
+        token = log_context.set({
+            "chat_id": getattr(chat, "id", None),
+            "state": data.get("raw_state"),
+            "handler": name,
+        })
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if self.slow_handler_ms and duration_ms >= self.slow_handler_ms:
+                logger.info(f"🐌 Медленный хендлер {name}: {duration_ms:.0f} мс",
+                            extra={"duration_ms": round(duration_ms, 1)})
+            log_context.reset(token)
+
+
+def setup_logging(log_file: Optional[str], *, level: int = logging.INFO, json_format: bool = False,
+                  max_bytes: int = 10 * 1024 * 1024, backup_count: int = 7, interval: float = 86400) -> QueueListener:
+    """Настраивает корневой логгер: QueueHandler + QueueListener с консолью и (если задан) файлом."""
+    global _listener
+    stop_logging()
+
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        handlers.append(SizeAndTimeRotatingFileHandler(log_file, max_bytes, backup_count, interval))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Дописывает очередь логов на диск и останавливает поток записи."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,262 @@
+"""Метрики в текстовом формате Prometheus и HTTP-эндпоинт /metrics.
+
+Небольшая собственная реализация счётчиков, гистограмм и gauge без внешних
+зависимостей, плюс middleware aiogram для хендлеров и запросов к Bot API.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import CallbackQuery
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Iterator[Tuple[str, Sequence[str], Sequence[str], float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        for key, value in self._values.items():
+            yield "", self.labelnames, key, value
+
+
+class Gauge(_Metric):
+    """Gauge, значение которого читается функцией при каждом запросе /metrics.
+
+    callback возвращает число или {кортеж значений меток: число}.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Any], labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def _samples(self):
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.debug(f"Gauge {self.name} недоступен: {e}")
+            return
+        if isinstance(value, dict):
+            for key, item in value.items():
+                yield "", self.labelnames, key, item
+        else:
+            yield "", (), (), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[LabelValues, List[float]] = {}  # счётчики корзин + сумма в конце
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts = self._values.get(key)
+        if counts is None:
+            counts = self._values[key] = [0.0] * (len(self.buckets) + 1)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Замеряет длительность блока (в том числе с await внутри) в секундах."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        bucket_names = self.labelnames + ("le",)
+        for key, counts in self._values.items():
+            for bound, count in zip(self.buckets, counts):
+                yield "_bucket", bucket_names, key + (_format_value(bound),), count
+            yield "_sum", self.labelnames, key, counts[-1]
+            yield "_count", self.labelnames, key, counts[-2]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def gauge(name: str, documentation: str, callback: Callable[[], Any], labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, callback, labelnames))
+
+
+SIZE_BUCKETS = ((1024, "<1KiB"), (64 * 1024, "<64KiB"), (1024 * 1024, "<1MiB"), (16 * 1024 * 1024, "<16MiB"))
+
+
+def size_bucket(size: int) -> str:
+    """Метка размера данных с ограниченным числом значений."""
+    for limit, label in SIZE_BUCKETS:
+        if size < limit:
+            return label
+    return ">=16MiB"
+
+
+HANDLER_SECONDS = histogram(
+    "bot_handler_duration_seconds", "Длительность хендлеров",
+    ("handler", "state", "callback_data")
+)
+HANDLER_ERRORS = counter(
+    "bot_handler_errors_total", "Исключения в хендлерах",
+    ("handler", "error")
+)
+CRYPTO_SECONDS = histogram(
+    "crypto_operation_duration_seconds", "Длительность криптоопераций (генерация, подпись, хеширование)",
+    ("operation", "algorithm", "size")
+)
+HASHED_BYTES = counter("crypto_hashed_bytes_total", "Объём захешированных данных", ("algorithm",))
+FILE_DOWNLOAD_SECONDS = histogram("bot_file_download_duration_seconds", "Время скачивания файлов из Telegram")
+SSH_EXPORTS = counter("ssh_export_total", "Результаты экспорта ключей на серверы", ("outcome",))
+API_SECONDS = histogram("telegram_api_duration_seconds", "Задержка запросов к Bot API", ("method",))
+API_ERRORS = counter("telegram_api_errors_total", "Ошибки запросов к Bot API", ("method", "error"))
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware: длительность и ошибки хендлеров по FSM-состоянию и callback_data."""
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        callback_data = (event.data or "") if isinstance(event, CallbackQuery) else ""
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.inc(handler=name, error=type(e).__name__)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(
+                time.perf_counter() - started,
+                handler=name, state=data.get("raw_state") or "", callback_data=callback_data[:64]
+            )
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии: задержка и ошибки каждого метода Bot API."""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - started, method=name)
+
+
+class MetricsServer:
+    """Локальный aiohttp-сервер с эндпоинтом /metrics."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9100, registry: Optional[Registry] = None):
+        self.host = host
+        self.port = port
+        self.registry = registry or REGISTRY
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_get("/metrics", self._handle_metrics)
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"📊 Метрики: http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,145 @@
+"""Общий пул процессов для тяжёлых криптоопераций с контролем допуска."""
+import asyncio
+import functools
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+POOL_WORKERS = int(os.getenv("CRYPTO_POOL_WORKERS", str(os.cpu_count() or 2)))
+POOL_MAX_INFLIGHT = int(os.getenv("CRYPTO_POOL_MAX_INFLIGHT", str(POOL_WORKERS * 2)))
+POOL_MAX_QUEUED = int(os.getenv("CRYPTO_POOL_MAX_QUEUED", "64"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_inflight: Optional[asyncio.Semaphore] = None
+_queued = 0
+_running = 0
+
+
+class PoolBusyError(RuntimeError):
+    """Очередь пула переполнена — задание отклонено."""
+
+
+def ignore_interrupt():
+    # Ctrl+C приходит всей группе процессов: пул останавливает родитель, дав доделать задания
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Возвращает пул процессов, создавая его при первом обращении."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=POOL_WORKERS, initializer=ignore_interrupt)
+    return _executor
+
+
+def _get_inflight() -> asyncio.Semaphore:
+    global _inflight
+    if _inflight is None:
+        _inflight = asyncio.Semaphore(POOL_MAX_INFLIGHT)
+    return _inflight
+
+
+def pool_stats() -> dict:
+    """Текущая загрузка пула."""
+    return {
+        "workers": POOL_WORKERS,
+        "running": _running,
+        "queued": _queued,
+    }
+
+
+def free_slots() -> int:
+    """Сколько заданий пул примет сейчас: свободные места в работе и в очереди."""
+    return max(0, POOL_MAX_INFLIGHT + POOL_MAX_QUEUED - _running - _queued)
+
+
+async def run_in_pool(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Выполняет func в пуле процессов; при переполненной очереди бросает PoolBusyError."""
+    global _queued, _running
+    inflight = _get_inflight()
+
+    if inflight.locked() and _queued >= POOL_MAX_QUEUED:
+        raise PoolBusyError("Слишком много заданий в очереди, попробуйте позже")
+
+    _queued += 1
+    try:
+        await inflight.acquire()
+    finally:
+        _queued -= 1
+
+    _running += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+    finally:
+        _running -= 1
+        inflight.release()
+
+
+async def map_in_pool(func: Callable[[List[Any]], List[Any]], items: Sequence[Any],
+                      chunk_size: Optional[int] = None,
+                      on_progress: Optional[Callable[[int], None]] = None) -> List[Any]:
+    """Делит items на пачки, обрабатывает их параллельно и склеивает результаты по порядку.
+
+    func принимает список элементов и возвращает список результатов; каждая
+    пачка занимает одно место в пуле. on_progress получает размер каждой
+    готовой пачки. Если пул не вмещает все пачки сразу, PoolBusyError
+    бросается до отправки первой из них; если падает одна пачка, ещё не
+    начатые отменяются.
+    """
+    if not items:
+        return []
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(items) // POOL_WORKERS))
+
+    chunks = [list(items[i:i + chunk_size]) for i in range(0, len(items), chunk_size)]
+    if len(chunks) > free_slots():
+        raise PoolBusyError("Слишком много заданий в очереди, попробуйте позже")
+
+    async def run_chunk(chunk: List[Any]) -> List[Any]:
+        result = await run_in_pool(func, chunk)
+        if on_progress is not None:
+            on_progress(len(chunk))
+        return result
+
+    tasks = [asyncio.ensure_future(run_chunk(chunk)) for chunk in chunks]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        # Без отмены оставшиеся пачки досчитывались бы впустую и занимали очередь
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return [item for chunk in results for item in chunk]
+
+
+def shutdown_pool(wait: bool = True, cancel_futures: bool = False):
+    """Останавливает пул процессов."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+        _executor = None
+
+
+def _run_with_pid(func: Callable[[], Any]) -> Tuple[int, Any]:
+    return os.getpid(), func()
+
+
+async def warm_up_pool(func: Callable[[], Any], max_rounds: int = 3) -> List[Any]:
+    """Запускает процессы пула и выполняет func в каждом; возвращает результаты по процессам.
+
+    Задания идут через обычный контроль допуска. Одновременная отправка
+    POOL_WORKERS заданий поднимает все процессы, но быстрый процесс может
+    забрать два задания, поэтому недостающие процессы догоняются ещё
+    несколькими раундами — не больше max_rounds.
+    """
+    results: Dict[int, Any] = {}
+    for _ in range(max_rounds):
+        missing = POOL_WORKERS - len(results)
+        if missing <= 0:
+            break
+        for pid, result in await asyncio.gather(*(run_in_pool(_run_with_pid, func) for _ in range(missing))):
+            results.setdefault(pid, result)
+    return list(results.values())
@@ -0,0 +1,226 @@
+"""Профилирование работающего бота по запросу: cProfile хендлеров, сэмплы стеков и tracemalloc.
+
+HandlerProfiler профилирует следующие N апдейтов: каждый хендлер — под
+cProfile (статистика копится по имени хендлера). Профилировщик включается
+только на шагах корутины хендлера, поэтому чужие задачи, выполняющиеся, пока
+хендлер ждёт await, в его статистику не попадают. Фоновый поток всё это время
+снимает стек потока цикла событий целиком и копит его в формате collapsed
+stacks (вход для flamegraph.pl / speedscope). MemoryTracker сравнивает снимки
+tracemalloc и показывает места, где растут выделения памяти.
+"""
+import asyncio
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+
+
+class _ProfiledAwaitable:
+    """Выполняет корутину, включая profile только на время её собственных шагов."""
+
+    def __init__(self, coro, profile: cProfile.Profile):
+        self.coro = coro
+        self.profile = profile
+
+    def __await__(self):
+        steps = self.coro.__await__()
+        value, error = None, None
+        while True:
+            self.profile.enable()
+            try:
+                yielded = steps.throw(error) if error is not None else steps.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.profile.disable()
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                # Отмена и прочие исключения из await передаются внутрь корутины
+                value, error = None, e
+
+
+class HandlerProfiler:
+    """Профилирует N следующих апдейтов; у каждого хендлера — свой cProfile."""
+
+    def __init__(self, sample_interval: float = 0.005, stack_depth: int = 64):
+        self.sample_interval = sample_interval
+        self.stack_depth = stack_depth
+        self.remaining = 0
+        self.profiled = 0
+        self._stats: Dict[str, pstats.Stats] = {}
+        self._stacks: Counter = Counter()
+        self._done: Optional[asyncio.Future] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._sampling = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._started = 0.0
+        # Номер сессии: хендлеры, начатые в прошлой сессии, не пишут в статистику новой
+        self._session = 0
+
+    @property
+    def active(self) -> bool:
+        return self.remaining > 0
+
+    def start(self, updates: int) -> asyncio.Future:
+        """Включает профилирование; future завершится отчётом после N апдейтов."""
+        if self.active:
+            raise RuntimeError("Профилирование уже идёт")
+        self._session += 1
+        self.remaining = updates
+        self.profiled = 0
+        self._stats.clear()
+        self._stacks.clear()
+        self._started = time.perf_counter()
+        self._done = asyncio.get_running_loop().create_future()
+        self._loop_thread_id = threading.get_ident()
+        self._sampling.set()
+        self._sampler = threading.Thread(target=self._sample_stacks, name="stack-sampler", daemon=True)
+        self._sampler.start()
+        return self._done
+
+    def _sample_stacks(self):
+        while self._sampling.is_set():
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack: List[str] = []
+            while frame is not None and len(stack) < self.stack_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self._stacks[";".join(reversed(stack))] += 1
+            time.sleep(self.sample_interval)
+
+    async def profile(self, name: str, handler, event, data):
+        # Шаги разных задач в цикле не пересекаются, поэтому параллельные хендлеры профилируются каждый своим
+        profile = cProfile.Profile()
+        session = self._session
+        try:
+            return await _ProfiledAwaitable(handler(event, data), profile)
+        finally:
+            self._add(name, profile, session)
+
+    def _add(self, name: str, profile: cProfile.Profile, session: int):
+        if session != self._session or not self.active:
+            return
+        if name in self._stats:
+            self._stats[name].add(profile)
+        else:
+            self._stats[name] = pstats.Stats(profile, stream=io.StringIO())
+        self.profiled += 1
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self._finish()
+
+    def _finish(self):
+        self.remaining = 0
+        self._sampling.clear()
+        if self._done is not None and not self._done.done():
+            self._done.set_result(self.report())
+
+    def cancel(self):
+        if self.active:
+            self._finish()
+
+    def report(self, top: int = 30) -> Dict[str, bytes]:
+        """Файлы отчёта: текстовая сводка pstats, collapsed stacks и объединённый .pstats."""
+        elapsed = time.perf_counter() - self._started
+        text = io.StringIO()
+        text.write(f"Профилировано апдейтов: {self.profiled}, за {elapsed:.1f} с, "
+                   f"сэмплов стека: {sum(self._stacks.values())}\n"
+                   f"cProfile — только собственные шаги хендлеров; profile.collapsed — весь цикл событий\n")
+        merged = pstats.Stats(stream=io.StringIO())
+        for name, stats in sorted(self._stats.items()):
+            text.write(f"\n===== {name} =====\n")
+            stats.stream = text
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+            merged.add(stats)
+
+        files = {
+            "profile.txt": text.getvalue().encode("utf-8"),
+            "profile.collapsed": "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common()).encode("utf-8"),
+        }
+        if merged.stats:
+            # Тот же формат, что пишет Stats.dump_stats: открывается pstats.Stats / snakeviz
+            files["profile.pstats"] = marshal.dumps(merged.stats)
+        return files
+
+
+class ProfilerMiddleware(BaseMiddleware):
+    """Inner middleware: передаёт хендлер в HandlerProfiler, пока он активен."""
+
+    def __init__(self, profiler: HandlerProfiler):
+        self.profiler = profiler
+
+    async def __call__(self, handler, event, data):
+        if not self.profiler.active:
+            return await handler(event, data)
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        return await self.profiler.profile(name, handler, event, data)
+
+
+class MemoryTracker:
+    """Снимки tracemalloc: первый вызов включает трассировку, следующие показывают прирост."""
+
+    def __init__(self, frames: int = 10):
+        self.frames = frames
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ]
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def snapshot(self, top: int = 15) -> Tuple[bool, str]:
+        """Снимок и сравнение с предыдущим; возвращает (был ли это первый снимок, отчёт)."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._previous = None
+        current = tracemalloc.take_snapshot().filter_traces(self._filters)
+        traced, peak = tracemalloc.get_traced_memory()
+        header = f"Отслеживается: {traced / 1048576:.1f} МБ, пик {peak / 1048576:.1f} МБ, RSS {rss_mb():.1f} МБ\n"
+
+        previous, self._previous = self._previous, current
+        if previous is None:
+            return True, header + "Базовый снимок сохранён, повторите команду для сравнения.\n"
+
+        lines = [header, f"Наибольший прирост с прошлого снимка (топ {top}):\n"]
+        for stat in current.compare_to(previous, "lineno")[:top]:
+            lines.append(f"{stat.size_diff / 1024:+10.1f} КБ {stat.count_diff:+8d} блоков  {stat.traceback.format()[0].strip()}\n")
+
+        lines.append(f"\nКрупнейшие места по трассе ({min(top, 5)}):\n")
+        for stat in current.statistics("traceback")[:min(top, 5)]:
+            lines.append(f"\n{stat.size / 1024:.1f} КБ в {stat.count} блоках:\n")
+            lines.extend(f"  {line}\n" for line in stat.traceback.format())
+        return False, "".join(lines)
+
+    def stop(self):
+        self._previous = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def rss_mb() -> float:
+    """Текущий RSS процесса в МБ (Linux /proc, иначе пиковый через resource)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1048576 if sys.platform == "darwin" else 1024)
@@ -0,0 +1,111 @@
+"""Живой прогресс долгих операций в одном сообщении Telegram.
+
+Горячий цикл только увеличивает счётчик через advance(). Сообщение правит
+отдельная задача, не чаще раза в interval секунд. Если с прошлой правки
+ничего не сдвинулось или текст совпал, правка пропускается. Так прогресс не
+упирается в лимиты Bot API и не замедляет саму работу. Короткие операции,
+завершившиеся быстрее interval, не делают ни одной правки.
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import Message
+
+logger = logging.getLogger(__name__)
+
+BAR_WIDTH = 10
+
+
+def format_bytes(size: float) -> str:
+    for unit, scale in (("ГБ", 1 << 30), ("МБ", 1 << 20), ("КБ", 1 << 10)):
+        if size >= scale:
+            return f"{size / scale:.1f} {unit}"
+    return f"{size:.0f} байт"
+
+
+def format_eta(seconds: float) -> str:
+    if seconds >= 3600:
+        return f"{seconds // 3600:.0f} ч {seconds % 3600 // 60:.0f} мин"
+    if seconds >= 60:
+        return f"{seconds // 60:.0f} мин {seconds % 60:.0f} с"
+    return f"{seconds:.0f} с"
+
+
+class ProgressReporter:
+    """Контекстный менеджер: пока он открыт, message показывает прогресс title.
+
+        async with ProgressReporter(msg, "🔄 Хеширую файл", total=size, byte_units=True) as progress:
+            for chunk in ...:
+                progress.advance(len(chunk))
+    """
+
+    def __init__(self, message: Message, title: str, total: float, *, byte_units: bool = False,
+                 interval: float = 3.0):
+        self.message = message
+        self.title = title
+        self.total = total
+        self.byte_units = byte_units
+        self.interval = interval
+        self.done = 0.0
+        self.edits = 0
+        self.started = time.monotonic()
+        self._shown_done = 0.0
+        self._shown_text: Optional[str] = None
+        self._stopped = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def advance(self, amount: float = 1):
+        self.done += amount
+
+    def render(self) -> str:
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        fmt = format_bytes if self.byte_units else (lambda value: f"{value:.0f}")
+        lines = [self.title]
+        if self.total:
+            fraction = min(1.0, self.done / self.total)
+            filled = round(fraction * BAR_WIDTH)
+            lines.append(f"{'▓' * filled}{'░' * (BAR_WIDTH - filled)} {fraction * 100:.0f}%")
+            status = f"{fmt(self.done)} из {fmt(self.total)}"
+        else:
+            status = fmt(self.done)
+        status += f" · {fmt(rate)}/с" if self.byte_units else f" · {rate:.1f}/с"
+        if self.total and rate > 0 and self.done < self.total:
+            status += f" · осталось ~{format_eta((self.total - self.done) / rate)}"
+        lines.append(status)
+        return "\n".join(lines)
+
+    async def _flush(self):
+        if self.done == self._shown_done:
+            return
+        text = self.render()
+        self._shown_done = self.done
+        if text == self._shown_text:
+            return
+        try:
+            await self.message.edit_text(text)
+            self._shown_text = text
+            self.edits += 1
+        except TelegramAPIError as e:
+            # Пропущенная правка не критична: следующая покажет актуальное состояние
+            logger.debug(f"Прогресс в сообщении {self.message.message_id} не обновлён: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self.interval)
+                return
+            except asyncio.TimeoutError:
+                await self._flush()
+
+    async def __aenter__(self) -> "ProgressReporter":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # Начатая правка доводится до конца, чтобы не обогнать итоговое сообщение вызывающего кода
+        self._stopped.set()
+        await self._task
@@ -0,0 +1,154 @@
+"""Планировщик исходящих запросов к Bot API: token bucket'ы, очередь по чату и обработка 429.
+
+Подключается как middleware сессии бота, поэтому все вызовы (message.answer,
+bot.send_document, edit_text …) проходят через него без изменений в хендлерах.
+Запросы одного чата отправляются строго по очереди (FIFO), а TelegramRetryAfter
+не обрывает сценарий: запрос повторяется после указанной паузы.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetUpdates
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket с резервированием: reserve() сразу возвращает, сколько ждать слот."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def is_full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class _ChatQueue:
+    __slots__ = ("lock", "bucket", "waiters", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.lock = asyncio.Lock()  # asyncio.Lock будит ожидающих в порядке FIFO
+        self.bucket = TokenBucket(rate, capacity)
+        self.waiters = 0
+        self.blocked_until = 0.0
+
+
+class OutboundRateLimiter(BaseRequestMiddleware):
+    """Middleware сессии: глобальный лимит, лимит на чат и автоматический повтор после 429."""
+
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 5.0,
+                 max_retries: int = 3, max_chats: int = 10000):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._global = TokenBucket(global_rate, global_rate)
+        self._global_blocked_until = 0.0
+        self._chats: Dict[Any, _ChatQueue] = {}
+        self.queued = 0
+        self.sent = 0
+        self.retries = 0
+        self.throttled_seconds = 0.0
+
+    async def _sleep(self, delay: float):
+        if delay > 0:
+            self.throttled_seconds += delay
+            await asyncio.sleep(delay)
+
+    def _chat_queue(self, chat_id) -> _ChatQueue:
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            if len(self._chats) >= self.max_chats:
+                self._prune()
+            queue = self._chats[chat_id] = _ChatQueue(self.chat_rate, self.chat_burst)
+        return queue
+
+    def _prune(self):
+        """Удаляет очереди простаивающих чатов, у которых ведро уже полностью восполнилось."""
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, queue in self._chats.items()
+                        if not queue.waiters and not queue.lock.locked()
+                        and queue.blocked_until <= now and queue.bucket.is_full()]:
+            del self._chats[chat_id]
+
+    async def _global_slot(self):
+        await self._sleep(self._global_blocked_until - time.monotonic())
+        await self._sleep(self._global.reserve())
+
+    async def __call__(self, make_request, bot, method):
+        if isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            # answerCallbackQuery, getFile и т.п. не привязаны к чату, но в глобальный лимит входят
+            await self._global_slot()
+            return await self._send(make_request, bot, method, None)
+
+        queue = self._chat_queue(chat_id)
+        # waiters держит очередь от _prune, пока запрос не отправлен; queued — только ожидание
+        queue.waiters += 1
+        self.queued += 1
+        waiting = True
+        try:
+            async with queue.lock:
+                await self._sleep(queue.blocked_until - time.monotonic())
+                await self._sleep(queue.bucket.reserve())
+                await self._global_slot()
+                waiting = False
+                self.queued -= 1
+                return await self._send(make_request, bot, method, queue)
+        finally:
+            queue.waiters -= 1
+            if waiting:
+                self.queued -= 1
+
+    async def _send(self, make_request, bot, method, queue: Optional[_ChatQueue]):
+        attempt = 0
+        while True:
+            try:
+                response = await make_request(bot, method)
+                self.sent += 1
+                return response
+            except TelegramRetryAfter as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                self.retries += 1
+                blocked_until = time.monotonic() + e.retry_after
+                if queue is not None:
+                    queue.blocked_until = blocked_until
+                else:
+                    self._global_blocked_until = blocked_until
+                logger.warning(f"⏳ Telegram 429 для {type(method).__name__}: повтор через {e.retry_after} с "
+                               f"(попытка {attempt}/{self.max_retries})")
+                await self._sleep(e.retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики: глубина очереди, время ожидания из-за лимитов и число повторов после 429."""
+        return {
+            "queued": self.queued,
+            "queued_chats": sum(1 for queue in self._chats.values() if queue.waiters),
+            "tracked_chats": len(self._chats),
+            "sent": self.sent,
+            "retries": self.retries,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+        }
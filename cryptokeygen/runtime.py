@@ -0,0 +1,62 @@
+"""Производительный режим выполнения: uvloop, настроенная HTTP-сессия Bot API и быстрый JSON.
+
+Все части необязательны: без uvloop остаётся стандартный цикл asyncio, без
+orjson — модуль json. Сессия держит простаивающие соединения с Bot API
+открытыми 75 секунд вместо 15 по умолчанию в aiohttp, так что редкие запросы
+идут по уже открытым TLS-соединениям. Размер пула и кэш DNS на час у сессии
+aiogram такие же и по умолчанию.
+"""
+import asyncio
+import json
+import logging
+from typing import Any
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+
+try:
+    import orjson
+except ImportError:  # без orjson используется стандартный json
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def json_loads(data: Any) -> Any:
+    """Разбор JSON из str или bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(value: Any) -> str:
+    """Компактная сериализация в JSON-строку (UTF-8 без экранирования)."""
+    if orjson is not None:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def install_uvloop() -> bool:
+    """Делает uvloop политикой цикла событий; вызывать до asyncio.run()."""
+    try:
+        import uvloop
+    except ImportError:
+        logger.warning("⚠️ uvloop не установлен (pip install uvloop), используется стандартный цикл asyncio")
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
+class TunedAiohttpSession(AiohttpSession):
+    """AiohttpSession с длинным keep-alive и быстрым JSON для запросов и ответов."""
+
+    def __init__(self, api: TelegramAPIServer = PRODUCTION, *, limit: int = 100,
+                 keepalive_timeout: float = 75.0, timeout: float = 60.0):
+        super().__init__(api=api, limit=limit, json_loads=json_loads, json_dumps=json_dumps, timeout=timeout)
+        self._connector_init["keepalive_timeout"] = keepalive_timeout
+
+
+def describe() -> str:
+    """Строка для лога: какие ускорения реально активны."""
+    loop = type(asyncio.get_event_loop_policy()).__module__.split(".")[0]
+    return f"цикл {'uvloop' if loop == 'uvloop' else 'asyncio'}, JSON {'orjson' if orjson is not None else 'json'}"
@@ -0,0 +1,200 @@
+"""Многопроцессный режим: фронт-процесс раздаёт обновления воркерам по chat_id.
+
+Фронт получает обновления (polling или webhook) и пишет их построчно в JSON
+в stdin воркера с номером chat_id % N. Все обновления одного чата попадают в
+один и тот же воркер, поэтому его FSM-состояние и кэши остаются локальными.
+Воркер — это тот же bot.py, запущенный с переменной BOT_WORKER_INDEX.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+WORKER_INDEX_ENV = "BOT_WORKER_INDEX"
+RESTART_BACKOFF_MAX = 30.0
+WORKER_QUEUE_SIZE = 10_000
+
+
+def extract_chat_id(update: Dict[str, Any]) -> Optional[int]:
+    """Находит chat_id (или id пользователя) в сыром обновлении Telegram."""
+    for key, value in update.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return chat["id"]
+        user = value.get("from") or value.get("user")
+        if user and "id" in user:
+            return user["id"]
+    return None
+
+
+class WorkerShard:
+    """Один воркер-процесс с очередью обновлений и автоматическим перезапуском."""
+
+    def __init__(self, index: int, command: Sequence[str], env: Dict[str, str]):
+        self.index = index
+        self.command = list(command)
+        self.env = {**env, WORKER_INDEX_ENV: str(index)}
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WORKER_QUEUE_SIZE)
+        self.restarts = 0
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._stopping = False
+        self._ready = asyncio.Event()
+
+    async def _spawn(self):
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command, stdin=asyncio.subprocess.PIPE, env=self.env
+        )
+        self._ready.set()
+        logger.info(f"👷 Воркер {self.index} запущен (pid {self.process.pid})")
+
+    async def supervise(self):
+        """Держит воркер запущенным: при падении перезапускает с экспоненциальной задержкой."""
+        backoff = 1.0
+        while not self._stopping:
+            await self._spawn()
+            started = asyncio.get_running_loop().time()
+            returncode = await self.process.wait()
+            self._ready.clear()
+            if self._stopping:
+                break
+
+            self.restarts += 1
+            if asyncio.get_running_loop().time() - started > RESTART_BACKOFF_MAX:
+                backoff = 1.0
+            logger.error(f"💥 Воркер {self.index} завершился с кодом {returncode}, перезапуск через {backoff:.0f} с")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+
+    async def pump(self):
+        """Передаёт обновления из очереди в stdin воркера; ждёт перезапуска, если воркер упал."""
+        while True:
+            line = await self.queue.get()
+            while True:
+                await self._ready.wait()
+                try:
+                    self.process.stdin.write(line)
+                    await self.process.stdin.drain()
+                    break
+                except (BrokenPipeError, ConnectionResetError):
+                    self._ready.clear()
+                    await asyncio.sleep(0.1)
+
+    async def stop(self, timeout: float):
+        """Закрывает stdin (сигнал воркеру завершиться) и ждёт выхода процесса."""
+        self._stopping = True
+        if self.process is None or self.process.returncode is not None:
+            return
+        try:
+            self.process.stdin.close()
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Воркер {self.index} не завершился за {timeout:.0f} с, останавливаю принудительно")
+            self.process.kill()
+            await self.process.wait()
+
+
+class ShardRouter:
+    """Распределяет сырые обновления между воркерами по chat_id."""
+
+    def __init__(self, workers: int, command: Sequence[str], env: Optional[Dict[str, str]] = None,
+                 dumps: Callable[[Any], str] = json.dumps):
+        env = dict(os.environ if env is None else env)
+        self.shards: List[WorkerShard] = [WorkerShard(i, command, env) for i in range(workers)]
+        self.dumps = dumps
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        for shard in self.shards:
+            self._tasks.append(asyncio.create_task(shard.supervise()))
+            self._tasks.append(asyncio.create_task(shard.pump()))
+
+    def shard_for(self, update: Dict[str, Any]) -> WorkerShard:
+        chat_id = extract_chat_id(update)
+        key = chat_id if chat_id is not None else update.get("update_id", 0)
+        return self.shards[key % len(self.shards)]
+
+    async def dispatch(self, update: Dict[str, Any]):
+        line = (self.dumps(update) + "\n").encode('utf-8')
+        await self.shard_for(update).queue.put(line)
+
+    def stats(self) -> List[Dict[str, int]]:
+        return [{"worker": shard.index, "queued": shard.queue.qsize(), "restarts": shard.restarts}
+                for shard in self.shards]
+
+    async def stop(self, timeout: float = 30.0):
+        """Дожидается отправки очередей и останавливает воркеры."""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while any(not shard.queue.empty() for shard in self.shards):
+            if asyncio.get_running_loop().time() > deadline:
+                break
+            await asyncio.sleep(0.05)
+        await asyncio.gather(*(shard.stop(max(1.0, deadline - asyncio.get_running_loop().time()))
+                               for shard in self.shards))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def poll_raw_updates(bot, dispatch: Callable[[Dict[str, Any]], Awaitable[Any]],
+                           allowed_updates: Optional[List[str]] = None, timeout: int = 30):
+    """Цикл getUpdates для фронт-процесса: обновления не обрабатываются, а передаются в dispatch."""
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=timeout, allowed_updates=allowed_updates)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка getUpdates: {e}")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            offset = update.update_id + 1
+            await dispatch(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+
+
+async def run_worker(feed_update: Callable[[Dict[str, Any]], Awaitable[Any]],
+                     loads: Callable[[bytes], Any] = json.loads, stop: Optional[asyncio.Event] = None):
+    """Цикл воркера: читает обновления из stdin до EOF и обрабатывает их в фоне.
+
+    Без stop дожидается всех начатых обновлений. Со stop цикл завершается и по
+    этому событию, а начатые обновления дожидается вызывающий код.
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=64 * 1024 * 1024)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    async def process(update: Dict[str, Any]):
+        try:
+            await feed_update(update)
+        except Exception as e:
+            logger.exception(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+
+    stopped = asyncio.ensure_future(stop.wait()) if stop is not None else None
+    tasks = set()
+    try:
+        while True:
+            read = asyncio.ensure_future(reader.readline())
+            if stopped is not None:
+                await asyncio.wait({read, stopped}, return_when=asyncio.FIRST_COMPLETED)
+                if not read.done():
+                    read.cancel()
+                    break
+            line = await read
+            if not line:
+                break
+            task = asyncio.create_task(process(loads(line)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        if stopped is not None:
+            stopped.cancel()
+
+    if tasks and stop is None:
+        await asyncio.wait(tasks)
@@ -0,0 +1,126 @@
+"""Корректная остановка по SIGTERM/SIGINT: приём обновлений прекращается, начатое доделывается.
+
+GracefulShutdown отслеживает задачи обновлений, которые сейчас обрабатываются
+(через outer middleware на dp.update), и ожидания ввода пользователя вроде
+кода 2FA. При остановке ожидания ввода прерываются сразу, а остальным задачам
+даётся время до общего дедлайна; незавершённые к дедлайну отменяются, и
+пользователь получает уведомление вместо тишины.
+"""
+import asyncio
+import logging
+import signal
+from typing import Any, Awaitable, Callable, Optional, Set
+
+from aiogram import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Уведомление пользователю, чья операция прервана остановкой бота
+INTERRUPTED_TEXT = "🛑 Бот перезапускается, операция прервана. Повторите её через минуту."
+
+
+class ShutdownInProgress(Exception):
+    """Бот останавливается: ожидание ввода пользователя прервано."""
+
+
+class GracefulShutdown:
+    """Координатор остановки: сигналы, учёт задач обновлений и ожиданий ввода, дедлайн."""
+
+    def __init__(self, timeout: float = 25.0):
+        self.timeout = timeout
+        self.event = asyncio.Event()
+        self.reason: Optional[str] = None
+        self._deadline: Optional[float] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._prompts: Set[asyncio.Future] = set()
+
+    @property
+    def requested(self) -> bool:
+        return self.event.is_set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def install_signal_handlers(self, signals=(signal.SIGTERM, signal.SIGINT)):
+        loop = asyncio.get_running_loop()
+        for sig in signals:
+            try:
+                loop.add_signal_handler(sig, self.request, sig.name)
+            except (NotImplementedError, RuntimeError):
+                # Windows и не главный поток: остаётся KeyboardInterrupt
+                pass
+
+    def request(self, reason: str = "запрос"):
+        """Начинает остановку; отсчёт дедлайна идёт с первого вызова."""
+        if self.requested:
+            return
+        self.reason = reason
+        self._deadline = asyncio.get_running_loop().time() + self.timeout
+        self.event.set()
+        logger.info(f"🛑 Остановка ({reason}): новые обновления не принимаются, "
+                    f"в работе {self.in_flight}, дедлайн {self.timeout:g} с")
+        self.cancel_prompts()
+
+    async def wait(self):
+        await self.event.wait()
+
+    def track(self, task: asyncio.Task):
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def wait_for_input(self, future: asyncio.Future, timeout: float) -> Any:
+        """Ждёт ввод пользователя (future) с таймаутом; при остановке бросает ShutdownInProgress."""
+        if self.requested:
+            raise ShutdownInProgress()
+        self._prompts.add(future)
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            self._prompts.discard(future)
+
+    def cancel_prompts(self):
+        for future in list(self._prompts):
+            if not future.done():
+                future.set_exception(ShutdownInProgress())
+
+    async def drain(self):
+        """Ждёт задачи обновлений до дедлайна, оставшиеся отменяет."""
+        self.request("завершение приёма обновлений")
+        current = asyncio.current_task()
+        pending = {task for task in self._tasks if task is not current}
+        if pending:
+            timeout = max(0.0, self._deadline - asyncio.get_running_loop().time())
+            logger.info(f"⏳ Жду завершения {len(pending)} обновлений (до {timeout:.0f} с)")
+            _, pending = await asyncio.wait(pending, timeout=timeout)
+        if pending:
+            logger.warning(f"⚠️ Не завершились к дедлайну, отменяю: {len(pending)}")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        logger.info("✅ Обработка обновлений завершена")
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """Outer middleware на dp.update: регистрирует задачу обновления и уведомляет при её отмене."""
+
+    def __init__(self, shutdown: GracefulShutdown,
+                 notify: Optional[Callable[[Any, int], Awaitable[Any]]] = None, notify_timeout: float = 5.0):
+        self.shutdown = shutdown
+        self.notify = notify
+        self.notify_timeout = notify_timeout
+
+    async def __call__(self, handler, event, data):
+        task = asyncio.current_task()
+        if task is not None:
+            self.shutdown.track(task)
+        try:
+            return await handler(event, data)
+        except asyncio.CancelledError:
+            chat = data.get("event_chat")
+            if self.shutdown.requested and self.notify is not None and chat is not None:
+                try:
+                    await asyncio.wait_for(self.notify(data["bot"], chat.id), self.notify_timeout)
+                except Exception as e:
+                    logger.debug(f"Не удалось уведомить чат {chat.id} об остановке: {e}")
+            raise
@@ -0,0 +1,63 @@
+"""Экспорт публичного SSH-ключа на сервер через asyncssh (пароль и keyboard-interactive 2FA).
+
+Модуль импортирует asyncssh на верхнем уровне, поэтому bot.py подключает его
+лениво — библиотека загружается только при первом экспорте.
+"""
+import shlex
+from typing import Awaitable, Callable, List, Optional
+
+import asyncssh
+from asyncssh import HostKeyNotVerifiable, PermissionDenied
+
+__all__ = ["TwoFactorSSHClient", "export_public_key", "HostKeyNotVerifiable", "PermissionDenied"]
+
+# Запрос кода 2FA у пользователя: получает текст подсказки, возвращает ответ или None при отмене
+AskCode = Callable[[str], Awaitable[Optional[str]]]
+
+
+class TwoFactorSSHClient(asyncssh.SSHClient):
+    """SSH-клиент с паролем и поддержкой 2FA через keyboard-interactive."""
+
+    def __init__(self, password: str, ask_code: AskCode):
+        self._password = password
+        self._ask_code = ask_code
+        super().__init__()
+
+    def password_auth_requested(self):
+        return self._password
+
+    def kbdint_auth_requested(self):
+        return ''
+
+    async def kbdint_challenge_received(self, name, instructions, lang, prompts):
+        if not prompts:
+            return []
+
+        responses: List[str] = []
+        for prompt_text, _ in prompts:
+            response = await self._ask_code(prompt_text)
+            if response is None:
+                raise asyncssh.DisconnectError("2FA timeout", asyncssh.DISCONNECT_AUTH_CANCELLED)
+            responses.append(response)
+        return responses
+
+
+async def export_public_key(host: str, username: str, password: str, public_key: str,
+                            ask_code: AskCode, on_connected: Optional[Callable[[], Awaitable]] = None,
+                            connect_timeout: float = 15) -> asyncssh.SSHCompletedProcess:
+    """Подключается к серверу и добавляет public_key в ~/.ssh/authorized_keys, если его там нет."""
+    client_factory = lambda: TwoFactorSSHClient(password, ask_code)
+
+    async with asyncssh.connect(host=host, username=username, client_factory=client_factory,
+                                connect_timeout=connect_timeout) as conn:
+        if on_connected is not None:
+            await on_connected()
+
+        safe_public_key = shlex.quote(public_key.strip())
+        command = (
+            f'mkdir -p ~/.ssh && chmod 700 ~/.ssh && '
+            f'if ! grep -qF "{safe_public_key}" ~/.ssh/authorized_keys 2>/dev/null; then '
+            f'echo "{safe_public_key}" >> ~/.ssh/authorized_keys && chmod 600 ~/.ssh/authorized_keys && '
+            f'echo "Key added"; else echo "Key exists"; fi'
+        )
+        return await conn.run(command, check=False, encoding=None)
@@ -0,0 +1,131 @@
+"""Генерация SSH-ключей и fingerprint'ы OpenSSH (без привязки к Telegram).
+
+Функции генерации выполняются в процессах пула: аргументы и результат —
+простые значения, которые передаются между процессами. Разбор публичных ключей
+работает в процессе бота и кэширует результат в LRU по SHA256 blob.
+"""
+import base64
+import binascii
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from cryptography.exceptions import UnsupportedAlgorithm
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+RSA_KEY_SIZE = 4096
+SSH_KEY_CACHE_SIZE = int(os.getenv("SSH_KEY_CACHE_SIZE", "1024"))
+KEY_TYPES = {"rsa": "RSA", "ed25519": "Ed25519"}
+
+
+class SSHKeyPair(NamedTuple):
+    key_type: str             # "RSA" или "Ed25519"
+    key_info: str             # описание для пользователя: "RSA (4096 бит)"
+    openssh_private: bytes    # приватный ключ в формате OpenSSH
+    pkcs8_private: bytes      # тот же ключ в PKCS#8 PEM
+    public: bytes             # строка authorized_keys
+    encrypted: bool           # OpenSSH-ключ зашифрован (без bcrypt passphrase к нему не применяется)
+    pkcs8_encrypted: bool     # PKCS#8-ключ зашифрован: с passphrase — всегда, bcrypt ему не нужен
+
+
+def normalize_key_type(key_type: str) -> str:
+    """'rsa' / 'RSA' / 'ed25519' → 'RSA' / 'Ed25519'; иначе ValueError."""
+    try:
+        return KEY_TYPES[key_type.lower()]
+    except KeyError:
+        raise ValueError(f"Неизвестный тип ключа: {key_type!r}, допустимы: {', '.join(KEY_TYPES.values())}")
+
+
+def _private_bytes(private_key, key_format, passphrase: Optional[bytes]) -> Tuple[bytes, bool]:
+    if passphrase:
+        try:
+            return private_key.private_bytes(serialization.Encoding.PEM, key_format,
+                                             serialization.BestAvailableEncryption(passphrase)), True
+        except UnsupportedAlgorithm:
+            pass
+    return private_key.private_bytes(serialization.Encoding.PEM, key_format, serialization.NoEncryption()), False
+
+
+def generate_ssh_keypair(key_type: str, passphrase: Optional[bytes] = None) -> SSHKeyPair:
+    """Генерирует пару ключей RSA-4096 или Ed25519; с passphrase приватные ключи шифруются."""
+    key_type = normalize_key_type(key_type)
+    if key_type == "RSA":
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=RSA_KEY_SIZE)
+        key_info = f"RSA ({RSA_KEY_SIZE} бит)"
+    else:
+        private_key = ed25519.Ed25519PrivateKey.generate()
+        key_info = "Ed25519"
+
+    openssh_private, encrypted = _private_bytes(private_key, serialization.PrivateFormat.OpenSSH, passphrase)
+    pkcs8_private, pkcs8_encrypted = _private_bytes(private_key, serialization.PrivateFormat.PKCS8, passphrase)
+    public = private_key.public_key().public_bytes(serialization.Encoding.OpenSSH, serialization.PublicFormat.OpenSSH)
+    return SSHKeyPair(key_type, key_info, openssh_private, pkcs8_private, public, encrypted, pkcs8_encrypted)
+
+
+def generate_ssh_keypairs(requests: List[Tuple[str, Optional[bytes]]]) -> List[SSHKeyPair]:
+    """Пачка генераций для map_in_pool: [(тип, passphrase), ...]."""
+    return [generate_ssh_keypair(key_type, passphrase) for key_type, passphrase in requests]
+
+
+def decode_ssh_public_key_blob(public_key_input: str) -> Tuple[str, bytes]:
+    """Извлекает тип и бинарный blob из строки публичного ключа OpenSSH."""
+    parts = public_key_input.split()
+    if len(parts) < 2:
+        raise ValueError("Ожидается формат: <тип> <base64> [комментарий]")
+
+    try:
+        blob = base64.b64decode(parts[1], validate=True)
+    except binascii.Error as e:
+        raise ValueError(f"Некорректный base64 в теле ключа: {e}")
+
+    type_len = int.from_bytes(blob[:4], 'big')
+    if blob[4:4 + type_len] != parts[0].encode('utf-8'):
+        raise ValueError("Тип ключа не совпадает с содержимым blob")
+
+    return parts[0], blob
+
+
+def calculate_ssh_fingerprints(blob: bytes, sha256_digest: Optional[bytes] = None) -> Dict[str, str]:
+    """Вычисляет SHA256 и MD5 fingerprint в формате OpenSSH (ssh-keygen -l)."""
+    if sha256_digest is None:
+        sha256_digest = hashlib.sha256(blob).digest()
+
+    md5_hash = hashlib.md5(blob).hexdigest()
+
+    return {
+        "SHA256": "SHA256:" + base64.b64encode(sha256_digest).decode('ascii').rstrip('='),
+        "MD5": "MD5:" + ":".join(md5_hash[i:i+2] for i in range(0, len(md5_hash), 2)),
+    }
+
+
+_ssh_key_cache: "OrderedDict[bytes, Tuple[Any, Dict[str, str], bytes]]" = OrderedDict()
+
+
+def parse_ssh_public_key(public_key_input: str) -> Tuple[Any, Dict[str, str], bytes]:
+    """Разбирает публичный SSH-ключ и считает fingerprint с LRU-кэшем по SHA256 blob.
+
+    Возвращает (объект ключа, fingerprints, SHA256-дайджест blob).
+    """
+    _, blob = decode_ssh_public_key_blob(public_key_input)
+    blob_digest = hashlib.sha256(blob).digest()
+
+    cached = _ssh_key_cache.get(blob_digest)
+    if cached is not None:
+        _ssh_key_cache.move_to_end(blob_digest)
+        return cached
+
+    public_key_obj = serialization.load_ssh_public_key(public_key_input.encode('utf-8'))
+    entry = (public_key_obj, calculate_ssh_fingerprints(blob, blob_digest), blob_digest)
+
+    _ssh_key_cache[blob_digest] = entry
+    if len(_ssh_key_cache) > SSH_KEY_CACHE_SIZE:
+        _ssh_key_cache.popitem(last=False)
+
+    return entry
+
+
+def cached_ssh_public_keys() -> List[Tuple[Any, Dict[str, str], bytes]]:
+    """Снимок кэша разобранных ключей (для аудита общих множителей RSA)."""
+    return list(_ssh_key_cache.values())
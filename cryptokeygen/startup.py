@@ -0,0 +1,67 @@
+"""Быстрый старт: ленивый импорт тяжёлых подсистем и фоновый прогрев криптографии.
+
+Модули SSH-экспорта (asyncssh) и X.509 (cryptography.x509) загружаются при
+первом обращении к их атрибутам, а не при импорте bot.py. Прогрев после старта
+подгружает их заранее и однократно инициализирует примитивы OpenSSL в пуле.
+"""
+import importlib
+import importlib.util
+import sys
+import time
+from types import ModuleType
+from typing import Dict, Iterable
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Возвращает модуль, который реально загрузится при первом обращении к атрибуту."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def load_modules(names: Iterable[str]) -> Dict[str, float]:
+    """Принудительно загружает ленивые модули; возвращает время загрузки каждого, мс.
+
+    Вызывать только из потока event loop: LazyLoader не потокобезопасен, и
+    загрузка в другом потоке гонится с первым обращением хендлера к модулю.
+    """
+    timings = {}
+    for name in names:
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        # Любое обращение к атрибуту запускает исполнение отложенного модуля
+        getattr(module, "__doc__")
+        timings[name] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def warm_up_crypto() -> float:
+    """Однократная инициализация примитивов OpenSSL в текущем процессе; возвращает время, мс."""
+    started = time.perf_counter()
+    # Импорты внутри функции: модуль startup не должен тянуть cryptography при старте
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519, padding, rsa
+    from cryptography.x509.oid import NameOID
+
+    rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=1024)
+    rsa_key.sign(b"warm-up", padding.PKCS1v15(), algorithm=hashes.SHA256())
+    ed25519.Ed25519PrivateKey.generate().public_key().public_bytes(
+        serialization.Encoding.OpenSSH, serialization.PublicFormat.OpenSSH
+    )
+
+    ec_key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "warm-up")])
+    x509.CertificateSigningRequestBuilder().subject_name(name).sign(ec_key, hashes.SHA256()).public_bytes(
+        serialization.Encoding.PEM
+    )
+    return (time.perf_counter() - started) * 1000
+
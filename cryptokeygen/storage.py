@@ -0,0 +1,471 @@
+"""FSM-хранилища: ограниченное in-memory и постоянное с пакетной записью (Redis/SQLite).
+
+Состояние и данные одного контекста хранятся одной записью. Чтения
+обслуживаются из локального кэша, а записи помечают запись «грязной» —
+фоновая задача раз в flush_interval отправляет все изменения одной пачкой
+(pipeline в Redis, одна транзакция в SQLite). Так несколько вызовов
+update_data/set_state внутри хендлера превращаются в одну запись, а
+обработка обновления не ждёт сети или диска.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+logger = logging.getLogger(__name__)
+
+# Значения, которые не должны попадать на диск/в Redis (живые объекты и секреты)
+TRANSIENT_KEYS = frozenset({'private_key', 'two_fa_future'})
+
+
+# ---- бэкенды ----
+
+class RespError(Exception):
+    """Ошибка, которую вернул Redis-совместимый сервер."""
+
+
+class RespClient:
+    """Минимальный асинхронный клиент протокола Redis (RESP2) с конвейерной отправкой."""
+
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Соединение с Redis закрыто")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b'+':
+            return payload.decode('utf-8')
+        if prefix == b'-':
+            return RespError(payload.decode('utf-8'))
+        if prefix == b':':
+            return int(payload)
+        if prefix == b'$':
+            length = int(payload)
+            if length == -1:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2]
+        if prefix == b'*':
+            length = int(payload)
+            if length == -1:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise RespError(f"Неизвестный ответ сервера: {line!r}")
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        handshake = []
+        if self.password:
+            handshake.append(('AUTH', self.password))
+        if self.db:
+            handshake.append(('SELECT', self.db))
+        if handshake:
+            await self._send(handshake)
+
+    async def _send(self, commands: List[Tuple]) -> List[Any]:
+        self._writer.write(b''.join(self._encode(command) for command in commands))
+        await self._writer.drain()
+        replies = [await self._read_reply() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    async def pipeline(self, commands: List[Tuple]) -> List[Any]:
+        """Отправляет команды одним пакетом и возвращает ответы; переподключается один раз."""
+        if not commands:
+            return []
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._writer is None:
+                        await self._connect()
+                    return await self._send(commands)
+                except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                    self._writer = None
+                    if attempt:
+                        raise
+
+    async def execute(self, *args) -> Any:
+        return (await self.pipeline([args]))[0]
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class RedisBackend:
+    """Записи FSM в Redis-совместимом сервере; TTL на каждый ключ через SET EX."""
+
+    def __init__(self, url: str, prefix: str = 'fsm'):
+        self.client = RespClient(url)
+        self.prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Optional[str]]:
+        values = await self.client.execute('MGET', *(self._key(key) for key in keys))
+        return {key: value.decode('utf-8') if value is not None else None for key, value in zip(keys, values)}
+
+    async def write_batch(self, sets: Dict[str, str], deletes: List[str], ttl: Optional[int]):
+        commands: List[Tuple] = []
+        for key, value in sets.items():
+            commands.append(('SET', self._key(key), value, 'EX', ttl) if ttl else ('SET', self._key(key), value))
+        if deletes:
+            commands.append(('DEL', *(self._key(key) for key in deletes)))
+        await self.client.pipeline(commands)
+
+    async def close(self):
+        await self.client.close()
+
+
+class SQLiteBackend:
+    """Записи FSM в SQLite (WAL); истёкшие записи игнорируются и периодически удаляются."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm_records ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL) WITHOUT ROWID"
+        )
+        self._lock = asyncio.Lock()
+
+    def _get_many(self, keys: List[str]) -> Dict[str, Optional[str]]:
+        now = time.time()
+        result: Dict[str, Optional[str]] = dict.fromkeys(keys)
+        placeholders = ','.join('?' * len(keys))
+        for key, value, expires_at in self._conn.execute(
+            f"SELECT key, value, expires_at FROM fsm_records WHERE key IN ({placeholders})", keys
+        ):
+            if expires_at is None or expires_at > now:
+                result[key] = value
+        return result
+
+    def _write_batch(self, sets: Dict[str, str], deletes: List[str], ttl: Optional[int]):
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(
+                "INSERT INTO fsm_records (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                [(key, value, expires_at) for key, value in sets.items()]
+            )
+            self._conn.executemany("DELETE FROM fsm_records WHERE key = ?", [(key,) for key in deletes])
+            self._conn.execute("DELETE FROM fsm_records WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Optional[str]]:
+        async with self._lock:
+            return await asyncio.to_thread(self._get_many, keys)
+
+    async def write_batch(self, sets: Dict[str, str], deletes: List[str], ttl: Optional[int]):
+        async with self._lock:
+            await asyncio.to_thread(self._write_batch, sets, deletes, ttl)
+
+    async def close(self):
+        async with self._lock:
+            self._conn.close()
+
+
+# ---- хранилище aiogram ----
+
+class _Record:
+    __slots__ = ('state', 'data', 'last_access')
+
+    def __init__(self, state: Optional[str] = None, data: Optional[Dict[str, Any]] = None):
+        self.state = state
+        self.data = data if data is not None else {}
+        self.last_access = time.monotonic()
+
+
+class BatchingStorage(BaseStorage):
+    """FSM-хранилище aiogram с локальным кэшем и отложенной пакетной записью в бэкенд."""
+
+    def __init__(self, backend, ttl: Optional[int] = 86400, flush_interval: float = 0.2,
+                 cache_idle: float = 600.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.cache_idle = cache_idle
+        self._cache: Dict[str, _Record] = {}
+        self._dirty: Set[str] = set()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._last_eviction = time.monotonic()
+        self.flushes = 0
+        self.writes = 0
+
+    @staticmethod
+    def _build_key(key: StorageKey) -> str:
+        return ':'.join(str(part) for part in (
+            key.bot_id, key.chat_id, key.user_id, key.thread_id or '', key.business_connection_id or '', key.destiny
+        ))
+
+    async def _record(self, storage_key: str) -> _Record:
+        record = self._cache.get(storage_key)
+        if record is None:
+            # Параллельные запросы одного ключа ждут одну загрузку
+            pending = self._loading.get(storage_key)
+            if pending is None:
+                pending = asyncio.get_running_loop().create_future()
+                self._loading[storage_key] = pending
+                try:
+                    raw = (await self.backend.get_many([storage_key]))[storage_key]
+                    record = _Record()
+                    if raw:
+                        payload = json.loads(raw)
+                        record.state, record.data = payload.get('state'), payload.get('data', {})
+                    self._cache[storage_key] = record
+                    pending.set_result(record)
+                except Exception as e:
+                    pending.set_exception(e)
+                    raise
+                finally:
+                    del self._loading[storage_key]
+            else:
+                record = await pending
+        record.last_access = time.monotonic()
+        return record
+
+    def _mark_dirty(self, storage_key: str):
+        self._dirty.add(storage_key)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self._build_key(key)
+        record = await self._record(storage_key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(storage_key)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(self._build_key(key))).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        storage_key = self._build_key(key)
+        record = await self._record(storage_key)
+        record.data = data.copy()
+        self._mark_dirty(storage_key)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._record(self._build_key(key))).data.copy()
+
+    @staticmethod
+    def _serialize(record: _Record) -> Optional[str]:
+        data = {}
+        for name, value in record.data.items():
+            if name in TRANSIENT_KEYS:
+                continue
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                continue
+            data[name] = value
+        if record.state is None and not data:
+            return None
+        return json.dumps({'state': record.state, 'data': data}, ensure_ascii=False)
+
+    async def flush(self):
+        """Записывает все изменённые записи одной пачкой."""
+        dirty, self._dirty = self._dirty, set()
+        sets: Dict[str, str] = {}
+        deletes: List[str] = []
+        for storage_key in dirty:
+            record = self._cache.get(storage_key)
+            value = self._serialize(record) if record is not None else None
+            if value is None:
+                deletes.append(storage_key)
+            else:
+                sets[storage_key] = value
+
+        if not sets and not deletes:
+            return
+        try:
+            await self.backend.write_batch(sets, deletes, self.ttl)
+            self.flushes += 1
+            self.writes += len(sets) + len(deletes)
+        except Exception as e:
+            logger.error(f"Ошибка записи FSM-хранилища: {e}")
+            self._dirty |= dirty
+        except BaseException:
+            # Отмена посреди записи: ключи вернутся в очередь и уйдут следующим сбросом
+            self._dirty |= dirty
+            raise
+
+    def _evict_idle(self):
+        """Выгружает из кэша давно неиспользуемые записи (в бэкенде они остаются)."""
+        idle_before = time.monotonic() - self.cache_idle
+        for storage_key in [k for k, r in self._cache.items()
+                            if r.last_access < idle_before and k not in self._dirty]:
+            del self._cache[storage_key]
+        self._last_eviction = time.monotonic()
+
+    async def _flush_loop(self):
+        while self._dirty or self._cache:
+            await asyncio.sleep(self.flush_interval)
+            if self._dirty:
+                await self.flush()
+            if time.monotonic() - self._last_eviction > self.cache_idle / 10:
+                self._evict_idle()
+
+    def stats(self) -> Dict[str, int]:
+        """Метрики: контексты в кэше, ожидающие записи и выполненные сбросы."""
+        return {
+            "live_contexts": len(self._cache),
+            "dirty_contexts": len(self._dirty),
+            "flushes": self.flushes,
+            "writes": self.writes,
+        }
+
+    async def close(self) -> None:
+        if self._flusher is not None and not self._flusher.done():
+            self._flusher.cancel()
+            # Дожидаемся отмены, чтобы прерванная пачка вернула ключи до финального сброса
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        await self.backend.close()
+
+
+class BoundedMemoryStorage(BaseStorage):
+    """In-memory FSM-хранилище с TTL простоя, ограничением числа контекстов (LRU) и чисткой.
+
+    Брошенные на полпути диалоги удаляются через idle_ttl секунд без обращений,
+    а при превышении max_contexts вытесняются самые давние. Пустые контексты
+    (после state.clear()) удаляются сразу, и чтение отсутствующего ключа не
+    создаёт запись, поэтому память не растёт от случайных апдейтов.
+    """
+
+    def __init__(self, max_contexts: int = 10000, idle_ttl: float = 3600.0, sweep_interval: float = 60.0):
+        self.max_contexts = max_contexts
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self._records: "OrderedDict[StorageKey, _Record]" = OrderedDict()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+
+    def _get(self, key: StorageKey) -> Optional[_Record]:
+        record = self._records.get(key)
+        if record is None:
+            return None
+        now = time.monotonic()
+        if now - record.last_access > self.idle_ttl:
+            del self._records[key]
+            self.evicted_idle += 1
+            return None
+        record.last_access = now
+        self._records.move_to_end(key)
+        return record
+
+    def _get_or_create(self, key: StorageKey) -> _Record:
+        record = self._get(key)
+        if record is None:
+            record = self._records[key] = _Record()
+            while len(self._records) > self.max_contexts:
+                self._records.popitem(last=False)
+                self.evicted_lru += 1
+            if self._sweeper is None or self._sweeper.done():
+                self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+        return record
+
+    def _drop_if_empty(self, key: StorageKey, record: _Record):
+        if record.state is None and not record.data:
+            self._records.pop(key, None)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = self._get_or_create(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._drop_if_empty(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._get(key)
+        return record.state if record is not None else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        record = self._get_or_create(key)
+        record.data = data.copy()
+        self._drop_if_empty(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._get(key)
+        return record.data.copy() if record is not None else {}
+
+    def sweep(self) -> int:
+        """Удаляет контексты, простаивающие дольше idle_ttl; возвращает их число."""
+        expire_before = time.monotonic() - self.idle_ttl
+        expired = 0
+        # Записи упорядочены по последнему обращению — старые в начале
+        while self._records:
+            key, record = next(iter(self._records.items()))
+            if record.last_access > expire_before:
+                break
+            del self._records[key]
+            expired += 1
+        self.evicted_idle += expired
+        return expired
+
+    async def _sweep_loop(self):
+        while self._records:
+            await asyncio.sleep(self.sweep_interval)
+            expired = self.sweep()
+            if expired:
+                logger.info(f"🧹 FSM: удалено брошенных контекстов: {expired}, активных: {len(self._records)}")
+
+    def stats(self) -> Dict[str, int]:
+        """Метрики: активные контексты и число вытеснений."""
+        return {
+            "live_contexts": len(self._records),
+            "evicted_idle": self.evicted_idle,
+            "evicted_lru": self.evicted_lru,
+        }
+
+    async def close(self) -> None:
+        if self._sweeper is not None and not self._sweeper.done():
+            self._sweeper.cancel()
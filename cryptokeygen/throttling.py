@@ -0,0 +1,150 @@
+"""Ограничение частоты входящих обновлений на пользователя с весами по стоимости операций.
+
+У каждого пользователя свой token bucket. Обновление списывает жетоны по весу:
+клик по меню стоит 1, запуск генерации ключа или сертификата — больше, файл на
+хеширование — пропорционально размеру. Хендлеры дорогих операций доначисляют
+стоимость через charge() (например, RSA-4096 вместо Ed25519), и баланс может
+уйти в минус. Обновления сверх лимита отбрасываются до чтения FSM и хендлеров;
+на callback отвечает короткое уведомление. Бакеты хранятся в ограниченном LRU,
+из которого вытесняются только уже восполнившиеся бакеты.
+"""
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+# Вес callback_data по точному значению или префиксу (самый длинный совпавший префикс)
+DEFAULT_CALLBACK_COSTS: Dict[str, float] = {
+    "no_passphrase": 5,          # генерация SSH-ключа; RSA доначисляется в хендлере
+    "x509_days_": 5,             # переход к генерации самоподписанного сертификата
+    "x509_bulk_": 3,
+    "x509_ca_create": 3,
+    "ssh_weak_audit": 3,
+}
+SLOW_DOWN_TEXT = "⏳ Слишком часто. Подождите {wait:.0f} с"
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "noticed")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.noticed = 0.0
+
+
+# Сколько самых давних бакетов просматривается в поисках полного для вытеснения
+EVICTION_SCAN = 32
+
+
+class UserThrottle:
+    """Token bucket'ы по user_id в LRU на max_users записей."""
+
+    def __init__(self, rate: float = 1.0, capacity: float = 60.0, max_users: int = 50000,
+                 callback_costs: Optional[Mapping[str, float]] = None, document_cost_per_mb: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_users = max_users
+        self.callback_costs = dict(DEFAULT_CALLBACK_COSTS if callback_costs is None else callback_costs)
+        self.document_cost_per_mb = document_cost_per_mb
+        self._buckets: "OrderedDict[int, _Bucket]" = OrderedDict()
+        self.allowed = 0
+        self.dropped = 0
+        self.evicted = 0
+
+    def _bucket(self, user_id: int, now: float) -> _Bucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_users:
+                self._evict(now)
+            bucket = self._buckets[user_id] = _Bucket(self.capacity, now)
+        else:
+            self._buckets.move_to_end(user_id)
+            bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        return bucket
+
+    def _evict(self, now: float):
+        # Вытеснение сбрасывает баланс к полному, поэтому истощённый бакет оставляем до
+        # восполнения. Если полных среди давних нет, словарь временно превышает max_users:
+        # истощённых бакетов не больше, чем пользователей, активных за последние
+        # capacity / rate секунд (плюс долг от charge()).
+        for user_id, bucket in itertools.islice(self._buckets.items(), EVICTION_SCAN):
+            if bucket.tokens + (now - bucket.updated) * self.rate >= self.capacity:
+                del self._buckets[user_id]
+                self.evicted += 1
+                return
+
+    def cost(self, update: Update) -> float:
+        """Вес обновления: считается по самому обновлению, без FSM и запросов к Telegram."""
+        if update.callback_query is not None:
+            data = update.callback_query.data or ""
+            matched = max((prefix for prefix in self.callback_costs if data.startswith(prefix)), key=len, default=None)
+            return self.callback_costs[matched] if matched is not None else 1.0
+        message = update.message
+        if message is not None and message.document is not None:
+            return 1.0 + (message.document.file_size or 0) / 1048576 * self.document_cost_per_mb
+        return 1.0
+
+    def acquire(self, user_id: int, cost: float) -> float:
+        """Списывает cost, если баланс положительный; иначе возвращает, сколько секунд ждать."""
+        now = time.monotonic()
+        bucket = self._bucket(user_id, now)
+        if bucket.tokens > 0:
+            bucket.tokens -= cost
+            self.allowed += 1
+            return 0.0
+        self.dropped += 1
+        return -bucket.tokens / self.rate + 1 / self.rate
+
+    def charge(self, user_id: int, cost: float):
+        """Доначисляет стоимость уже начатой операции; баланс может уйти в минус."""
+        self._bucket(user_id, time.monotonic()).tokens -= cost
+
+    def should_notify(self, user_id: int, interval: float) -> bool:
+        """Не чаще раза в interval секунд: уведомления сами по себе стоят запросов к Bot API."""
+        bucket = self._buckets.get(user_id)
+        now = time.monotonic()
+        if bucket is None or now - bucket.noticed < interval:
+            return False
+        bucket.noticed = now
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tracked_users": len(self._buckets), "allowed": self.allowed,
+                "dropped": self.dropped, "evicted": self.evicted}
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Outer middleware на dp.update: отбрасывает обновления сверх лимита пользователя.
+
+    Регистрируется до FSMContextMiddleware, поэтому отброшенное обновление не
+    читает состояние из хранилища.
+    """
+
+    def __init__(self, throttle: UserThrottle, notice_interval: float = 5.0):
+        self.throttle = throttle
+        self.notice_interval = notice_interval
+
+    async def __call__(self, handler, event: Update, data):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        wait = self.throttle.acquire(user.id, self.throttle.cost(event))
+        if not wait:
+            return await handler(event, data)
+
+        logger.debug(f"Обновление {event.update_id} от {user.id} отброшено лимитом, ждать {wait:.0f} с")
+        if event.callback_query is not None and self.throttle.should_notify(user.id, self.notice_interval):
+            try:
+                await event.callback_query.answer(SLOW_DOWN_TEXT.format(wait=wait))
+            except Exception as e:
+                logger.debug(f"Не удалось ответить на callback {event.callback_query.id}: {e}")
+        return None
@@ -0,0 +1,123 @@
+"""Сторож цикла событий: измеряет задержку планирования и ловит блокирующий код.
+
+Задача в цикле событий отмечается каждые interval секунд. Вспомогательный
+поток проверяет отметку и, если цикл не отвечает дольше threshold, снимает
+стек потока цикла прямо во время блокировки и пишет в лог вместе с хендлером
+и обновлением, которые выполнялись в этот момент.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+import weakref
+from typing import Optional
+
+from aiogram import BaseMiddleware
+
+from cryptokeygen import metrics
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_SECONDS = metrics.histogram(
+    "event_loop_lag_seconds", "Задержка планирования цикла событий",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+LOOP_STALLS = metrics.counter("event_loop_stalls_total", "Блокировки цикла событий дольше порога")
+
+# Контекст выполняемого хендлера по задаче asyncio: поток сторожа читает его по current_task()
+_task_context: "weakref.WeakKeyDictionary[asyncio.Task, str]" = weakref.WeakKeyDictionary()
+
+
+class WatchdogContextMiddleware(BaseMiddleware):
+    """Inner middleware: запоминает хендлер, update_id и chat_id для текущей задачи."""
+
+    async def __call__(self, handler, event, data):
+        task = asyncio.current_task()
+        if task is None:
+            return await handler(event, data)
+
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        update = data.get("event_update")
+        chat = data.get("event_chat")
+        _task_context[task] = (
+            f"handler={name} update_id={getattr(update, 'update_id', '-')} "
+            f"chat_id={getattr(chat, 'id', '-')} state={data.get('raw_state') or '-'}"
+        )
+        try:
+            return await handler(event, data)
+        finally:
+            _task_context.pop(task, None)
+
+
+class LoopWatchdog:
+    """Измеряет lag цикла событий и снимает стек, если цикл заблокирован дольше threshold."""
+
+    def __init__(self, threshold: float = 0.25, interval: float = 0.05, stack_limit: int = 25):
+        self.threshold = threshold
+        self.interval = interval
+        self.stack_limit = stack_limit
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = self._loop.create_task(self._tick())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"🐕 Сторож цикла событий запущен (порог {self.threshold * 1000:.0f} мс)")
+
+    async def _tick(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - started - self.interval)
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag >= self.threshold:
+                logger.warning(f"🐢 Блокировка цикла событий завершилась: {lag * 1000:.0f} мс")
+
+    def _watch(self):
+        reported_heartbeat = None
+        while not self._stopped.wait(self.interval):
+            heartbeat = self._heartbeat
+            stalled_for = time.monotonic() - heartbeat
+            # Одна запись на каждую блокировку: повторно сообщаем только после новой отметки
+            if stalled_for < self.threshold or heartbeat == reported_heartbeat:
+                continue
+            reported_heartbeat = heartbeat
+            LOOP_STALLS.inc()
+            self._report(stalled_for)
+
+    def _report(self, stalled_for: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame, limit=self.stack_limit)) if frame is not None else "<стек недоступен>"
+        task = asyncio.current_task(self._loop)
+        context = _task_context.get(task, "вне хендлера") if task is not None else "вне задачи"
+        logger.warning(
+            f"🐢 Цикл событий заблокирован уже {stalled_for * 1000:.0f} мс ({context}), "
+            f"задача {task.get_name() if task is not None else '-'}. Стек:\n{stack}"
+        )
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
@@ -0,0 +1,125 @@
+"""Поиск RSA-ключей с общими простыми множителями (batch GCD Бернштейна).
+
+Произведение всех модулей строится деревом произведений, затем деревом
+остатков для каждого N_i вычисляется (P mod N_i^2) / N_i, и gcd этого
+значения с N_i выдаёт общий множитель за квазилинейное время вместо O(n²)
+попарных проверок.
+"""
+import base64
+import hashlib
+from math import gcd
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    import gmpy2
+except ImportError:  # без gmpy2 работает на встроенных int, но медленнее
+    gmpy2 = None
+
+
+def _to_int(value):
+    return gmpy2.mpz(value) if gmpy2 is not None else value
+
+
+def product_tree(values: List[int]) -> List[List[int]]:
+    """Дерево произведений: уровень 0 — исходные значения, последний — их произведение."""
+    tree = [[_to_int(v) for v in values]]
+    while len(tree[-1]) > 1:
+        level = tree[-1]
+        tree.append([
+            level[i] * level[i + 1] if i + 1 < len(level) else level[i]
+            for i in range(0, len(level), 2)
+        ])
+    return tree
+
+
+def batch_gcd(moduli: List[int]) -> List[int]:
+    """Для каждого модуля возвращает gcd(N_i, произведение остальных модулей)."""
+    if not moduli:
+        return []
+
+    tree = product_tree(moduli)
+    remainders = tree.pop()
+    while tree:
+        level = tree.pop()
+        remainders = [remainders[i // 2] % (n * n) for i, n in enumerate(level)]
+
+    _gcd = gmpy2.gcd if gmpy2 is not None else gcd
+    return [int(_gcd(r // n, n)) for r, n in zip(remainders, (_to_int(m) for m in moduli))]
+
+
+def find_shared_factors(moduli: List[int]) -> Dict[int, int]:
+    """Возвращает {индекс модуля: найденный общий множитель} для уязвимых ключей.
+
+    Одинаковые модули (повторно загруженный ключ) не считаются уязвимостью
+    и проверяются один раз.
+    """
+    unique: Dict[int, int] = {}
+    for index, n in enumerate(moduli):
+        unique.setdefault(n, index)
+    unique_moduli = list(unique)
+
+    gcds = batch_gcd(unique_moduli)
+    findings: Dict[int, int] = {}
+    suspicious = [n for n, g in zip(unique_moduli, gcds) if g != 1]
+
+    for n, g in zip(unique_moduli, gcds):
+        if g == 1:
+            continue
+        if g == n:
+            # Оба множителя общие с разными ключами — добираем попарно среди подозрительных
+            g = next((gcd(n, other) for other in suspicious
+                      if other != n and 1 < gcd(n, other) < n), n)
+        findings[unique[n]] = g
+
+    for index, n in enumerate(moduli):
+        first = unique[n]
+        if first != index and first in findings:
+            findings[index] = findings[first]
+
+    return findings
+
+
+def extract_rsa_moduli(lines: Iterable[str]) -> Tuple[List[int], List[int], List[bytes], int]:
+    """Разбирает строки публичных ключей OpenSSH и достаёт модули RSA.
+
+    Возвращает (модули, номера строк с этими модулями, blob'ы этих ключей,
+    число пропущенных строк).
+    """
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives.serialization import load_ssh_public_key
+
+    moduli, line_numbers, blobs, skipped = [], [], [], 0
+    for line_no, line in enumerate(lines):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            key = load_ssh_public_key(line.encode('utf-8'))
+        except (ValueError, TypeError):
+            skipped += 1
+            continue
+        if isinstance(key, rsa.RSAPublicKey):
+            moduli.append(key.public_numbers().n)
+            line_numbers.append(line_no)
+            blobs.append(base64.b64decode(line.split()[1]))
+        else:
+            skipped += 1
+    return moduli, line_numbers, blobs, skipped
+
+
+def audit_ssh_public_keys(lines: List[str]) -> Dict[str, object]:
+    """Полный аудит набора ключей; предназначен для запуска в пуле процессов.
+
+    weak — {номер строки: (SHA256 fingerprint, общий множитель)}.
+    """
+    moduli, line_numbers, blobs, skipped = extract_rsa_moduli(lines)
+    findings = find_shared_factors(moduli)
+    return {
+        "rsa_keys": len(moduli),
+        "skipped": skipped,
+        "weak": {
+            line_numbers[i]: ("SHA256:" + base64.b64encode(hashlib.sha256(blobs[i]).digest()).decode('ascii').rstrip('='),
+                              factor)
+            for i, factor in findings.items()
+        },
+    }
@@ -0,0 +1,84 @@
+"""Приём обновлений Telegram через webhook на встроенном aiohttp-сервере.
+
+Запрос подтверждается сразу после проверки секрета и разбора JSON, а само
+обновление обрабатывается в фоновой задаче — Telegram не ждёт хендлер.
+"""
+import asyncio
+import hmac
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """aiohttp-сервер, передающий обновления в feed_update(update: dict)."""
+
+    def __init__(self, feed_update: Callable[[Dict[str, Any]], Awaitable[Any]], *,
+                 secret_token: str, path: str = "/webhook", host: str = "0.0.0.0", port: int = 8080,
+                 loads: Callable[[str], Any] = json.loads):
+        self.feed_update = feed_update
+        self.secret_token = secret_token
+        self.path = path
+        self.host = host
+        self.port = port
+        self.loads = loads
+        self.accepting = True
+        self._tasks: Set[asyncio.Task] = set()
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_post(path, self._handle_update)
+        self.app.router.add_get("/healthz", self._handle_health)
+
+    @property
+    def pending(self) -> int:
+        """Количество обновлений, ещё обрабатываемых в фоне."""
+        return len(self._tasks)
+
+    async def _handle_update(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret_token):
+            return web.Response(status=401)
+        if not self.accepting:
+            # Telegram повторит доставку позже — обновление не потеряется
+            return web.Response(status=503)
+        try:
+            update = self.loads(await request.text())
+        except ValueError:
+            return web.Response(status=400)
+
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "pending": self.pending})
+
+    async def _process(self, update: Dict[str, Any]):
+        try:
+            await self.feed_update(update)
+        except Exception as e:
+            logger.exception(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"🌐 Webhook-сервер слушает http://{self.host}:{self.port}{self.path}")
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Перестаёт принимать обновления и ждёт завершения фоновых задач."""
+        self.accepting = False
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,218 @@
+"""Генерация CSR и самоподписанных сертификатов X.509 (без привязки к Telegram)."""
+import csv
+import io
+import ipaddress
+import re
+import zipfile
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+X509_KEY_SIZE = 2048
+MAX_DAYS = 3650
+
+_NAME_OIDS = (
+    ('CN', NameOID.COMMON_NAME),
+    ('O', NameOID.ORGANIZATION_NAME),
+    ('C', NameOID.COUNTRY_NAME),
+    ('ST', NameOID.STATE_OR_PROVINCE_NAME),
+    ('L', NameOID.LOCALITY_NAME),
+    ('Email', NameOID.EMAIL_ADDRESS),
+)
+CSV_COLUMNS = ('CN', 'O', 'C', 'ST', 'L', 'Email', 'SANs', 'days')
+
+
+def build_subject(cert_details: Dict[str, str]) -> x509.Name:
+    """Собирает x509.Name из словаря вида {'CN': ..., 'O': ...}."""
+    return x509.Name([
+        x509.NameAttribute(oid, cert_details[field])
+        for field, oid in _NAME_OIDS if cert_details.get(field)
+    ])
+
+
+def build_san(cert_details: Dict[str, str], sans: Optional[List[str]] = None) -> Optional[x509.SubjectAlternativeName]:
+    """SAN из явного списка; CN добавляется, если похож на доменное имя."""
+    names: List[str] = list(sans or [])
+    cn_value = cert_details.get('CN', '')
+    if cn_value and ('.' in cn_value or cn_value.endswith('.local')) and cn_value not in names:
+        names.insert(0, cn_value)
+    if not names:
+        return None
+
+    general_names = []
+    for name in names:
+        try:
+            general_names.append(x509.IPAddress(ipaddress.ip_address(name)))
+        except ValueError:
+            general_names.append(x509.DNSName(name))
+    return x509.SubjectAlternativeName(general_names)
+
+
+def generate_x509_assets(cert_details: Dict[str, str], is_csr: bool, days: int = 365,
+                         sans: Optional[List[str]] = None) -> Tuple[bytes, bytes]:
+    """Генерирует ключ RSA и CSR/самоподписанный сертификат.
+
+    Возвращает (PEM CSR или сертификата, PEM приватного ключа PKCS#8).
+    """
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=X509_KEY_SIZE)
+    private_pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+
+    subject = build_subject(cert_details)
+    san = build_san(cert_details, sans)
+
+    if is_csr:
+        csr_builder = x509.CertificateSigningRequestBuilder().subject_name(subject)
+        if san is not None:
+            csr_builder = csr_builder.add_extension(san, critical=False)
+        csr = csr_builder.sign(private_key, hashes.SHA256())
+        return csr.public_bytes(serialization.Encoding.PEM), private_pem
+
+    now = datetime.now(timezone.utc)
+    builder = x509.CertificateBuilder().subject_name(
+        subject
+    ).issuer_name(
+        subject
+    ).public_key(
+        private_key.public_key()
+    ).serial_number(
+        x509.random_serial_number()
+    ).not_valid_before(
+        now
+    ).not_valid_after(
+        now + timedelta(days=days)
+    )
+    if san is not None:
+        builder = builder.add_extension(san, critical=False)
+    builder = builder.add_extension(
+        x509.BasicConstraints(ca=False, path_length=None),
+        critical=True,
+    )
+
+    certificate = builder.sign(private_key, hashes.SHA256())
+    return certificate.public_bytes(serialization.Encoding.PEM), private_pem
+
+
+def parse_subjects_csv(content: str, max_rows: int) -> List[Tuple[int, Dict[str, str]]]:
+    """Читает CSV с колонками CN,O,C,ST,L,Email,SANs,days (заголовок обязателен).
+
+    Возвращает [(номер строки файла, с которой начинается запись, запись)]:
+    номер берётся из reader.line_num, поэтому поля с переводами строк в
+    кавычках и пустые строки не сбивают нумерацию.
+    """
+    reader = csv.reader(io.StringIO(content))
+    fieldnames = next(reader, None)
+    if not fieldnames or 'cn' not in {f.strip().lower() for f in fieldnames}:
+        raise ValueError("В CSV нет заголовка с колонкой CN")
+
+    canonical = {column.lower(): column for column in CSV_COLUMNS}
+    keys = [canonical.get(name.strip().lower(), name.strip()) for name in fieldnames]
+    rows = []
+    line_no = reader.line_num
+    for values in reader:
+        first_line, line_no = line_no + 1, reader.line_num
+        if not values:
+            continue
+        rows.append((first_line, {key: value.strip() for key, value in zip(keys, values)}))
+        if len(rows) > max_rows:
+            raise ValueError(f"Слишком много строк: максимум {max_rows}")
+    return rows
+
+
+def validate_subject_row(row: Dict[str, str], default_days: int = 365) -> Tuple[Dict[str, str], List[str], int]:
+    """Проверяет строку CSV; возвращает (cert_details, SANs, срок) или бросает ValueError."""
+    if not row.get('CN'):
+        raise ValueError("пустой CN")
+    if row.get('C') and (len(row['C']) != 2 or not row['C'].isalpha()):
+        raise ValueError(f"код страны должен состоять из двух букв: {row['C']!r}")
+    if row.get('Email') and ('@' not in row['Email'] or '.' not in row['Email']):
+        raise ValueError(f"некорректный email: {row['Email']!r}")
+
+    days = default_days
+    if row.get('days'):
+        try:
+            days = int(row['days'])
+        except ValueError:
+            raise ValueError(f"срок действия не число: {row['days']!r}")
+        if not 1 <= days <= MAX_DAYS:
+            raise ValueError(f"срок действия вне диапазона 1..{MAX_DAYS}")
+
+    cert_details = {field: row[field] for field, _ in _NAME_OIDS if row.get(field)}
+    if 'C' in cert_details:
+        cert_details['C'] = cert_details['C'].upper()
+    sans = [name for name in re.split(r'[;,\s]+', row.get('SANs', '')) if name]
+    return cert_details, sans, days
+
+
+def generate_x509_rows(rows: List[Tuple[int, Dict[str, str]]], is_csr: bool) -> List[Tuple[int, str, Optional[bytes], Optional[bytes], Optional[str]]]:
+    """Обрабатывает пачку строк CSV в процессе пула.
+
+    Для каждой строки возвращает (номер, CN, PEM, PEM ключа, ошибка).
+    """
+    results = []
+    for row_no, row in rows:
+        try:
+            cert_details, sans, days = validate_subject_row(row)
+            pem, key_pem = generate_x509_assets(cert_details, is_csr, days, sans)
+            results.append((row_no, cert_details['CN'], pem, key_pem, None))
+        except Exception as e:
+            results.append((row_no, row.get('CN', ''), None, None, str(e)))
+    return results
+
+
+def safe_filename(name: str, fallback: str = 'certificate') -> str:
+    """Имя файла без разделителей путей и управляющих символов."""
+    cleaned = re.sub(r'[^\w.@-]+', '_', name).strip('._')
+    return cleaned[:64] or fallback
+
+
+def build_zip(files: Mapping[str, bytes]) -> bytes:
+    """Упаковывает {имя файла: содержимое} в ZIP в памяти."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def build_x509_zip(results, is_csr: bool) -> bytes:
+    """Упаковывает результаты generate_x509_rows в ZIP (плюс errors.txt при ошибках)."""
+    files: Dict[str, bytes] = {}
+    errors = []
+    for row_no, cn, pem, key_pem, error in results:
+        if error:
+            errors.append(f"строка {row_no}: {cn or '-'}: {error}")
+            continue
+        base = f"{row_no:04d}_{safe_filename(cn)}"
+        files[f"{base}.csr" if is_csr else f"{base}.crt"] = pem
+        files[f"{base}.pem"] = key_pem
+    if errors:
+        files["errors.txt"] = ("\n".join(errors) + "\n").encode('utf-8')
+    return build_zip(files)
+
+
+def iter_pem_blocks(data: bytes, label: bytes) -> Iterator[bytes]:
+    """Лениво перебирает PEM-блоки с заданной меткой (например, b'CERTIFICATE REQUEST')."""
+    begin, end = b'-----BEGIN ' + label + b'-----', b'-----END ' + label + b'-----'
+    position = 0
+    while True:
+        start = data.find(begin, position)
+        if start == -1:
+            return
+        stop = data.find(end, start)
+        if stop == -1:
+            return
+        position = stop + len(end)
+        yield data[start:position]
+
+
+def split_pem_blocks(data: bytes, label: bytes) -> List[bytes]:
+    """Все PEM-блоки с заданной меткой списком."""
+    return list(iter_pem_blocks(data, label))
@@ -12,6 +12,8 @@ module.exports = {
     time: true,
     // Авторестарт
     max_memory_restart: '500M',
+    // Ожидание корректной остановки перед SIGKILL (SHUTDOWN_TIMEOUT + запас)
+    kill_timeout: 30000,
     // Кастомные переменные
     env: {
       NODE_ENV: 'production'
@@ -0,0 +1,68 @@
+import hashlib
+
+from cryptokeygen.__main__ import main
+from cryptokeygen.hashing import format_manifest_line, hash_file, read_manifest
+
+
+def test_hash_file_matches_hashlib(tmp_path):
+    data = bytes(range(256)) * 5000
+    path = tmp_path / "data.bin"
+    path.write_bytes(data)
+
+    assert hash_file(str(path), ["sha256", "md5"]) == {
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "md5": hashlib.md5(data).hexdigest(),
+    }
+
+
+def test_manifest_round_trip_escapes_names(tmp_path):
+    entries = {
+        "plain.txt": "a" * 64,
+        "back\\slash.txt": "b" * 64,
+        "new\nline.txt": "c" * 64,
+        "both\\n\n.txt": "d" * 64,
+    }
+    manifest = tmp_path / "SHA256SUMS"
+    manifest.write_text("".join(format_manifest_line(digest, name) for name, digest in entries.items()))
+
+    # Формат совместим с sha256sum: экранированная строка начинается с \
+    assert manifest.read_text().splitlines()[1] == "\\" + "b" * 64 + "  back\\\\slash.txt"
+    parsed, valid = read_manifest(str(manifest))
+    assert parsed == entries
+    assert valid == manifest.stat().st_size
+
+
+def test_manifest_stops_at_torn_line(tmp_path):
+    complete = format_manifest_line("a" * 64, "one") + format_manifest_line("b" * 64, "two")
+    manifest = tmp_path / "SHA256SUMS"
+    manifest.write_bytes(complete.encode() + b"cccc")
+
+    parsed, valid = read_manifest(str(manifest))
+    assert parsed == {"one": "a" * 64, "two": "b" * 64}
+    assert valid == len(complete.encode())
+
+
+def test_manifest_stops_at_invalid_line(tmp_path):
+    manifest = tmp_path / "SHA256SUMS"
+    manifest.write_bytes(format_manifest_line("a" * 64, "one").encode() + b"not a checksum\n"
+                         + format_manifest_line("b" * 64, "two").encode())
+
+    parsed, valid = read_manifest(str(manifest))
+    assert parsed == {"one": "a" * 64}
+    assert valid == len(format_manifest_line("a" * 64, "one"))
+
+
+def test_cli_resume_rewrites_torn_tail(tmp_path):
+    tree, out = tmp_path / "tree", tmp_path / "out"
+    tree.mkdir()
+    for index in range(5):
+        (tree / f"file{index}.txt").write_bytes(b"x" * index)
+    assert main(["hash", "-q", "-j", "1", "-o", str(out), str(tree)]) == 0
+    manifest = out / "SHA256SUMS"
+    expected = manifest.read_bytes()
+
+    # Прерванный запуск: две целые строки и оборванная третья
+    lines = expected.splitlines(keepends=True)
+    manifest.write_bytes(b"".join(lines[:2]) + lines[2][:20])
+    assert main(["hash", "-q", "-j", "1", "--resume", "-o", str(out), str(tree)]) == 0
+    assert manifest.read_bytes() == expected
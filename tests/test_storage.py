@@ -0,0 +1,77 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from cryptokeygen.storage import BatchingStorage
+
+
+class SlowBackend:
+    """Бэкенд, запись которого висит, пока тест не отпустит release."""
+
+    def __init__(self):
+        self.batches = []
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.block = True
+
+    async def get_many(self, keys):
+        return {key: None for key in keys}
+
+    async def write_batch(self, sets, deletes, ttl):
+        self.started.set()
+        if self.block:
+            await self.release.wait()
+        self.batches.append((dict(sets), list(deletes)))
+
+    async def close(self):
+        pass
+
+
+def key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+def test_flush_batches_repeated_writes():
+    async def scenario():
+        backend = SlowBackend()
+        backend.block = False
+        storage = BatchingStorage(backend, flush_interval=60)
+        await storage.set_state(key(1), "a")
+        await storage.set_data(key(1), {"x": 1})
+        await storage.flush()
+        return backend.batches
+
+    batches = asyncio.run(scenario())
+    assert len(batches) == 1
+    assert list(batches[0][0].values()) == ['{"state": "a", "data": {"x": 1}}']
+
+
+def test_cancelled_flush_keeps_dirty_keys():
+    async def scenario():
+        backend = SlowBackend()
+        storage = BatchingStorage(backend, flush_interval=60)
+        await storage.set_state(key(1), "a")
+        flush = asyncio.ensure_future(storage.flush())
+        await backend.started.wait()
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+        return storage.stats()["dirty_contexts"]
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_close_writes_batch_interrupted_in_flusher():
+    async def scenario():
+        backend = SlowBackend()
+        storage = BatchingStorage(backend, flush_interval=0.01)
+        await storage.set_state(key(1), "a")
+        await storage.set_state(key(2), "b")
+        await backend.started.wait()
+        # Флашер висит в write_batch; close() отменяет его и пишет остаток сам
+        backend.block = False
+        await storage.close()
+        return backend.batches
+
+    batches = asyncio.run(scenario())
+    assert len(batches) == 1
+    assert sorted(batches[0][0].values()) == ['{"state": "a", "data": {}}', '{"state": "b", "data": {}}']
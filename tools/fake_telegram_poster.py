@@ -0,0 +1,69 @@
+"""Имитация Telegram для локальной проверки режима webhook.
+
+Запустите бота с BOT_MODE=webhook и WEBHOOK_SECRET=<секрет>, затем:
+
+    python tools/fake_telegram_poster.py --secret <секрет> -n 500 -c 20
+
+Скрипт отправляет обновления /start от разных пользователей так же, как это
+делает Telegram (POST JSON с заголовком X-Telegram-Bot-Api-Secret-Token), и
+печатает время подтверждения. Ответы бота уходят на api.telegram.org и без
+настоящего токена завершатся ошибкой — для проверки приёма это неважно.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import aiohttp
+
+
+def make_update(update_id: int, user_id: int, text: str = "/start") -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": f"user{user_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}] if text.startswith('/') else [],
+        },
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Отправка поддельных обновлений Telegram на локальный webhook")
+    parser.add_argument('--url', default='http://127.0.0.1:8080/webhook')
+    parser.add_argument('--secret', required=True)
+    parser.add_argument('-n', '--count', type=int, default=100)
+    parser.add_argument('-c', '--concurrency', type=int, default=10)
+    args = parser.parse_args()
+
+    latencies, statuses = [], {}
+    queue = asyncio.Queue()
+    for update_id in range(1, args.count + 1):
+        queue.put_nowait(update_id)
+
+    async with aiohttp.ClientSession(headers={"X-Telegram-Bot-Api-Secret-Token": args.secret}) as session:
+        async def sender():
+            while not queue.empty():
+                update_id = queue.get_nowait()
+                started = time.perf_counter()
+                async with session.post(args.url, json=make_update(update_id, 10_000 + update_id % 1000)) as response:
+                    await response.read()
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(sender() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"Отправлено: {args.count} за {elapsed:.2f} с ({args.count / elapsed:.0f} обн/с)")
+    print(f"Статусы: {statuses}")
+    print(f"Подтверждение, мс: p50={statistics.median(latencies):.2f} "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1]:.2f} max={latencies[-1]:.2f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,397 @@
+"""Нагрузочный тест бота на локальной имитации Telegram Bot API.
+
+Скрипт поднимает aiohttp-сервер, отвечающий как api.telegram.org (getUpdates,
+sendMessage, editMessageText, sendDocument, getFile, скачивание файлов и др.),
+запускает настоящий bot.py с TELEGRAM_API_URL, указывающим на этот сервер, и
+прогоняет через диспетчер тысячи имитированных пользователей по реальным
+сценариям: генерация SSH-ключа, хеширование файлов разного размера и CSR X.509.
+
+    python tools/load_test.py --users 2000 -c 200 --mix ssh_ed25519=3,hash=4,x509_csr=2,ssh_rsa=1
+
+В конце печатаются пропускная способность, перцентили задержки по сценариям,
+доля ошибок и пиковый RSS бота вместе с процессами пула. Лимиты исходящих
+запросов (TG_RATE_*) по умолчанию снимаются, чтобы мерить сам бот, а не
+имитацию флуд-контроля; --keep-rate-limits оставляет их.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+BOT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bot.py")
+BOT_TOKEN = "123456:LOADTESTLOADTESTLOADTESTLOADTEST"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "LoadTestBot", "username": "load_test_bot"}
+SIZE_SUFFIXES = {"k": 1024, "m": 1024 * 1024}
+
+Call = Tuple[str, Dict[str, Any]]
+
+
+class FakeBotAPI:
+    """Имитация Bot API: очередь обновлений для getUpdates и журнал ответов бота по чатам."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8081):
+        self.host = host
+        self.port = port
+        self.ready = asyncio.Event()
+        self.calls = Counter()
+        self.uploaded_bytes = 0
+        self._updates: List[dict] = []
+        self._new_updates = asyncio.Event()
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._chats: Dict[int, asyncio.Queue] = defaultdict(asyncio.Queue)
+        self._files: Dict[str, bytes] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application(client_max_size=64 * 1024 * 1024)
+        self.app.router.add_post("/bot{token}/{method}", self._handle_method)
+        self.app.router.add_get("/file/bot{token}/{path:.+}", self._handle_file)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def push_update(self, update: dict):
+        update["update_id"] = self._next_update_id
+        self._next_update_id += 1
+        self._updates.append(update)
+        self._new_updates.set()
+
+    def add_file(self, data: bytes) -> str:
+        file_id = f"file{len(self._files) + 1}"
+        self._files[file_id] = data
+        return file_id
+
+    def chat_calls(self, chat_id: int) -> asyncio.Queue:
+        return self._chats[chat_id]
+
+    def _message(self, chat_id: int, **fields) -> dict:
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return {"message_id": message_id, "date": int(time.time()), "from": BOT_USER,
+                "chat": {"id": chat_id, "type": "private"}, **fields}
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[dict]:
+        self.ready.set()
+        offset = int(params.get("offset") or 0)
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout=min(float(params.get("timeout") or 0), 10))
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:int(params.get("limit") or 100)]
+
+    async def _handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        form = await request.post()
+        params: Dict[str, Any] = {}
+        for key, value in form.items():
+            if isinstance(value, web.FileField):
+                data = value.file.read()
+                self.uploaded_bytes += len(data)
+                params[key] = {"filename": value.filename, "size": len(data)}
+            else:
+                params[key] = value
+        self.calls[method] += 1
+
+        if method == "getUpdates":
+            result: Any = await self._get_updates(params)
+        elif method == "getMe":
+            result = BOT_USER
+        elif method == "getFile":
+            file_id = params["file_id"]
+            result = {"file_id": file_id, "file_unique_id": file_id, "file_size": len(self._files[file_id]),
+                      "file_path": f"documents/{file_id}"}
+        elif "chat_id" in params:
+            chat_id = int(params["chat_id"])
+            if method in ("sendMessage", "editMessageText"):
+                result = self._message(chat_id, text=params.get("text", ""))
+                if method == "editMessageText":
+                    result["message_id"] = int(params.get("message_id") or result["message_id"])
+            elif method == "sendDocument":
+                result = self._message(chat_id, document={"file_id": "uploaded", "file_unique_id": "uploaded"},
+                                       caption=params.get("caption", ""))
+            elif method == "sendMediaGroup":
+                result = [self._message(chat_id, document={"file_id": "uploaded", "file_unique_id": "uploaded"})
+                          for _ in json.loads(params.get("media", "[]"))]
+            else:
+                result = True
+            await self._chats[chat_id].put((method, params, result))
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def _handle_file(self, request: web.Request) -> web.Response:
+        file_id = request.match_info["path"].rsplit("/", 1)[-1]
+        self.calls["downloadFile"] += 1
+        return web.Response(body=self._files[file_id])
+
+
+class SimUser:
+    """Пользователь Telegram: шлёт обновления и ждёт нужный ответ бота в своём чате."""
+
+    def __init__(self, api: FakeBotAPI, user_id: int):
+        self.api = api
+        self.user_id = user_id
+        self.menu_message_id = 0
+        self._text_message_id = 0
+
+    def _from(self) -> dict:
+        return {"id": self.user_id, "is_bot": False, "first_name": f"user{self.user_id}"}
+
+    def _chat(self) -> dict:
+        return {"id": self.user_id, "type": "private", "first_name": f"user{self.user_id}"}
+
+    def _message(self, **fields) -> dict:
+        self._text_message_id += 1
+        return {"message_id": self._text_message_id, "date": int(time.time()),
+                "chat": self._chat(), "from": self._from(), **fields}
+
+    def command(self, text: str):
+        self.api.push_update({"message": self._message(
+            text=text, entities=[{"type": "bot_command", "offset": 0, "length": len(text)}]
+        )})
+
+    def text(self, text: str):
+        self.api.push_update({"message": self._message(text=text)})
+
+    def document(self, file_id: str, size: int, name: str):
+        self.api.push_update({"message": self._message(document={
+            "file_id": file_id, "file_unique_id": file_id, "file_size": size, "file_name": name
+        })})
+
+    def press(self, data: str):
+        self.api.push_update({"callback_query": {
+            "id": f"{self.user_id}-{time.monotonic_ns()}", "from": self._from(), "chat_instance": str(self.user_id),
+            "data": data,
+            "message": {"message_id": self.menu_message_id, "date": int(time.time()),
+                        "chat": self._chat(), "from": BOT_USER, "text": "menu"},
+        }})
+
+    async def expect(self, predicate: Callable[[str, Dict[str, Any]], bool] = None, timeout: float = 60) -> Call:
+        """Ждёт вызов Bot API в этом чате, удовлетворяющий predicate (по умолчанию — любой ответ текстом)."""
+        if predicate is None:
+            predicate = lambda method, params: method in ("sendMessage", "editMessageText")
+        queue = self.api.chat_calls(self.user_id)
+        deadline = time.monotonic() + timeout
+        while True:
+            method, params, result = await asyncio.wait_for(queue.get(), timeout=max(0.0, deadline - time.monotonic()))
+            if method == "sendMessage" and params.get("reply_markup"):
+                self.menu_message_id = result["message_id"]
+            if predicate(method, params):
+                return method, params
+
+
+def text_contains(fragment: str, methods=("sendMessage", "editMessageText")):
+    return lambda method, params: method in methods and fragment in params.get("text", "")
+
+
+async def flow_ssh(user: SimUser, key_type: str):
+    user.command("/start")
+    await user.expect(text_contains("Крипто-генератор"))
+    user.press("ssh_menu")
+    await user.expect()
+    user.press("ssh_generate")
+    await user.expect()
+    user.press(f"ssh_key_{key_type}")
+    await user.expect()
+    user.press("no_passphrase")
+    await user.expect(text_contains("Экспортировать"))
+
+
+async def flow_hash(user: SimUser, file_id: str, size: int):
+    user.command("/start")
+    await user.expect(text_contains("Крипто-генератор"))
+    user.press("hash_start")
+    await user.expect()
+    user.press("hash_sha256")
+    await user.expect()
+    user.document(file_id, size, f"load-{size}.bin")
+    await user.expect(lambda method, params: method == "editMessageText" and (
+        "Готово" in params.get("text", "") or "Ошибка" in params.get("text", "")
+    ))
+
+
+async def flow_kdf(user: SimUser):
+    user.command("/start")
+    await user.expect(text_contains("Крипто-генератор"))
+    user.press("hash_start")
+    await user.expect()
+    user.press("kdf_start")
+    await user.expect(text_contains("Хеш пароля"))
+    user.press("kdf_alg_argon2id")
+    await user.expect()
+    user.text(f"password-{user.user_id}")
+    await user.expect(text_contains("$argon2id$"))
+
+
+async def flow_x509_csr(user: SimUser):
+    user.command("/start")
+    await user.expect(text_contains("Крипто-генератор"))
+    user.press("x509_menu")
+    await user.expect()
+    user.press("x509_generate_csr")
+    await user.expect()
+    for answer in (f"load{user.user_id}.example.com", "Load Test", "RU", "Moscow", "Moscow"):
+        user.text(answer)
+        await user.expect()
+    user.text(f"user{user.user_id}@example.com")
+    await user.expect(text_contains("осторожностью"))
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().lower()
+    if value[-1:] in SIZE_SUFFIXES:
+        return int(float(value[:-1]) * SIZE_SUFFIXES[value[-1]])
+    return int(value)
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def process_tree_rss_kb(pid: int) -> int:
+    """Суммарный RSS процесса и его потомков (процессы пула), КБ; только Linux /proc."""
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f"/proc/{current}/status") as status:
+                total += next(int(line.split()[1]) for line in status if line.startswith("VmRSS:"))
+            with open(f"/proc/{current}/task/{current}/children") as children:
+                stack.extend(int(child) for child in children.read().split())
+        except (OSError, StopIteration, ValueError):
+            continue
+    return total
+
+
+def percentile(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на локальной имитации Bot API")
+    parser.add_argument("--users", type=int, default=1000, help="число сценариев (у каждого свой чат)")
+    parser.add_argument("-c", "--concurrency", type=int, default=100, help="одновременно активных пользователей")
+    parser.add_argument("--mix", default="ssh_ed25519=3,ssh_rsa=1,hash=4,x509_csr=2",
+                        help="веса сценариев: ssh_ed25519, ssh_rsa, hash, x509_csr, kdf")
+    parser.add_argument("--file-sizes", default="1k,100k,1m,10m", help="размеры файлов для хеширования")
+    parser.add_argument("--timeout", type=float, default=120, help="таймаут одного шага, с")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--keep-rate-limits", action="store_true", help="не снимать TG_RATE_* лимиты бота")
+    parser.add_argument("--perf-runtime", action="store_true", help="запустить бота с PERF_RUNTIME=1 (uvloop, orjson)")
+    parser.add_argument("--bot-log", default=os.devnull, help="куда писать stdout/stderr бота")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    api = FakeBotAPI(port=args.port)
+    await api.start()
+
+    files = [(api.add_file(os.urandom(size)), size) for size in map(parse_size, args.file_sizes.split(","))]
+    flows = {
+        "ssh_ed25519": lambda user: flow_ssh(user, "ed25519"),
+        "ssh_rsa": lambda user: flow_ssh(user, "rsa"),
+        "hash": lambda user: flow_hash(user, *random.choice(files)),
+        "x509_csr": flow_x509_csr,
+        "kdf": flow_kdf,
+    }
+    unknown = set(mix) - set(flows)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+    env = dict(os.environ, BOT_TOKEN=BOT_TOKEN, TELEGRAM_API_URL=api.base_url, BOT_MODE="polling")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    if args.perf_runtime:
+        env["PERF_RUNTIME"] = "1"
+    if not args.keep_rate_limits:
+        env.update(TG_RATE_GLOBAL="1000000", TG_RATE_PER_CHAT="1000000", TG_BURST_PER_CHAT="1000000")
+
+    with open(args.bot_log, "ab") as bot_log:
+        process = await asyncio.create_subprocess_exec(sys.executable, BOT_PATH, env=env, stdout=bot_log, stderr=bot_log)
+    try:
+        await asyncio.wait_for(api.ready.wait(), timeout=60)
+    except asyncio.TimeoutError:
+        process.kill()
+        await api.stop()
+        sys.exit("Бот не начал опрос getUpdates за 60 с (см. --bot-log)")
+
+    peak_rss_kb = 0
+
+    async def sample_rss():
+        nonlocal peak_rss_kb
+        while True:
+            peak_rss_kb = max(peak_rss_kb, process_tree_rss_kb(process.pid))
+            await asyncio.sleep(0.5)
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, Counter] = defaultdict(Counter)
+    jobs: asyncio.Queue = asyncio.Queue()
+    names, weights = zip(*mix.items())
+    for index in range(args.users):
+        jobs.put_nowait((1_000_000 + index, random.choices(names, weights)[0]))
+
+    async def worker():
+        while not jobs.empty():
+            user_id, name = jobs.get_nowait()
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(flows[name](SimUser(api, user_id)), timeout=args.timeout)
+                latencies[name].append((time.perf_counter() - started) * 1000)
+            except Exception as e:
+                errors[name][type(e).__name__] += 1
+
+    sampler = asyncio.create_task(sample_rss())
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+
+    process.terminate()
+    try:
+        await asyncio.wait_for(process.wait(), timeout=15)
+    except asyncio.TimeoutError:
+        process.kill()
+    await api.stop()
+
+    completed = sum(len(values) for values in latencies.values())
+    failed = sum(sum(counter.values()) for counter in errors.values())
+    updates = api.calls["getUpdates"]
+    print(f"Сценариев: {completed} успешно, {failed} с ошибкой за {elapsed:.1f} с "
+          f"({completed / elapsed:.1f} сценариев/с, {sum(api.calls.values()) / elapsed:.0f} запросов API/с)")
+    print(f"Пиковый RSS бота с пулом: {peak_rss_kb / 1024:.0f} МБ; файлов от бота: {api.uploaded_bytes / 1048576:.1f} МБ; "
+          f"опросов getUpdates: {updates}")
+    print(f"\n{'сценарий':<12} {'успешно':>8} {'ошибок':>7} {'p50, мс':>9} {'p90, мс':>9} {'p99, мс':>9} {'max, мс':>9}")
+    for name in names:
+        values = sorted(latencies[name])
+        error_count = sum(errors[name].values())
+        total = len(values) + error_count
+        print(f"{name:<12} {len(values):>8} {error_count:>7} {percentile(values, 0.5):>9.0f} {percentile(values, 0.9):>9.0f} "
+              f"{percentile(values, 0.99):>9.0f} {(values[-1] if values else 0):>9.0f}"
+              + (f"  ошибки {error_count / total:.1%}: {dict(errors[name])}" if error_count else ""))
+    print(f"\nВызовы API: {dict(api.calls.most_common())}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
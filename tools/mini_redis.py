@@ -0,0 +1,124 @@
+"""Локальный in-memory сервер с подмножеством протокола Redis для проверки FSM-хранилища.
+
+    python tools/mini_redis.py --port 6379
+    FSM_STORAGE=redis FSM_REDIS_URL=redis://127.0.0.1:6379/0 python bot.py
+
+Поддерживает PING, AUTH, SELECT, GET, MGET, SET (EX/PX), DEL, EXISTS, EXPIRE,
+TTL, DBSIZE, FLUSHDB и QUIT — этого достаточно для RedisBackend. Данные
+живут только в памяти процесса.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class MiniRedis:
+    def __init__(self):
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.commands = 0
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, args: List[bytes]):
+        self.commands += 1
+        command = args[0].upper()
+        if command in (b'PING',):
+            return 'PONG'
+        if command in (b'AUTH', b'SELECT', b'QUIT'):
+            return 'OK'
+        if command == b'GET':
+            return self._get(args[1])
+        if command == b'MGET':
+            return [self._get(key) for key in args[1:]]
+        if command == b'SET':
+            expires_at = None
+            options = [arg.upper() for arg in args[3:]]
+            if b'EX' in options:
+                expires_at = time.monotonic() + int(args[3 + options.index(b'EX') + 1])
+            elif b'PX' in options:
+                expires_at = time.monotonic() + int(args[3 + options.index(b'PX') + 1]) / 1000
+            self.data[args[1]] = (args[2], expires_at)
+            return 'OK'
+        if command == b'DEL':
+            return sum(1 for key in args[1:] if self._get(key) is not None and self.data.pop(key, None))
+        if command == b'EXISTS':
+            return sum(1 for key in args[1:] if self._get(key) is not None)
+        if command == b'EXPIRE':
+            value = self._get(args[1])
+            if value is None:
+                return 0
+            self.data[args[1]] = (value, time.monotonic() + int(args[2]))
+            return 1
+        if command == b'TTL':
+            if self._get(args[1]) is None:
+                return -2
+            expires_at = self.data[args[1]][1]
+            return -1 if expires_at is None else int(expires_at - time.monotonic())
+        if command == b'DBSIZE':
+            return len(self.data)
+        if command == b'FLUSHDB':
+            self.data.clear()
+            return 'OK'
+        return RuntimeError(f"ERR unknown command '{command.decode()}'")
+
+    @staticmethod
+    def encode(reply) -> bytes:
+        if reply is None:
+            return b'$-1\r\n'
+        if isinstance(reply, str):
+            return b'+' + reply.encode() + b'\r\n'
+        if isinstance(reply, Exception):
+            return b'-' + str(reply).encode() + b'\r\n'
+        if isinstance(reply, int):
+            return b':%d\r\n' % reply
+        if isinstance(reply, bytes):
+            return b'$%d\r\n%s\r\n' % (len(reply), reply)
+        return b'*%d\r\n' % len(reply) + b''.join(MiniRedis.encode(item) for item in reply)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                count = int(line[1:-2])
+                args = []
+                for _ in range(count):
+                    length = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                writer.write(self.encode(self.execute(args)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def start_server(host: str = '127.0.0.1', port: int = 6379) -> Tuple[MiniRedis, asyncio.AbstractServer]:
+    redis = MiniRedis()
+    server = await asyncio.start_server(redis.handle, host, port)
+    return redis, server
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="In-memory Redis-совместимый сервер")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+    _, server = await start_server(args.host, args.port)
+    print(f"mini-redis слушает {args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())